@@ -0,0 +1,100 @@
+"""Benchmark `split_message` on large, LLM-style markdown outputs.
+
+Compares the boundary-aware splitter against plain fixed-width slicing (the
+previous implementation). Besides throughput it reports what matters to
+readers: chunks that break a code fence or cut a word in half.
+
+    python benchmarks/bench_split_message.py [--size 1000000] [--repeat 5]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from murphy.utils.message_splitter import MessageSplitter  # noqa: E402
+from murphy.utils.utilityfuncs import split_message  # noqa: E402
+
+WORDS = ("the target host exposes ports for ssh http and smb so we enumerate services "
+         "then check versions against known vulnerabilities before trying credentials").split()
+
+
+def llm_output(size: int, seed: int = 0) -> str:
+    """Markdown like a long model answer: paragraphs, lists and code blocks"""
+    rng = random.Random(seed)
+    parts = []
+    total = 0
+    while total < size:
+        kind = rng.random()
+        if kind < 0.25:
+            lines = [f"    result = scan('{rng.choice(WORDS)}', port={rng.randint(1, 65535)})"
+                     for _ in range(rng.randint(5, 120))]
+            part = f"```{rng.choice(['python', 'bash', ''])}\n" + "\n".join(lines) + "\n```"
+        elif kind < 0.4:
+            part = "\n".join(f"- {' '.join(rng.choices(WORDS, k=rng.randint(3, 15)))}"
+                             for _ in range(rng.randint(2, 10)))
+        else:
+            sentences = [" ".join(rng.choices(WORDS, k=rng.randint(6, 25))).capitalize() + rng.choice(".!?")
+                         for _ in range(rng.randint(1, 8))]
+            part = " ".join(sentences)
+        parts.append(part)
+        total += len(part) + 2
+    return "\n\n".join(parts)
+
+
+def naive_split(message, max_length=2000):
+    return [message[i:i + max_length] for i in range(0, len(message), max_length)]
+
+
+def incremental_split(message, max_length=2000, token_size=16):
+    """Feed the text like a token stream"""
+    splitter = MessageSplitter(max_length)
+    chunks = []
+    for i in range(0, len(message), token_size):
+        chunks += splitter.feed(message[i:i + token_size])
+    return chunks + splitter.flush()
+
+
+def quality(text, chunks):
+    unbalanced = sum(1 for chunk in chunks if len(re.findall(r"^[ \t]*```", chunk, re.M)) % 2)
+    # A word was cut when the two halves at a chunk boundary form a word of the text
+    words = set(re.findall(r"\w+", text))
+    broken_words = 0
+    for a, b in zip(chunks, chunks[1:]):
+        tail, head = re.search(r"\w*$", a).group(), re.match(r"\w*", b).group()
+        if tail and head and tail + head in words:
+            broken_words += 1
+    return unbalanced, broken_words
+
+
+def bench(name, fn, text, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        chunks = fn(text)
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    unbalanced, broken_words = quality(text, chunks)
+    over = sum(1 for chunk in chunks if len(chunk) > 2000)
+    print(f"{name:<14} {best * 1000:9.2f} ms  {len(text) / best / 1e6:8.1f} MB/s  "
+          f"{len(chunks):6} chunks  {unbalanced:5} unbalanced fences  {broken_words:5} split words  {over} oversize")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=1_000_000, help="characters of generated output")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    text = llm_output(args.size)
+    print(f"{len(text):,} characters, best of {args.repeat}")
+    bench("naive slicing", naive_split, text, args.repeat)
+    bench("split_message", split_message, text, args.repeat)
+    bench("incremental", incremental_split, text, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
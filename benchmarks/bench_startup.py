@@ -0,0 +1,104 @@
+"""Check how long `import murphy.chatbot` takes, i.e. the time before the bot
+can start connecting to Discord.
+
+Each run imports the module in a fresh interpreter with `-X importtime`. The
+script reports the median total and the slowest imports, and exits with
+status 1 when the median is over budget or when the import pulled in any of
+the modules that should only load with the agent (LangChain, DeepSeek,
+SerpAPI, the scraping stack).
+
+    python benchmarks/bench_startup.py [--runs 5] [--budget 1.0] [--build]
+
+`--build` also times building the agent, which happens after connecting.
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules the gateway path must not import
+DEFERRED = ("langchain", "langchain_deepseek", "langgraph", "openai", "serpapi",
+            "trafilatura", "bs4", "requests", "murphy.utils.agent_tools")
+
+PROBE = """
+import sys, time
+sys.path.insert(0, {root!r})
+import murphy.chatbot as chatbot
+print("LOADED", ",".join(m for m in {deferred!r} if m in sys.modules))
+if {build!r}:
+    started = time.perf_counter()
+    chatbot.agent.get()
+    print("BUILD", time.perf_counter() - started)
+    chatbot.checkpointer.get().close()
+"""
+
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def run_once(build: bool, env: dict):
+    code = PROBE.format(root=ROOT, deferred=DEFERRED, build=build)
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          capture_output=True, text=True, env=env, cwd=tempfile.gettempdir())
+    if proc.returncode != 0:
+        sys.exit(f"import failed:\n{proc.stderr[-2000:]}")
+    total = None
+    top_level = []
+    for line in proc.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if not match:
+            continue
+        cumulative, indent, name = int(match.group(2)), len(match.group(3)), match.group(4)
+        if name == "murphy.chatbot":
+            total = cumulative / 1e6
+        elif indent == 3:  # one level below murphy.chatbot
+            top_level.append((cumulative / 1e6, name))
+    loaded = build_seconds = None
+    for line in proc.stdout.splitlines():
+        if line.startswith("LOADED"):
+            loaded = [m for m in line.split(" ", 1)[1].split(",") if m]
+        elif line.startswith("BUILD"):
+            build_seconds = float(line.split()[1])
+    return total, sorted(top_level, reverse=True), loaded, build_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=float(os.getenv("MURPHY_IMPORT_BUDGET", "1.0")),
+                        help="seconds allowed for importing murphy.chatbot")
+    parser.add_argument("--build", action="store_true", help="also time building the agent")
+    args = parser.parse_args()
+
+    env = {**os.environ, "DEEPSEEK_API_KEY": os.getenv("DEEPSEEK_API_KEY", "offline"),
+           "MURPHY_CHECKPOINT_DB": os.path.join(tempfile.mkdtemp(prefix="murphy-startup-"), "checkpoints.sqlite"),
+           "LANGSMITH_TRACING": "false"}
+    env.pop("MURPHY_METRICS_PORT", None)
+
+    run_once(False, env)  # compile .pyc files first
+    runs = [run_once(args.build, env) for _ in range(args.runs)]
+    median = statistics.median(total for total, *_ in runs)
+    _, top_level, loaded, _ = runs[-1]
+
+    print(f"import murphy.chatbot: median {median:.3f}s over {args.runs} runs (budget {args.budget:.2f}s)")
+    for seconds, name in top_level[:8]:
+        print(f"  {seconds:7.3f}s  {name}")
+    if args.build:
+        print(f"agent build: median {statistics.median(b for *_, b in runs):.3f}s")
+
+    failed = False
+    if loaded:
+        print(f"FAIL: imported at startup: {', '.join(loaded)}")
+        failed = True
+    if median > args.budget:
+        print(f"FAIL: over the import budget by {median - args.budget:.3f}s")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
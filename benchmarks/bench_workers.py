@@ -0,0 +1,95 @@
+"""Throughput of CPU-bound agent-side work inline vs across worker processes.
+
+Each job is what a worker does besides waiting on the model: keyword and
+similarity search over a fresh thread's history (the tools' cold path). The
+jobs are spread over many channels and run inline on one event loop, then
+through `WorkerPool`s of increasing size; this module is also the worker.
+A trivial job measures the IPC round trip.
+
+    python benchmarks/bench_workers.py [--workers 1,2,4] [--jobs 32] [--size 2000]
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import AIMessage, HumanMessage  # noqa: E402
+
+from murphy.utils.history_search import search_history  # noqa: E402
+from murphy.utils.similarity import search_similar  # noqa: E402
+from murphy.utils.workers import WorkerPool  # noqa: E402
+
+_threads = itertools.count()
+_transcripts = {}
+
+
+def _transcript(size: int):
+    if size not in _transcripts:
+        _transcripts[size] = [
+            (AIMessage if i % 2 else HumanMessage)(
+                content=f"host 10.0.{i % 250}.{i % 7} port {80 + i % 9} kerberos ticket #{i} ldap bind", id=f"m{i}")
+            for i in range(size)
+        ]
+    return _transcripts[size]
+
+
+async def handle_job(job, emit):
+    if job["size"] == 0:
+        return None  # round-trip probe
+    messages = _transcript(job["size"])
+    thread_id = f"{job['channel']}-{os.getpid()}-{next(_threads)}"
+    search_history('(ldap OR kerberos) AND NOT assistant:"no results"', messages, thread_id)
+    return len(search_similar("kerberos tickets on port 85", messages, thread_id))
+
+
+async def run_inline(jobs):
+    started = time.perf_counter()
+    for job in jobs:
+        await handle_job(job, None)
+    return time.perf_counter() - started
+
+
+async def run_pool(size: int, jobs, probes: int):
+    pool = WorkerPool(size, "bench_workers")
+    pool.start()
+    try:
+        # Warm every worker (imports, transcript) before timing
+        await asyncio.gather(*(pool.submit(channel, {**jobs[0], "channel": channel}).wait()
+                               for channel in range(size * 8)))
+        round_trips = []
+        for channel in range(probes):
+            started = time.perf_counter()
+            await pool.submit(channel, {"size": 0, "channel": channel}).wait()
+            round_trips.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        await asyncio.gather(*(pool.submit(job["channel"], job).wait() for job in jobs))
+        return time.perf_counter() - started, statistics.median(round_trips)
+    finally:
+        await asyncio.to_thread(pool.close)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4", help="pool sizes to compare")
+    parser.add_argument("--jobs", type=int, default=32)
+    parser.add_argument("--size", type=int, default=2000, help="messages per thread")
+    args = parser.parse_args()
+
+    jobs = [{"size": args.size, "channel": 1000 + i} for i in range(args.jobs)]
+    print(f"{args.jobs} jobs x {args.size} messages, {os.cpu_count()} CPUs")
+    print(f"{'mode':<12} {'jobs/s':>8} {'speedup':>8} {'IPC p50 ms':>11}")
+    await handle_job(jobs[0], None)  # warm imports and the transcript
+    inline = await run_inline(jobs)
+    print(f"{'inline':<12} {args.jobs / inline:>8.1f} {1.0:>8.2f} {'-':>11}")
+    for size in (int(n) for n in args.workers.split(",")):
+        elapsed, round_trip = await run_pool(size, jobs, probes=20)
+        print(f"{f'{size} workers':<12} {args.jobs / elapsed:>8.1f} {inline / elapsed:>8.2f} {round_trip * 1000:>11.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,309 @@
+"""Measurement helpers and offline stand-ins for the benchmark suite.
+
+- `measure` times a callable (sync or async), reporting throughput, p50/p99
+  latency and peak Python heap use (measured in a separate traced run, so
+  tracing doesn't skew the timings).
+- `SiteServer` is a local HTTP server built from the `docs_page.html` fixture,
+  with page size and link count controlled per request.
+- `FakeChannel`, `FakeMessage` and `FakeUser` replay a recorded chat
+  transcript through the parts of discord.py's API Murphy uses.
+
+Nothing here touches the network beyond 127.0.0.1.
+"""
+import asyncio
+import inspect
+import json
+import math
+import os
+import statistics
+import threading
+import time
+import tracemalloc
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+import discord
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def load_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def load_json_fixture(name: str) -> Any:
+    return json.loads(load_fixture(name))
+
+
+@dataclass
+class Result:
+    name: str
+    size: str
+    runs: int
+    ops_per_second: float
+    p50_ms: float
+    p99_ms: float
+    peak_kib: float
+    mb_per_second: Optional[float] = None
+
+    def as_dict(self):
+        return asdict(self)
+
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class Runner:
+    """Runs measurements on one event loop, adapting run counts to a time budget"""
+
+    def __init__(self, min_runs: int = 5, max_runs: int = 200, budget: float = 1.0):
+        self.min_runs = min_runs
+        self.max_runs = max_runs
+        self.budget = budget
+        self.loop = asyncio.new_event_loop()
+        self.results: List[Result] = []
+
+    def _call(self, fn: Callable, arg) -> Any:
+        result = fn(arg)
+        if inspect.isawaitable(result):
+            result = self.loop.run_until_complete(result)
+        return result
+
+    def measure(self, name: str, size: str, fn: Callable, setup: Callable = lambda i: None,
+                payload_bytes: Optional[int] = None, warmup: int = 0) -> Result:
+        """Time `fn(setup(i))`; `setup` prepares per-run input outside the timed region.
+
+        `warmup` untimed calls run first, e.g. to fill a cache for a "warm" variant.
+        """
+        for i in range(warmup):
+            self._call(fn, setup(-1 - i))
+        timings = []
+        run = 0
+        started = time.perf_counter()
+        while run < self.max_runs and (run < self.min_runs or time.perf_counter() - started < self.budget):
+            arg = setup(run)
+            t0 = time.perf_counter()
+            self._call(fn, arg)
+            timings.append(time.perf_counter() - t0)
+            run += 1
+
+        # One extra run under tracemalloc for peak memory
+        arg = setup(run)
+        tracemalloc.start()
+        try:
+            self._call(fn, arg)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        timings.sort()
+        total = sum(timings)
+        result = Result(
+            name=name,
+            size=size,
+            runs=len(timings),
+            ops_per_second=len(timings) / total if total else float("inf"),
+            p50_ms=statistics.median(timings) * 1000,
+            p99_ms=_percentile(timings, 0.99) * 1000,
+            peak_kib=peak / 1024,
+            mb_per_second=(payload_bytes * len(timings) / total / 1e6) if payload_bytes and total else None,
+        )
+        self.results.append(result)
+        print(format_result(result), flush=True)
+        return result
+
+    def close(self):
+        self.loop.close()
+
+
+HEADER = f"{'benchmark':<38} {'size':>10} {'runs':>5} {'ops/s':>10} {'p50 ms':>10} {'p99 ms':>10} {'peak KiB':>10} {'MB/s':>8}"
+
+
+def format_result(r: Result) -> str:
+    mbps = f"{r.mb_per_second:8.1f}" if r.mb_per_second is not None else f"{'':>8}"
+    return (f"{r.name:<38} {r.size:>10} {r.runs:>5} {r.ops_per_second:>10.1f} "
+            f"{r.p50_ms:>10.3f} {r.p99_ms:>10.3f} {r.peak_kib:>10.0f} {mbps}")
+
+
+# Local HTTP stand-in
+
+def _page_body(target_bytes: int, seed: str) -> str:
+    paragraph = ("<p>Scan profiles control which ports are probed, how aggressively services are "
+                 "fingerprinted and how results are written. Rate limits apply per target network. "
+                 f"<code>{seed}</code></p>\n")
+    sections = []
+    size = 0
+    n = 0
+    while size < target_bytes:
+        block = f"<h2 id='s{n}'>Section {n}</h2>\n" + paragraph * 4
+        sections.append(block)
+        size += len(block)
+        n += 1
+    return "".join(sections)
+
+
+class _SiteHandler(BaseHTTPRequestHandler):
+    template = ""
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        if parts.path == "/robots.txt":
+            return self._send(b"User-agent: *\nDisallow: /private/\n", "text/plain")
+        query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        size = int(query.get("size", 20_000))
+        links = int(query.get("links", 10))
+        pages = int(query.get("pages", 1000))
+        index = int(parts.path.rsplit("/", 1)[-1].split(".")[0] or 0) if parts.path.startswith("/page/") else 0
+        hrefs = "".join(
+            f"<a href='/page/{(index * 7 + k) % pages}.html?size={size}&links={links}&pages={pages}'>p{k}</a> "
+            for k in range(links)
+        )
+        # The request path goes into the page so every URL has distinct content
+        html = self.template.replace("{{BODY}}", _page_body(size, self.path)).replace("{{LINKS}}", hrefs)
+        self._send(html.encode("utf-8"), "text/html; charset=utf-8")
+
+    def _send(self, body: bytes, content_type: str):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class SiteServer:
+    """Serves generated docs pages on 127.0.0.1 from a background thread"""
+
+    def __init__(self):
+        handler = type("SiteHandler", (_SiteHandler,), {"template": load_fixture("docs_page.html")})
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def url(self, path: str = "/page/0.html", **query) -> str:
+        qs = "&".join(f"{key}={value}" for key, value in query.items())
+        return f"http://127.0.0.1:{self.server.server_address[1]}{path}" + (f"?{qs}" if qs else "")
+
+
+# Discord stand-ins
+
+class FakeUser:
+    def __init__(self, user_id: int, name: str, bot: bool = False):
+        self.id = user_id
+        self.name = name
+        self.bot = bot
+
+    def mentioned_in(self, message) -> bool:
+        return f"<@{self.id}>" in message.content
+
+    def __eq__(self, other):
+        return isinstance(other, FakeUser) and other.id == self.id
+
+    def __hash__(self):
+        return self.id
+
+
+class FakeAttachment:
+    """An attachment served from memory (no URL, so it's read in one go)"""
+
+    def __init__(self, filename: str, data: bytes, content_type: str = "text/plain; charset=utf-8"):
+        self.filename = filename
+        self.content_type = content_type
+        self.size = len(data)
+        self.url = None
+        self._data = data
+
+    async def read(self):
+        return self._data
+
+
+class FakeMessage:
+    def __init__(self, message_id: int, content: str, author: FakeUser, channel, created_at: datetime):
+        self.id = message_id
+        self.content = content
+        self.author = author
+        self.channel = channel
+        self.created_at = created_at
+        self.attachments = []
+        self.reference = None
+        self.guild = None
+
+    async def reply(self, content):
+        return await self.channel.send(content)
+
+    async def edit(self, content=None):
+        self.content = content
+
+
+class FakeChannel(discord.TextChannel):
+    """A text channel whose history is an in-memory list (oldest first)"""
+
+    def __init__(self, channel_id: int, bot_user: FakeUser):
+        self.id = channel_id
+        self.bot_user = bot_user
+        self.messages: List[FakeMessage] = []
+        self._by_id = {}
+        self._next_id = channel_id * 1_000_000
+
+    def __repr__(self):
+        return f"<FakeChannel id={self.id} messages={len(self.messages)}>"
+
+    def add(self, content: str, author: FakeUser) -> FakeMessage:
+        self._next_id += 1
+        created_at = datetime(2025, 1, 1, tzinfo=timezone.utc) + timedelta(seconds=self._next_id % 10_000_000)
+        message = FakeMessage(self._next_id, content, author, self, created_at)
+        self.messages.append(message)
+        self._by_id[message.id] = message
+        return message
+
+    async def history(self, limit=100, after=None, oldest_first=None, **kwargs):
+        messages = self.messages
+        if after is not None:
+            messages = [m for m in messages if m.id > after.id]
+            ordered = messages if oldest_first is not False else list(reversed(messages))
+        else:
+            ordered = list(reversed(messages)) if not oldest_first else messages
+        for message in ordered[:limit]:
+            yield message
+
+    async def fetch_message(self, message_id):
+        return self._by_id[message_id]
+
+    async def send(self, content):
+        return self.add(content, self.bot_user)
+
+    @asynccontextmanager
+    async def typing(self):
+        yield
+
+
+def transcript_channel(channel_id: int, length: int, bot_user: FakeUser) -> FakeChannel:
+    """A channel holding `length` messages replayed from the chat_history fixture"""
+    records = [json.loads(line) for line in load_fixture("chat_history.jsonl").splitlines() if line.strip()]
+    users = {}
+    channel = FakeChannel(channel_id, bot_user)
+    for i in range(length):
+        record = records[i % len(records)]
+        if record["role"] == "assistant":
+            author = bot_user
+        else:
+            author = users.setdefault(record["author"], FakeUser(len(users) + 100, record["author"]))
+        channel.add(f"{record['content']} (#{i})", author)
+    return channel
@@ -0,0 +1,277 @@
+"""Offline benchmarks for Murphy's tools and message pipeline.
+
+Replays the recorded fixtures in benchmarks/fixtures through the real code
+paths, against a local HTTP server and in-memory Discord channels, at
+increasing input sizes. Needs no network access and no API keys.
+
+    python benchmarks/run.py                       # full run
+    python benchmarks/run.py --quick               # two smallest sizes only
+    python benchmarks/run.py --only read_webpage   # benchmarks whose name contains this
+    python benchmarks/run.py --json out.json       # save results
+    python benchmarks/run.py --baseline out.json   # fail on p50 regressions
+
+With --baseline the exit status is 1 when any benchmark's p50 latency grew by
+more than --threshold (default 1.5x) compared to the saved run.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The bot module reads its settings at import time; keep it offline
+_tmp = tempfile.mkdtemp(prefix="murphy-bench-")
+os.environ.setdefault("DEEPSEEK_API_KEY", "offline")
+os.environ.setdefault("MURPHY_CHECKPOINT_DB", os.path.join(_tmp, "checkpoints.sqlite"))
+os.environ["LANGSMITH_TRACING"] = "false"
+os.environ.pop("MURPHY_METRICS_PORT", None)
+os.environ.pop("MURPHY_TRACE_FILE", None)
+
+from langchain_core.messages import AIMessage, HumanMessage  # noqa: E402
+
+from bench_split_message import llm_output  # noqa: E402
+from harness import (HEADER, FakeAttachment, FakeUser, Runner,  # noqa: E402
+                     SiteServer, load_fixture, load_json_fixture,
+                     transcript_channel)
+from murphy import chatbot  # noqa: E402
+from murphy.utils import agent_tools  # noqa: E402
+from murphy.utils.attachments import (AttachmentStore,  # noqa: E402
+                                     attachment_context, ingest_attachments)
+from murphy.utils.crawler import Crawler  # noqa: E402
+from murphy.utils.serp_format import render_text_blocks  # noqa: E402
+from murphy.utils.utilityfuncs import format_weather_data, split_message  # noqa: E402
+from murphy.utils.webclient import close_async_session  # noqa: E402
+
+SIZES = {
+    "read_webpage": [10_000, 100_000, 1_000_000, 4_000_000],
+    "search_chat_history": [100, 1_000, 10_000],
+    "split_message": [10_000, 100_000, 1_000_000],
+    "format_weather_data": [1, 10, 100],
+    "serp_render": [1, 10, 100],
+    "crawl_url": [10, 100, 1_000],
+    "process_message_with_context": [100, 1_000, 3_000],
+    "attachments": [100_000, 1_000_000, 8_000_000],
+}
+
+CRAWL_PAGES = 20
+HISTORY_QUERY = '(ldap OR kerberos) AND NOT assistant:"no results"'
+SIMILAR_QUERY = "what did we find when enumerating kerberos tickets"
+
+
+def _label(n: int) -> str:
+    for unit, scale in (("M", 1_000_000), ("k", 1_000)):
+        if n >= scale:
+            return f"{n / scale:g}{unit}"
+    return str(n)
+
+
+def bench_read_webpage(runner, site, sizes):
+    for size in sizes:
+        # A distinct URL per run, so every call downloads and extracts
+        def setup(i, size=size):
+            return site.url(f"/page/{i}.html", size=size, links=20)
+        runner.measure("read_webpage", f"{_label(size)}B", agent_tools.read_webpage.coroutine, setup,
+                       payload_bytes=size)
+
+
+def _chat_messages(length):
+    records = [json.loads(line) for line in load_fixture("chat_history.jsonl").splitlines() if line.strip()]
+    messages = []
+    for i in range(length):
+        record = records[i % len(records)]
+        cls = AIMessage if record["role"] == "assistant" else HumanMessage
+        messages.append(cls(content=f"{record['content']} (#{i})", id=f"m{i}"))
+    return messages
+
+
+def bench_search_chat_history(runner, sizes):
+    search = agent_tools.search_chat_history.func
+    for size in sizes:
+        messages = _chat_messages(size)
+
+        # Cold: a new thread every run, so the index is built from scratch
+        def cold(i, size=size):
+            return {"configurable": {"thread_id": f"bench-cold-{size}-{i}"}}
+        runner.measure("search_chat_history (cold)", f"{_label(size)} msgs",
+                       lambda config, messages=messages: search(HISTORY_QUERY, messages, config), cold)
+
+        # Warm: the same thread, index already in sync
+        warm = {"configurable": {"thread_id": f"bench-warm-{size}"}}
+        runner.measure("search_chat_history (warm)", f"{_label(size)} msgs",
+                       lambda config, messages=messages: search(HISTORY_QUERY, messages, config),
+                       lambda i, warm=warm: warm, warmup=1)
+
+        # Similarity mode: hashed TF-IDF vectors, embedded once per message
+        runner.measure("search_chat_history (similar, cold)", f"{_label(size)} msgs",
+                       lambda config, messages=messages: search(SIMILAR_QUERY, messages, config, similar=True),
+                       lambda i, size=size: {"configurable": {"thread_id": f"bench-similar-{size}-{i}"}})
+        warm = {"configurable": {"thread_id": f"bench-similar-warm-{size}"}}
+        runner.measure("search_chat_history (similar, warm)", f"{_label(size)} msgs",
+                       lambda config, messages=messages: search(SIMILAR_QUERY, messages, config, similar=True),
+                       lambda i, warm=warm: warm, warmup=1)
+
+
+def bench_split_message(runner, sizes):
+    for size in sizes:
+        text = llm_output(size)
+        runner.measure("split_message", f"{_label(size)} chars", split_message, lambda i, text=text: text,
+                       payload_bytes=len(text))
+
+
+def _scaled_blocks(fixture, factor):
+    data = load_json_fixture(fixture)
+    blocks = [block for _ in range(factor) for block in data["text_blocks"]]
+    return blocks, data.get("references")
+
+
+def bench_serp(runner, weather_sizes, search_sizes):
+    for factor in weather_sizes:
+        blocks, _ = _scaled_blocks("serpapi_weather.json", factor)
+        runner.measure("format_weather_data", f"x{factor}", format_weather_data, lambda i, blocks=blocks: blocks)
+    for factor in search_sizes:
+        blocks, references = _scaled_blocks("serpapi_search.json", factor)
+        runner.measure("serp_render (web_search)", f"x{factor}",
+                       lambda blocks, references=references: render_text_blocks(
+                           blocks, references, max_tokens=agent_tools.SEARCH_MAX_TOKENS),
+                       lambda i, blocks=blocks: blocks)
+
+
+def bench_crawl(runner, site, sizes):
+    async def crawl(url):
+        # The crawl_url tool's engine and formatting, minus the politeness
+        # delay (a fixed sleep that would swamp the measurement)
+        options = agent_tools._crawl_options(50, True, CRAWL_PAGES, False)
+        result = await Crawler(url, host_delay=0, **options).crawl()
+        return agent_tools._format_crawl(result, False)
+
+    for links in sizes:
+        def setup(i, links=links):
+            # A fresh `pages` value per run gives a fresh URL space
+            return site.url("/page/0.html", size=5_000, links=links, pages=CRAWL_PAGES * 50 + i)
+        runner.measure(f"crawl_url ({CRAWL_PAGES} pages)", f"{_label(links)} links", crawl, setup)
+
+
+def bench_process_message(runner, sizes):
+    bot_user = FakeUser(1, "Spider Murphy", bot=True)
+    chatbot.bot._connection.user = bot_user
+    user = FakeUser(2, "alice")
+    channel_ids = iter(range(10_000, 1_000_000))
+
+    for size in sizes:
+        # Cold: a channel Murphy hasn't seen, so its history is scanned
+        def cold(i, size=size):
+            channel = transcript_channel(next(channel_ids), size, bot_user)
+            return channel.add(f"<@{bot_user.id}> what did we find on the DC?", user)
+        runner.measure("process_message (cold)", f"{_label(size)} msgs",
+                       chatbot.process_message_with_context, cold)
+
+        # Warm: the channel's history is cached, only new messages are read
+        channel = transcript_channel(next(channel_ids), size, bot_user)
+
+        def warm(i, channel=channel):
+            return channel.add(f"<@{bot_user.id}> and the next step? ({i})", user)
+        runner.measure("process_message (warm)", f"{_label(size)} msgs",
+                       chatbot.process_message_with_context, warm, warmup=1)
+
+
+def _scan_dump(size: int) -> bytes:
+    """nmap-style output of about `size` bytes"""
+    lines = []
+    total = host = 0
+    while total < size:
+        block = (f"Nmap scan report for 10.0.{host // 250}.{host % 250}\nHost is up (0.0010s latency).\n"
+                 f"PORT     STATE SERVICE VERSION\n22/tcp open  ssh OpenSSH 7.2p2\n"
+                 f"{80 + host % 7}/tcp open  http Apache httpd 2.4.{host % 60}\n445/tcp open  microsoft-ds\n\n")
+        lines.append(block)
+        total += len(block)
+        host += 1
+    return "".join(lines).encode()
+
+
+def bench_attachments(runner, sizes):
+    bot_user = FakeUser(1, "Spider Murphy", bot=True)
+    user = FakeUser(2, "alice")
+    question = "which hosts run Apache httpd 2.4.49 on port 85?"
+
+    for size in sizes:
+        data = _scan_dump(size)
+
+        async def ingest(message):
+            store = AttachmentStore()
+            files, _ = await ingest_attachments(message.channel.id, message.attachments, store)
+            return attachment_context(message.channel.id, question, files, store)
+
+        def setup(i, data=data):
+            channel = transcript_channel(20_000 + i, 0, bot_user)
+            message = channel.add(question, user)
+            message.attachments = [FakeAttachment("scan.nmap", data)]
+            return message
+        runner.measure("attachments (ingest + retrieve)", f"{_label(size)}B", ingest, setup, payload_bytes=len(data))
+
+
+def compare(results, baseline_path, threshold) -> bool:
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["name"], r["size"]): r for r in json.load(f)}
+    ok = True
+    for result in results:
+        before = baseline.get((result.name, result.size))
+        if before is None or not before["p50_ms"]:
+            continue
+        ratio = result.p50_ms / before["p50_ms"]
+        if ratio > threshold:
+            ok = False
+            print(f"REGRESSION {result.name} [{result.size}]: p50 {before['p50_ms']:.3f} -> "
+                  f"{result.p50_ms:.3f} ms ({ratio:.2f}x)")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="only the two smallest sizes")
+    parser.add_argument("--only", help="run benchmarks whose name contains this")
+    parser.add_argument("--budget", type=float, default=1.0, help="seconds per benchmark (at least 5 runs)")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="compare against results saved with --json")
+    parser.add_argument("--threshold", type=float, default=1.5, help="allowed p50 slowdown vs the baseline")
+    args = parser.parse_args()
+
+    sizes = {name: values[:2] if args.quick else values for name, values in SIZES.items()}
+    selected = {name: not args.only or args.only in name for name in sizes}
+
+    runner = Runner(budget=args.budget)
+    print(HEADER)
+    try:
+        with SiteServer() as site:
+            if selected["read_webpage"]:
+                bench_read_webpage(runner, site, sizes["read_webpage"])
+            if selected["crawl_url"]:
+                bench_crawl(runner, site, sizes["crawl_url"])
+            runner.loop.run_until_complete(close_async_session())
+        if selected["search_chat_history"]:
+            bench_search_chat_history(runner, sizes["search_chat_history"])
+        if selected["split_message"]:
+            bench_split_message(runner, sizes["split_message"])
+        if selected["format_weather_data"] or selected["serp_render"]:
+            bench_serp(runner,
+                       sizes["format_weather_data"] if selected["format_weather_data"] else [],
+                       sizes["serp_render"] if selected["serp_render"] else [])
+        if selected["attachments"]:
+            bench_attachments(runner, sizes["attachments"])
+        if selected["process_message_with_context"]:
+            bench_process_message(runner, sizes["process_message_with_context"])
+    finally:
+        runner.close()
+        if chatbot.checkpointer.loaded:
+            chatbot.checkpointer.get().close()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump([r.as_dict() for r in runner.results], f, indent=2)
+    if args.baseline and not compare(runner.results, args.baseline, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
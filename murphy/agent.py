@@ -0,0 +1,181 @@
+"""The agent: model, tools, system prompt and conversation state (checkpoints).
+
+Used in the gateway process by default, or in agent worker processes when
+`MURPHY_WORKERS` is set (see murphy/worker.py). Nothing here imports the LLM
+stack until the agent is first built.
+
+There are two agents over the same tools and checkpoints: the reasoner, and
+a fast one on the chat model for simple requests (see murphy/utils/routing.py).
+"""
+import os
+import time
+from typing import AsyncIterator, List, Optional, Tuple
+
+from murphy.utils.lazy import LazyResource
+from murphy.utils.message_context import MessageContext, render_context
+from murphy.utils.routing import choose_route, route_stats
+from murphy.utils.telemetry import telemetry
+from murphy.utils.utilityfuncs import message_text
+
+SYSTEM_PROMPT = """You are a pentesting assistant. Use your tools to assist the user(s). 
+        
+        Give concise, professional responses. No emoji's.
+        
+        Reference Links:
+        - swisskyrepo.github.io/InternalAllTheThings
+        - swisskyrepo.github.io/PayloadsAllTheThings
+        - gtfobins.github.io
+        - lolbas-project.github.io"""
+
+telemetry_callbacks = []  # filled in by build_agent
+
+# Initialize LangChain components. Both are built on first use or by the
+# warm-up task after connecting, so restarts reach Discord in well under a second
+def build_checkpointer():
+    """Conversation state: recent threads in memory, idle ones evicted to SQLite"""
+    from murphy.utils.checkpointer import PersistentSaver
+    return PersistentSaver(
+        os.getenv('MURPHY_CHECKPOINT_DB', 'murphy_checkpoints.sqlite'),
+        max_threads=int(os.getenv('MURPHY_MAX_RESIDENT_THREADS', '64')),
+        max_thread_bytes=int(os.getenv('MURPHY_MAX_THREAD_KB', '4096')) * 1024,
+    )
+
+def _create_agent(model_name: str, max_tokens: int):
+    """Import the LLM stack and tools, and create an agent on `model_name`"""
+    from langchain.agents import create_agent
+    from langchain_core.messages import SystemMessage
+    from langchain_deepseek import ChatDeepSeek
+
+    from murphy.utils import (calculate, clock, crawl_url, get_weather,
+                              read_webpage, read_webpages, search_attachments,
+                              search_chat_history, web_search)
+    from murphy.utils.context_window import ContextWindowManager, ModelSummarizer
+    from murphy.utils.telemetry_callbacks import TelemetryCallbackHandler
+
+    if not telemetry_callbacks:
+        telemetry_callbacks.append(TelemetryCallbackHandler())
+
+    # Initialize DeepSeek model
+    model = ChatDeepSeek(
+        temperature=0,
+        api_key=os.getenv('DEEPSEEK_API_KEY'),
+        model=model_name,
+        max_tokens=max_tokens,
+    )
+
+    # Keeps each model call within a token budget: recent turns verbatim, stale
+    # tool outputs stubbed, older turns folded into a rolling summary
+    context_window = ContextWindowManager(
+        max_tokens=32000,
+        recent_tokens=16000,
+        summarizer=ModelSummarizer(ChatDeepSeek(
+            temperature=0,
+            api_key=os.getenv('DEEPSEEK_API_KEY'),
+            model="deepseek-chat",
+            max_tokens=1024,
+        )),
+    )
+
+    # Create agent
+    return create_agent(
+        model,
+        tools=[
+            get_weather, web_search, clock, calculate, search_chat_history,
+            search_attachments, read_webpage, read_webpages, crawl_url
+            ],
+        prompt=SystemMessage(content=SYSTEM_PROMPT),
+        pre_model_hook=context_window.as_hook(),
+        checkpointer=checkpointer.get()
+    )
+
+def build_agent():
+    # doubles max output. we're using the reasoner model, so base output is 32k
+    return _create_agent("deepseek-reasoner", max_tokens=64000)
+
+def build_fast_agent():
+    """The chat model for requests the router deems simple: no reasoning step"""
+    return _create_agent("deepseek-chat", max_tokens=8192)
+
+checkpointer = LazyResource("checkpointer", build_checkpointer)
+agent = LazyResource("agent", build_agent)
+fast_agent = LazyResource("fast_agent", build_fast_agent)
+
+async def thread_has_state(thread_id: str) -> bool:
+    """Whether the agent already has a conversation for this thread (else it needs channel history)"""
+    saver = await checkpointer.aget()
+    existing_state = await saver.aget_tuple({"configurable": {"thread_id": thread_id}})
+    return existing_state is not None and bool(existing_state[0])
+
+def _config(thread_id: str) -> dict:
+    return {
+        "configurable": {"thread_id": thread_id},
+        "recursion_limit": 100,
+        "callbacks": telemetry_callbacks,
+    }
+
+async def answer_stream(thread_id: str, content: str, stream: bool = True,
+                        fast: bool = False) -> AsyncIterator[Tuple[str, Optional[int]]]:
+    """Run the agent (the fast one with `fast`) on `content`, yielding its answer as (text, step) pieces.
+
+    With `stream` the pieces arrive as tokens are generated (`step` separates
+    model calls); otherwise the whole answer is yielded once at the end.
+    """
+    from langchain_core.messages import AIMessage, HumanMessage
+
+    runnable = await (fast_agent if fast else agent).aget()
+    inputs = {"messages": [HumanMessage(content=content)]}
+    config = _config(thread_id)
+
+    # Run the agent natively on the event loop. Network-bound tools
+    # are awaited; only CPU-bound tools are pushed to threads.
+    if not stream:
+        response = await runnable.ainvoke(inputs, config)
+        yield message_text(response["messages"][-1].content), None
+        return
+
+    streamed = False
+    async for chunk, metadata in runnable.astream(inputs, config, stream_mode="messages"):
+        # Only the model node's output; skip tool results and context summaries
+        if metadata.get("langgraph_node") == "agent" and isinstance(chunk, AIMessage):
+            text = message_text(chunk.content)
+            if text:
+                streamed = True
+                yield text, metadata.get("langgraph_step")
+    if not streamed:
+        # Nothing streamed (e.g. provider fell back to a single response)
+        state = await runnable.aget_state(config)
+        yield message_text(state.values["messages"][-1].content), None
+
+async def _record_direct_answer(thread_id: str, content: str, answer: str) -> None:
+    """Add a routed-around exchange to the thread, so later turns see it"""
+    from langchain_core.messages import AIMessage, HumanMessage
+
+    runnable = await agent.aget()
+    await runnable.aupdate_state(
+        _config(thread_id),
+        {"messages": [HumanMessage(content=content), AIMessage(content=answer)]},
+        as_node="agent",
+    )
+
+async def answer_contexts(thread_id: str, contexts: List[MessageContext],
+                          stream: bool = True) -> AsyncIterator[Tuple[str, Optional[int]]]:
+    """Answer one run of gathered messages (oldest first) on the route they need.
+
+    History is rendered only for a thread without conversation state. A
+    direct answer skips the model and is written to the thread afterwards.
+    """
+    has_state = await thread_has_state(thread_id)
+    telemetry.annotate(checkpoint=has_state)
+    contents = [await render_context(context, include_history=not has_state) for context in contexts]
+    content = "\n\n---\n\n".join(contents)
+
+    route, answer = choose_route(contexts)
+    telemetry.annotate(route=route)
+    started = time.perf_counter()
+    if answer is not None:
+        yield answer, None
+        await _record_direct_answer(thread_id, content, answer)
+    else:
+        async for piece in answer_stream(thread_id, content, stream, fast=route == "fast"):
+            yield piece
+    route_stats.record(route, time.perf_counter() - started)
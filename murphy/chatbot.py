@@ -1,155 +1,156 @@
 import asyncio
 import os
+import sys
+import time
 from typing import Any, Dict, List
 
+_import_started = time.perf_counter()
+
 import discord
 from discord.ext import commands
 from dotenv import load_dotenv
-from langchain.agents import create_agent
-from langchain_core.messages import HumanMessage, SystemMessage
-from langchain_core.messages.utils import count_tokens_approximately
-from langchain_deepseek import ChatDeepSeek
-from langgraph.checkpoint.memory import InMemorySaver
 
-from murphy.utils import (calculate, clock, crawl_url, get_weather,
-                          read_webpage, search_chat_history, split_message,
-                          web_search)
+from murphy.agent import agent, answer_contexts, checkpointer, fast_agent, thread_has_state
+from murphy.utils.channel_history import ChannelHistoryStore
+from murphy.utils.lazy import warmup_mode
+from murphy.utils.message_cache import MessageMetadataCache
+from murphy.utils.message_context import MessageContext, render_context
+from murphy.utils.prefetch import prefetch_scope
+from murphy.utils.scheduler import AgentScheduler, parse_group_weights
+from murphy.utils.streaming import StreamingReply
+from murphy.utils.telemetry import start_metrics_server, telemetry
+from murphy.utils.utilityfuncs import split_message
 
 # Load environment variables
 load_dotenv()
 
+# Stream answers into Discord as they are generated (edits in place)
+STREAM_RESPONSES = os.getenv('MURPHY_STREAM_RESPONSES', 'true').lower() in ('1', 'true', 'yes')
+
+# Seconds this module may take to import before we warn (see benchmarks/bench_startup.py)
+IMPORT_BUDGET = float(os.getenv('MURPHY_IMPORT_BUDGET', '1.0'))
+
+# Agent worker processes. 0: the agent runs in this process. Otherwise this
+# process only talks to Discord, and each channel is answered by one worker
+WORKERS = int(os.getenv('MURPHY_WORKERS', '0'))
+
+# Gateway sharding: "auto" (Discord's recommended count) or a shard count.
+# MURPHY_SHARD_IDS picks the shards this process runs (e.g. "0,1"), so several
+# gateway processes can split the guilds. Unset: a single connection
+SHARD_COUNT = os.getenv('MURPHY_SHARD_COUNT', '').strip().lower()
+SHARD_IDS = [int(shard) for shard in os.getenv('MURPHY_SHARD_IDS', '').split(',') if shard.strip()] or None
+if SHARD_IDS and SHARD_COUNT in ('', 'auto'):
+    raise SystemExit("MURPHY_SHARD_IDS needs a numeric MURPHY_SHARD_COUNT (with 'auto' Discord picks "
+                     "the count, and this process would have to run every shard)")
+
+def _per_shard(path: str) -> str:
+    root, ext = os.path.splitext(path)
+    return f"{root}.shards{'-'.join(map(str, SHARD_IDS))}{ext}"
+
+if SHARD_IDS:
+    # Gateway processes running different shards keep their own conversations
+    # and traces (workers inherit these paths and add their index)
+    os.environ['MURPHY_CHECKPOINT_DB'] = _per_shard(os.getenv('MURPHY_CHECKPOINT_DB', 'murphy_checkpoints.sqlite'))
+    if os.getenv('MURPHY_TRACE_FILE'):
+        os.environ['MURPHY_TRACE_FILE'] = _per_shard(os.environ['MURPHY_TRACE_FILE'])
+
+# Telemetry exports: Prometheus text on localhost (served once the bot runs),
+# and/or a JSONL span trace
+telemetry.configure(trace_file=os.getenv('MURPHY_TRACE_FILE'))
+
+class MurphyBot(commands.AutoShardedBot if SHARD_COUNT else commands.Bot):
+    async def close(self):
+        # Close the tools' shared HTTP client along with the gateway connection,
+        # and get every conversation onto disk
+        if 'murphy.utils.webclient' in sys.modules:  # only loaded once a tool ran
+            await sys.modules['murphy.utils.webclient'].close_async_session()
+        if checkpointer.loaded:
+            checkpointer.get().close()
+        if workers is not None:
+            await asyncio.to_thread(workers.close)
+        await super().close()
+
 # Initialize Discord bot
 intents = discord.Intents.default()
 intents.message_content = True
-bot = commands.Bot(command_prefix='!', intents=intents)
+shard_options = {}
+if SHARD_COUNT:
+    shard_options = {"shard_count": None if SHARD_COUNT == "auto" else int(SHARD_COUNT), "shard_ids": SHARD_IDS}
+bot = MurphyBot(command_prefix='!', intents=intents, **shard_options)
 
-# Initialize LangChain components
-checkpointer = InMemorySaver()
+WARMUP = warmup_mode()
 
-# Initialize DeepSeek model
-model = ChatDeepSeek(
-    temperature=0,
-    api_key=os.getenv('DEEPSEEK_API_KEY'),
-    model="deepseek-reasoner",
-    max_tokens=64000, # doubles max output. we're using the reasoner model, so base output is 32k
-)
+if WORKERS:
+    from murphy.utils.workers import WorkerPool
+    workers = WorkerPool(WORKERS, "murphy.worker")
+else:
+    workers = None
+# Channels whose worker holds their conversation (no need to send history)
+worker_threads = set()
 
-# Create agent
-agent = create_agent(
-    model,
-    tools=[
-        get_weather, web_search, clock, calculate,
-        search_chat_history, read_webpage, crawl_url
-        ],
-    prompt=SystemMessage(content="""You are a pentesting assistant. Use your tools to assist the user(s). 
-        
-        Give concise, professional responses. No emoji's.
-        
-        Reference Links:
-        - swisskyrepo.github.io/InternalAllTheThings
-        - swisskyrepo.github.io/PayloadsAllTheThings
-        - gtfobins.github.io
-        - lolbas-project.github.io"""),
-    checkpointer=checkpointer
-)
+# Recent messages per channel, kept current from gateway events
+channel_history = ChannelHistoryStore(max_tokens=32000)
+# Content and bot-mention flags of seen messages (thread starters, reply targets)
+message_cache = MessageMetadataCache()
 
 @bot.event
 async def on_ready():
-    print(f'{bot.user} has connected to Discord!')
+    print(f'{bot.user} has connected to Discord! ({time.perf_counter() - _import_started:.2f}s after startup)')
+    if WARMUP == "background" and workers is None:
+        agent.warm_up()
+        fast_agent.warm_up()
+
+@bot.event
+async def on_disconnect():
+    # Messages sent while we're away arrive via a catch-up fetch instead
+    channel_history.mark_stale()
+
+@bot.event
+async def on_message_edit(before, after):
+    # A starter edited to mention the bot should bring it into the thread
+    message_cache.remember(after, bot.user)
+    # Streamed replies are posted early and grow by edits; keep the final text
+    channel_history.record_edit(after, bot.user)
 
 async def load_recent_channel_history(channel, max_tokens=32000) -> List[Dict[str, Any]]:
     """Load recent channel history, staying within token limits"""
-    history = []
-    current_tokens = 0
-    
     try:
-        async for message in channel.history(limit=3000):
-            # Skip empty messages. Add `or message.author.bot` to skip bot msgs
-            if not message.content:
-                continue
-                
-            # Estimate token count for this message
-            message_tokens = count_tokens_approximately([message.content])
-            
-            # Check if adding this message would exceed our token limit
-            if current_tokens + message_tokens > max_tokens:
-                break
-                
-            # Add message to history (both user and AI messages)
-            role = "assistant" if message.author == bot.user else "user" # type: ignore
-            history.append({
-                "role": role,
-                "content": message.content,
-                "timestamp": message.created_at.isoformat(),
-                "author": message.author  # Store author object for ez referencing
-            })
-            current_tokens += message_tokens
-            
+        return await channel_history.load(channel, bot.user, max_tokens=max_tokens)
     except Exception as e:
         print(f"Error loading channel history: {e}")
-    
-    # Reverse to maintain chronological order (oldest first)
-    return list(reversed(history))
+        return []
 
-async def process_message_with_context(message):
+async def gather_context(message, load_history=True) -> MessageContext:
     """
-    Process a message with context from replies, threads, DM history, and attached files
+    Collect what the agent should know about a message from Discord: channel
+    history, the replied-to message, the thread starter and attached files
     """
-    # Start with the user's message
-    content = message.content
-    
-    # Check if we need to load history by checking Agent state
-    if isinstance(message.channel, (discord.DMChannel, discord.TextChannel, discord.Thread)):
-        # Check if we have existing state for this channel
-        thread_id = str(message.channel.id)
-        
-        # Use the correct configuration format for checkpointer
-        config = {"configurable": {"thread_id": thread_id}}
-        existing_state = checkpointer.get_tuple(config)
-        
-        # If no existing state, load recent channel history
-        if existing_state is None or not existing_state[0]:
-            channel_history = await load_recent_channel_history(message.channel)
-            if channel_history:
-                # Include both user and AI messages in the context
-                history_content = "Previous conversation:\n"
-                for msg in channel_history:
-                    speaker = msg["author"].name if msg["role"] == "user" else "Spider Murphy"
-                    history_content += f"\n{speaker}: {msg['content']}\n"
-                
-                # Add history before the current message
-                content = f"{history_content}\n\nCurrent message: {content}"
-    
-    # Check for attached files named 'message.txt' (add after the current message)
-    file_content = ""
-    for attachment in message.attachments:
-        if attachment.filename == 'message.txt':
-            try:
-                # Download and read the file content
-                file_data = await attachment.read()
-                file_content = file_data.decode('utf-8')
-                
-                # Only process the first matching file
-                break
-            except Exception as e:
-                print(f"Error reading attached file: {e}")
-                file_content = f"[Error reading attached file: {e}]"
-    
-    # Add file content after the current message
-    if file_content:
-        content = f"{content}\n\nContent from attached file 'message.txt':\n{file_content}"
+    context = MessageContext(
+        channel_id=message.channel.id,
+        content=message.content,
+        attachments=list(message.attachments),
+    )
+
+    # Load recent channel history for a conversation the agent doesn't have yet
+    if load_history and isinstance(message.channel, (discord.DMChannel, discord.TextChannel, discord.Thread)):
+        with telemetry.span("history_load") as span:
+            recent_history = await load_recent_channel_history(message.channel)
+            span.attrs["messages"] = len(recent_history)
+        # Include both user and AI messages in the context
+        context.history = [
+            (msg["author"].name if msg["role"] == "user" else "Spider Murphy", msg["content"])
+            for msg in recent_history
+        ]
     
     # Check if this is a reply to another message
     if message.reference and message.reference.message_id:
         try:
-            # Get the referenced message
-            referenced_message = await message.channel.fetch_message(message.reference.message_id)
-            # Add the referenced message content to the context
-            content = f"Replying to: {referenced_message.content[:175]}\n\nUser Message: {content}"
-        except discord.NotFound:
-            print(f"Referenced message not found: {message.reference.message_id}")
-        except discord.Forbidden:
-            print("No permission to access the referenced message")
+            # Get the referenced message (cached, or resolved by the gateway)
+            referenced_message = await message_cache.referenced(message, bot.user)
+            if referenced_message.content is None:
+                print(f"Referenced message not found or inaccessible: {message.reference.message_id}")
+            else:
+                context.reply_to = referenced_message.content
         except discord.HTTPException as e:
             print(f"HTTP error fetching message: {e}")
     
@@ -157,18 +158,107 @@ async def process_message_with_context(message):
     if isinstance(message.channel, discord.Thread):
         try:
             # Get the thread starter message
-            starter_message = await message.channel.fetch_message(message.channel.id)
-            if bot.user.mentioned_in(starter_message):
-                # Add thread starter context
-                content = f"Thread context: {starter_message.content}\n\n{content}"
+            starter_message = await message_cache.thread_starter(message.channel, bot.user)
+            if starter_message.mentions_bot:
+                context.thread_context = starter_message.content
         except:
             # If we can't get the starter message, continue without it
             pass
     
-    return content
+    return context
+
+async def process_message_with_context(message, load_history=True):
+    """
+    Process a message with context from replies, threads, DM history, and attached files
+    """
+    # Channel history is only needed when the agent has no state for this channel
+    if load_history:
+        load_history = not await thread_has_state(str(message.channel.id))
+    return await render_context(await gather_context(message, load_history))
+
+async def send_answer(message, pieces, stream=True):
+    """Post the agent's answer, given as (text, step) pieces, in reply to `message`"""
+    if stream:
+        # Post the answer as it is generated, editing it as tokens arrive
+        reply = StreamingReply(message)
+        async for text, step in pieces:
+            await reply.feed(text, step=step)
+        await reply.finish()
+        return
+    
+    # Split the response into chunks that fit Discord's limit
+    response_text = "".join([text async for text, _ in pieces])
+    chunks = split_message(response_text)
+    
+    with telemetry.span("discord_send", messages=len(chunks)):
+        # Send the first chunk as a reply to the original message
+        first_chunk = chunks[0]
+        await message.reply(first_chunk)
+        
+        # Send remaining chunks as follow-up messages
+        for chunk in chunks[1:]:
+            await message.channel.send(chunk)
+
+async def reply_with_agent(message, messages):
+    """Answer `messages` in this process and reply to `message`"""
+    thread_id = str(message.channel.id)
+    # Channel history is only needed when the agent has no state for this
+    # channel, and only for the first message; the rest follow it
+    contexts = [await gather_context(messages[0], load_history=not await thread_has_state(thread_id))]
+    for follow_up in messages[1:]:
+        contexts.append(await gather_context(follow_up, load_history=False))
+    pieces = answer_contexts(thread_id, contexts, STREAM_RESPONSES)
+    await send_answer(message, pieces, STREAM_RESPONSES)
+
+async def reply_with_worker(message, messages):
+    """Have the channel's worker process answer `messages` and reply to `message`"""
+    channel_id = message.channel.id
+    # Only the first message needs channel history; the rest follow it
+    contexts = [await gather_context(messages[0], load_history=channel_id not in worker_threads)]
+    for follow_up in messages[1:]:
+        contexts.append(await gather_context(follow_up, load_history=False))
+    job = {
+        "thread_id": str(channel_id),
+        "contexts": [context.portable() for context in contexts],
+        "stream": STREAM_RESPONSES,
+    }
+    call = workers.submit(channel_id, job)
+    with telemetry.span("worker_call", worker=call.worker):
+        await send_answer(message, call, STREAM_RESPONSES)
+    worker_threads.add(channel_id)
+
+async def handle_messages(messages):
+    """Scheduler runner: answer one or more coalesced messages from the same channel"""
+    message = messages[-1]
+    with telemetry.span("request", channel=message.channel.id, messages=len(messages)):
+        async with message.channel.typing():
+            try:
+                if workers is not None:
+                    await reply_with_worker(message, messages)
+                else:
+                    # Links start loading while the context is assembled and
+                    # the model takes its first step
+                    with prefetch_scope():
+                        await reply_with_agent(message, messages)
+            except Exception as e:
+                print(f"Error processing message: {e}")
+                await message.reply("Sorry, I encountered an error processing your request.")
+
+BUSY_MESSAGE = "I'm handling a lot of requests right now. Please try again in a minute."
+
+scheduler = AgentScheduler(
+    handle_messages,
+    max_concurrency=int(os.getenv('MURPHY_MAX_CONCURRENT_RUNS', '4')),
+    max_pending=int(os.getenv('MURPHY_MAX_QUEUED_MESSAGES', '32')),
+    # Share of runs per guild when several are waiting
+    weights=parse_group_weights(os.getenv('MURPHY_GUILD_WEIGHTS', '')),
+)
 
 @bot.event
 async def on_message(message):
+    channel_history.record(message, bot.user)
+    message_cache.remember(message, bot.user)
+
     if message.author == bot.user:
         return
 
@@ -184,49 +274,33 @@ async def on_message(message):
     # Process if in a thread where bot was mentioned in the starter
     elif isinstance(message.channel, discord.Thread):
         try:
-            starter_message = await message.channel.fetch_message(message.channel.id)
-            if bot.user.mentioned_in(starter_message):
+            starter_message = await message_cache.thread_starter(message.channel, bot.user)
+            if starter_message.mentions_bot:
                 should_process = True
         except:
             # If we can't check the starter, assume we shouldn't process
             pass
 
     if should_process:
-        async with message.channel.typing():
-            # Get message content with context
-            content = await process_message_with_context(message)
-            
-            # Run agent in executor to avoid blocking
-            loop = asyncio.get_event_loop()
-            try:
-                response = await loop.run_in_executor(
-                    None, 
-                    lambda: agent.invoke(
-                        {"messages": [HumanMessage(content=content)]},
-                        {
-                            "configurable": {"thread_id": str(message.channel.id)},
-                            "recursion_limit": 100
-                        }
-                    )
-                )
-                
-                # Split the response into chunks that fit Discord's limit
-                response_text = response["messages"][-1].content
-                chunks = split_message(response_text)
-                
-                # Send the first chunk as a reply to the original message
-                first_chunk = chunks[0]
-                sent_message = await message.reply(first_chunk)
-                
-                # Send remaining chunks as follow-up messages
-                for chunk in chunks[1:]:
-                    await message.channel.send(chunk)
-                    
-            except Exception as e:
-                print(f"Error processing message: {e}")
-                await message.reply("Sorry, I encountered an error processing your request.")
+        # One run at a time per channel; messages arriving meanwhile are coalesced
+        group = message.guild.id if message.guild else "dm"
+        if not scheduler.submit(message.channel.id, group, message):
+            await message.reply(BUSY_MESSAGE)
 
     await bot.process_commands(message)
 
+# Nothing above should import the LLM stack; warn when startup creeps up
+import_seconds = time.perf_counter() - _import_started
+telemetry.observe_stage("import", import_seconds)
+if import_seconds > IMPORT_BUDGET:
+    print(f"Warning: murphy.chatbot took {import_seconds:.2f}s to import (budget {IMPORT_BUDGET:.2f}s)")
+
 if __name__ == "__main__":
+    if os.getenv('MURPHY_METRICS_PORT'):
+        start_metrics_server(int(os.getenv('MURPHY_METRICS_PORT')))
+    if workers is not None:
+        workers.start()
+    elif WARMUP == "eager":
+        agent.get()
+        fast_agent.get()
     bot.run(os.getenv('DISCORD_BOT_TOKEN'))
\ No newline at end of file
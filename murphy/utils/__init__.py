@@ -1,2 +1,17 @@
-from .agent_tools import get_weather, web_search, clock, calculate, search_chat_history, read_webpage, crawl_url
-from .utilityfuncs import split_message, format_weather_data
\ No newline at end of file
+# Tools are imported on first access: agent_tools pulls in LangChain, SerpAPI
+# and the scraping stack, which the gateway path doesn't need (see lazy.py)
+_TOOLS = ("get_weather", "web_search", "clock", "calculate", "search_chat_history",
+          "search_attachments", "read_webpage", "read_webpages", "crawl_url")
+_UTILITIES = ("split_message", "format_weather_data")
+
+__all__ = [*_TOOLS, *_UTILITIES]
+
+
+def __getattr__(name):
+    if name in _TOOLS:
+        from . import agent_tools
+        return getattr(agent_tools, name)
+    if name in _UTILITIES:
+        from . import utilityfuncs
+        return getattr(utilityfuncs, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,72 +1,186 @@
-import math
+import asyncio
 import os
 import re
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
+from typing import Dict, List, Optional
 from urllib.parse import urlparse
 
-import requests
-from bs4 import BeautifulSoup
 from langchain.agents.tool_node import InjectedState
+from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import tool
 from serpapi import GoogleSearch
 from typing_extensions import Annotated
-import trafilatura
-from trafilatura.spider import focused_crawler
 
+from .attachments import attachment_store, format_chunk
+from .cache import (ExtractedPage, ExtractionCache, TTLCache, cache_backend,
+                    content_hash, make_key)
+from .calculator import evaluate, evaluate_table, format_number
+from .crawler import CrawlResult, Crawler, crawl
+from .extraction import extract_text
+from .history_search import search_history
+from .prefetch import current_prefetcher
+from .serp_format import render_text_blocks
+from .similarity import search_similar
+from .telemetry import instrument_tool, telemetry
 from .utilityfuncs import format_weather_data, is_binary_content
+from .webclient import FETCH_ERRORS, FetchedPage, afetch_page, aget_json, fetch_page
+
+SERPAPI_URL = "https://serpapi.com/search.json"
+
+# SerpAPI result cache. Weather goes stale quickly; search overviews don't
+SERPAPI_CACHE_SIZE = 512
+WEATHER_CACHE_TTL = 10 * 60  # seconds
+SEARCH_CACHE_TTL = 60 * 60  # seconds
+_serpapi_cache = None
+_serpapi_cache_lock = threading.Lock()
+
+# Token budgets for rendered SerpAPI results
+WEATHER_MAX_TOKENS = 300
+SEARCH_MAX_TOKENS = 1500
+
+# Extracted page text, revalidated with conditional GETs
+EXTRACTION_CACHE_BYTES = 32 * 1024 * 1024
+extraction_cache = ExtractionCache(max_bytes=EXTRACTION_CACHE_BYTES)
+
+# Crawl limits, whatever the model asks for
+CRAWL_MAX_PAGES = 200
+CRAWL_MAX_LINKS = 500
+CRAWL_TEXT_CHARS = 1500  # per page
+
+# Rows of a `calculate` table shown to the model
+MAX_TABLE_ROWS = 200
+
+# Excerpts returned per search_attachments call
+ATTACHMENT_SEARCH_CHUNKS = 5
+
+INVALID_URL_MESSAGE = "Error: Invalid URL format. Please provide a complete URL with http:// or https://"
+
+
+def _serpapi_params(query: str) -> dict:
+    """Build the SerpAPI request parameters shared by the search-backed tools"""
+    return {
+        "engine": "google_ai_mode",
+        "q": query,
+        "api_key": os.getenv("SERPAPI_KEY"),
+        "location": "Portland, OR"
+    }
+
+API_KEY_PATTERN = re.compile(r"(api_key=)[^&\s'\"]+")
+
+def _serpapi_error(e: Exception) -> str:
+    """`e` as text for the model; request errors can quote the URL, API key included"""
+    text = str(e) or type(e).__name__
+    key = os.getenv("SERPAPI_KEY")
+    if key:
+        text = text.replace(key, "***")
+    return API_KEY_PATTERN.sub(r"\1***", text)
+
+def _serpapi_cache_key(params: dict) -> str:
+    return make_key(params["engine"], params["q"], params.get("location", ""))
+
+def get_serpapi_cache() -> TTLCache:
+    """Return the SerpAPI result cache, creating it on first use (after .env is loaded)"""
+    global _serpapi_cache
+    if _serpapi_cache is None:
+        with _serpapi_cache_lock:
+            if _serpapi_cache is None:
+                _serpapi_cache = TTLCache(maxsize=SERPAPI_CACHE_SIZE, backend=cache_backend("serpapi"))
+    return _serpapi_cache
+
+def _serpapi_search(params: dict, ttl: float) -> dict:
+    """Run a SerpAPI search through the official client, reusing cached results for `ttl` seconds"""
+    cache = get_serpapi_cache()
+    key = _serpapi_cache_key(params)
+    results = cache.get(key)
+    telemetry.cache_result("serpapi", "miss" if results is None else "hit")
+    if results is None:
+        search = GoogleSearch(params)
+        results = search.get_dict()
+        if "error" not in results:
+            cache.set(key, results, ttl=ttl)
+    return results
+
+async def _aserpapi_search(params: dict, ttl: float) -> dict:
+    """Run a SerpAPI search on the shared async HTTP client, reusing cached results for `ttl` seconds"""
+    cache = get_serpapi_cache()
+    key = _serpapi_cache_key(params)
+    # With MURPHY_CACHE_DIR set these go to SQLite, so they stay off the loop
+    results = await asyncio.to_thread(cache.get, key)
+    telemetry.cache_result("serpapi", "miss" if results is None else "hit")
+    if results is None:
+        results = await aget_json(SERPAPI_URL, {**params, "source": "python"})
+        if "error" not in results:
+            await asyncio.to_thread(cache.set, key, results, ttl=ttl)
+    return results
+
+def _weather_result(location: str, results: dict) -> str:
+    if "error" in results:
+        return f"Error fetching weather data: {results['error']}"
+    if "text_blocks" in results and len(results["text_blocks"]) > 0:
+        # Extract and format weather information from the text blocks
+        weather_info = format_weather_data(results["text_blocks"], max_tokens=WEATHER_MAX_TOKENS)
+        return f"Weather in {location}:\n{weather_info}"
+    else:
+        return f"Could not find weather information for {location}"
+
+def _search_result(query: str, results: dict, sources: bool = True) -> str:
+    if "error" in results:
+        return f"Error fetching search results: {results['error']}"
+    if "text_blocks" in results and len(results["text_blocks"]) > 0:
+        references = results.get("references") if sources else None
+        output = render_text_blocks(results["text_blocks"], references, max_tokens=SEARCH_MAX_TOKENS)
+        return f"{query} results:\n{output}"
+    else:
+        return f"Could not find search Google for {query}"
 
 
 # Agent Tools
+#
+# Tools that do network I/O also get a native coroutine (`tool.coroutine`), so
+# `agent.ainvoke` awaits them on the event loop instead of parking a worker
+# thread on blocking requests.
 @tool
 def get_weather(location: str) -> str:
     """Get current weather information for a specific location.
     Example: "portland oregon", "new york", "los angeles"
     """
     try:
-        params = {
-            "engine": "google_ai_mode",
-            "q": f"{location} weather",
-            "api_key": os.getenv("SERPAPI_KEY"),
-            "location": "Portland, OR"
-        }
-        
-        search = GoogleSearch(params)
-        results = search.get_dict()
-        
-        if "text_blocks" in results and len(results["text_blocks"]) > 0:
-            # Extract and format weather information from the text blocks
-            weather_info = format_weather_data(results["text_blocks"])
-            return f"Weather in {location}:\n{weather_info}"
-        else:
-            return f"Could not find weather information for {location}"
-            
+        results = _serpapi_search(_serpapi_params(f"{location} weather"), WEATHER_CACHE_TTL)
+        return _weather_result(location, results)
+    except Exception as e:
+        return f"Error fetching weather data: {_serpapi_error(e)}"
+
+async def _aget_weather(location: str) -> str:
+    try:
+        results = await _aserpapi_search(_serpapi_params(f"{location} weather"), WEATHER_CACHE_TTL)
+        return _weather_result(location, results)
     except Exception as e:
-        return f"Error fetching weather data: {str(e)}"
+        return f"Error fetching weather data: {_serpapi_error(e)}"
+
+get_weather.coroutine = _aget_weather
 
 @tool
-def web_search(query: str) -> str:
+def web_search(query: str, sources: bool = True) -> str:
     """Retrieve an AI overview of a search query to Google. You can use anything that you would use in a regular Google search. e.g. inurl:, site:, intitle:. 
+    Cited source links are listed at the end; set `sources` to false to leave them out.
     """
     try:
-        params = {
-            "engine": "google_ai_mode",
-            "q": f"{query}",
-            "api_key": os.getenv("SERPAPI_KEY"),
-            "location": "Portland, OR"
-        }
-        
-        search = GoogleSearch(params)
-        results = search.get_dict()
-        
-        if "text_blocks" in results and len(results["text_blocks"]) > 0:
-            # Extract and format weather information from the text blocks
-            output = results["text_blocks"]
-            return f"{query} results:\n{output}"
-        else:
-            return f"Could not find search Google for {query}"
-            
+        results = _serpapi_search(_serpapi_params(f"{query}"), SEARCH_CACHE_TTL)
+        return _search_result(query, results, sources)
+    except Exception as e:
+        return f"Error fetching search results: {_serpapi_error(e)}"
+
+async def _aweb_search(query: str, sources: bool = True) -> str:
+    try:
+        results = await _aserpapi_search(_serpapi_params(f"{query}"), SEARCH_CACHE_TTL)
+        return _search_result(query, results, sources)
     except Exception as e:
-        return f"Error fetching weather data: {str(e)}"
+        return f"Error fetching search results: {_serpapi_error(e)}"
+
+web_search.coroutine = _aweb_search
 
 @tool
 def clock():
@@ -74,27 +188,27 @@ def clock():
     return datetime.now().strftime("%Y-%m-%d %I:%M %p")
 
 @tool
-def calculate(expression: str) -> str:
-    """Evaluate a mathematical expression. You can use basic operators (+, -, *, /, ^) and functions like sqrt, sin, cos, etc.
+def calculate(expression: str, values: Optional[Dict[str, str]] = None) -> str:
+    """Evaluate a mathematical expression. You can use basic operators (+, -, *, /, //, %, ^) and functions like
+    sqrt, sin, cos, tan, exp, log (natural, or log(x, base)), log2, log10, floor, ceil, factorial, comb and perm.
     Example expressions: 
     - "2 + 3 * 4" 
     - "sqrt(16)" 
     - "sin(30) + cos(60)"
+
+    To tabulate a formula, use variables in the expression and pass `values`, mapping each variable to a
+    range "start..stop" or "start..stop..step" (inclusive) or a list "a, b, c". Every combination is evaluated.
+    Example: expression "n * log2(charset)", values {"n": "8..16..4", "charset": "26, 62, 95"}
     """
     try:
-        # Replace ^ with ** for exponentiation
-        expression = expression.replace('^', '**')
-        
-        # Add math functions to the evaluation context
-        safe_dict = {
-            'abs': abs, 'round': round, 'min': min, 'max': max,
-            'sqrt': math.sqrt, 'sin': math.sin, 'cos': math.cos, 
-            'tan': math.tan, 'log': math.log, 'log10': math.log10,
-            'pi': math.pi, 'e': math.e
-        }
-        
-        # Evaluate the expression safely
-        result = eval(expression, {"__builtins__": None}, safe_dict)
+        if values:
+            columns, rows = evaluate_table(expression, values)
+            lines = [" | ".join(columns)]
+            lines += [" | ".join(format_number(v) for v in row) for row in rows[:MAX_TABLE_ROWS]]
+            if len(rows) > MAX_TABLE_ROWS:
+                lines.append(f"... {len(rows) - MAX_TABLE_ROWS:,} more rows omitted")
+            return f"Results of {expression}:\n" + "\n".join(lines)
+        result = evaluate(expression)
         return f"The result of {expression} is {result}"
     except Exception as e:
         return f"Error evaluating expression: {str(e)}"
@@ -102,379 +216,293 @@ def calculate(expression: str) -> str:
 @tool
 def search_chat_history(
     keyword_lookup: str,
-    chat_history: Annotated[list, InjectedState("messages")]
+    chat_history: Annotated[list, InjectedState("messages")],
+    config: RunnableConfig,
+    similar: bool = False
 ) -> str:
     """Search through conversation history using advanced query operators to find specific messages in the chat history.
-    Supports boolean operators (AND, OR, NOT), role filtering (user:, assistant:), exact phrases (quotes), wildcards (*), and date filters (after:, before:, on:).
+    Supports boolean operators (AND, OR, NOT) with parentheses, role filtering (user:, assistant:), exact phrases (quotes), wildcards (*), and date filters (after:, before:, on:).
+    Set `similar` to instead find the few messages closest in meaning to a plain-language description (e.g. "what we found on the SMB share"), even when worded differently; role, date and limit: filters still apply.
     """
     try:
-        # Convert LangChain message objects to dictionary format
-        formatted_messages = []
-        for msg in chat_history:
-            if hasattr(msg, 'type') and hasattr(msg, 'content'):
-                # This is a LangChain message object
-                role_map = {
-                    'human': 'user',
-                    'ai': 'assistant',
-                    'system': 'system'
-                }
-                role = role_map.get(msg.type, 'unknown')
-                formatted_messages.append({
-                    'role': role,
-                    'content': msg.content
-                })
-            elif isinstance(msg, dict) and 'role' in msg and 'content' in msg:
-                # This is already in dictionary format
-                formatted_messages.append(msg)
-        
-        messages = formatted_messages
-        
-        # Parse the search query for special operators
-        query_parts = keyword_lookup.split()
-        search_terms = []
-        filters = {
-            'role': None,
-            'after': None,
-            'before': None,
-            'on_date': None,
-            'case_sensitive': False,
-            'limit': None,
-            'exact_phrase': None
-        }
-        
-        # Parse special operators from the query
-        i = 0
-        while i < len(query_parts):
-            part = query_parts[i]
-            
-            if part.lower() in ['and', 'or', 'not']:
-                # Boolean operators will be handled later
-                search_terms.append(part.lower())
-                i += 1
-            elif part.startswith('user:') or part.startswith('assistant:'):
-                filters['role'] = part.split(':', 1)[0].lower()
-                i += 1
-            elif part.startswith('after:'):
-                try:
-                    date_str = part.split(':', 1)[1]
-                    filters['after'] = datetime.strptime(date_str, '%Y-%m-%d')
-                except:
-                    pass
-                i += 1
-            elif part.startswith('before:'):
-                try:
-                    date_str = part.split(':', 1)[1]
-                    filters['before'] = datetime.strptime(date_str, '%Y-%m-%d')
-                except:
-                    pass
-                i += 1
-            elif part.startswith('on:'):
-                try:
-                    date_str = part.split(':', 1)[1]
-                    filters['on_date'] = datetime.strptime(date_str, '%Y-%m-%d')
-                except:
-                    pass
-                i += 1
-            elif part.startswith('case:'):
-                case_val = part.split(':', 1)[1].lower()
-                filters['case_sensitive'] = (case_val == 'true' or case_val == 'yes')
-                i += 1
-            elif part.startswith('limit:'):
-                try:
-                    filters['limit'] = int(part.split(':', 1)[1])
-                except:
-                    pass
-                i += 1
-            elif part.startswith('"') and part.endswith('"'):
-                # Exact phrase match
-                filters['exact_phrase'] = part[1:-1]
-                i += 1
-            else:
-                # Regular search term
-                search_terms.append(part)
-                i += 1
-        
-        # Reconstruct the search query without special operators
-        search_query = " ".join(search_terms)
-        
-        # If we have an exact phrase, use it instead of individual terms
-        if filters['exact_phrase']:
-            search_query = filters['exact_phrase']
-        
-        # Filter messages based on criteria
-        matching_messages = []
-        
-        for msg in messages:
-            # Check role filter
-            if filters['role'] and msg['role'] != filters['role']:
-                continue
-                
-            # Check date filters
-            if 'timestamp' in msg:
-                try:
-                    msg_time = datetime.fromisoformat(msg['timestamp'].replace('Z', '+00:00'))
-                    
-                    if filters['after'] and msg_time < filters['after']:
-                        continue
-                    if filters['before'] and msg_time > filters['before']:
-                        continue
-                    if filters['on_date'] and msg_time.date() != filters['on_date'].date():
-                        continue
-                except:
-                    pass
-            
-            # Check content against search query
-            content = msg['content']
-            if not filters['case_sensitive']:
-                content = content.lower()
-                search_query = search_query.lower()
-            
-            # Handle boolean operators in search terms
-            terms = search_terms.copy()
-            if filters['exact_phrase']:
-                # For exact phrase, we just check if the phrase exists
-                if filters['exact_phrase'] in content:
-                    matching_messages.append(msg)
-            elif not terms:
-                # No search terms, just filtering by other criteria
-                matching_messages.append(msg)
-            else:
-                # Process boolean logic
-                result = None
-                current_op = 'and'  # Default operator
-                
-                for term in terms:
-                    if term in ['and', 'or', 'not']:
-                        current_op = term
-                        continue
-                    
-                    # Check if term exists (with wildcard support)
-                    term_exists = False
-                    if '*' in term:
-                        # Convert wildcard to regex pattern
-                        pattern = term.replace('*', '.*')
-                        if re.search(pattern, content):
-                            term_exists = True
-                    else:
-                        term_exists = (term in content)
-                    
-                    # Apply boolean logic
-                    if current_op == 'and':
-                        if result is None:
-                            result = term_exists
-                        else:
-                            result = result and term_exists
-                    elif current_op == 'or':
-                        if result is None:
-                            result = term_exists
-                        else:
-                            result = result or term_exists
-                    elif current_op == 'not':
-                        if result is None:
-                            result = not term_exists
-                        else:
-                            result = result and not term_exists
-                
-                if result:
-                    matching_messages.append(msg)
-        
-        # Apply limit if specified
-        if filters['limit']:
-            matching_messages = matching_messages[:filters['limit']]
-        
-        if not matching_messages:
-            return f"No messages found matching your query: '{keyword_lookup}'"
-        
-        # Format the results with context
-        result = f"Found {len(matching_messages)} messages matching your query:\n\n"
-        
-        for i, msg in enumerate(matching_messages, 1):
-            # Add timestamp if available
-            timestamp = ""
-            if 'timestamp' in msg:
-                timestamp = f" [{msg['timestamp']}]"
-                
-            result += f"{i}. [{msg['role'].upper()}]{timestamp}: {msg['content']}\n\n"
-            
-            # Add context (previous and next messages)
-            msg_index = messages.index(msg)
-            context_added = False
-            
-            # Previous message context
-            if msg_index > 0:
-                prev_msg = messages[msg_index - 1]
-                result += f"   Context (previous): [{prev_msg['role'].upper()}]: {prev_msg['content'][:100]}...\n"
-                context_added = True
-                
-            # Next message context
-            if msg_index < len(messages) - 1:
-                next_msg = messages[msg_index + 1]
-                result += f"   Context (next): [{next_msg['role'].upper()}]: {next_msg['content'][:100]}...\n"
-                context_added = True
-                
-            if context_added:
-                result += "\n"
-        
-        return result
-        
+        thread_id = config.get("configurable", {}).get("thread_id")
+        if similar:
+            return search_similar(keyword_lookup, chat_history, thread_id)
+        return search_history(keyword_lookup, chat_history, thread_id)
     except Exception as e:
         return f"Error searching chat history: {str(e)}"
 
 @tool
-def read_webpage(url: str) -> str:
-    """Use when you need to directly read a webpage or are given a direct link. Retrieves the page's main contents. Use repeatedly when given a direct link/list of URLs.
+def search_attachments(
+    query: str,
+    config: RunnableConfig,
+    file: Optional[str] = None,
+    chunk: Optional[int] = None
+) -> str:
+    """Search the text files attached in this conversation (message.txt pastes, logs, scan and tool output) and return the most relevant excerpts, each labelled with its file, chunk number and line range.
+    To read a file in order instead, pass `file` and the `chunk` number to start from (e.g. the chunk after an excerpt). `file` alone limits the search to that file.
     """
+    channel_id = config.get("configurable", {}).get("thread_id")
+    try:
+        if file and chunk is not None:
+            excerpts = attachment_store.read(channel_id, file, chunk)
+        else:
+            excerpts = attachment_store.search(channel_id, query, file, max_chunks=ATTACHMENT_SEARCH_CHUNKS)
+        if not excerpts:
+            files = attachment_store.files(channel_id)
+            if not files:
+                return "No files have been attached in this conversation."
+            listing = "\n".join(f"- {f.describe()}" for f in files)
+            return f"No excerpts found for '{query}'. Attached files:\n{listing}"
+        return "\n\n".join(format_chunk(f, c) for f, c in excerpts)
+    except Exception as e:
+        return f"Error searching attachments: {str(e)}"
+
+def _validate_url(url: str) -> bool:
+    parsed_url = urlparse(url)
+    return all([parsed_url.scheme, parsed_url.netloc])
+
+def _render_page(url: str, page: FetchedPage, cached: Optional[ExtractedPage] = None) -> str:
+    """Turn a downloaded page into the tool's output. CPU-bound, so async callers run it in a thread"""
+    # Unchanged since we last read it: reuse the extracted text
+    if cached is not None and page.status_code == 304:
+        telemetry.cache_result("extraction", "revalidated")
+        return f"Content from {url}:\n\n{extraction_cache.revalidated(cached)}"
+    
+    # Check for binary content
+    if is_binary_content(page, url):
+        return "Error: Binary content detected (PDF, image, video, audio, or archive). This tool only processes text-based webpages."
+    
+    digest = content_hash(page.content)
+    cleaned_text = extraction_cache.lookup_hash(digest)
+    telemetry.cache_result("extraction", "miss" if cleaned_text is None else "hit")
+    if cleaned_text is None:
+        cleaned_text = extract_text(page.content)
+        if page.truncated:
+            cleaned_text += f"\n\n[Page truncated: only the first {len(page.content) // (1024 * 1024)} MB were read]"
+    extraction_cache.put(ExtractedPage(
+        url=url,
+        text=cleaned_text,
+        content_hash=digest,
+        etag=page.headers.get('etag'),
+        last_modified=page.headers.get('last-modified'),
+    ))
+    return f"Content from {url}:\n\n{cleaned_text}"
+
+def _read_webpage(url: str) -> str:
     try:
         # Validate URL format
-        parsed_url = urlparse(url)
-        if not all([parsed_url.scheme, parsed_url.netloc]):
-            return "Error: Invalid URL format. Please provide a complete URL with http:// or https://"
-        
-        # Set headers to mimic a browser
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        
-        # Fetch the webpage
-        response = requests.get(url, headers=headers, timeout=15)
-        response.raise_for_status()  # Raise an exception for bad status codes
-        
-        # Check for binary content
-        if is_binary_content(response, url):
-            return "Error: Binary content detected (PDF, image, video, audio, or archive). This tool only processes text-based webpages."
-        
-        # Try multiple extraction methods
-        
-        # Method 1: Use trafilatura (more robust content extraction)
-        try:
-            downloaded = trafilatura.fetch_url(url)
-            if downloaded:
-                content = trafilatura.extract(downloaded, include_links=False, include_tables=False)
-                if content and len(content) > 100:  # Ensure we have meaningful content
-                    return f"Content from {url}:\n\n{content}"
-        except:
-            pass  # Fall back to other methods
-        
-        # Method 2: Use BeautifulSoup with less aggressive filtering
-        soup = BeautifulSoup(response.content, 'html.parser')
+        if not _validate_url(url):
+            return INVALID_URL_MESSAGE
         
-        # Remove obviously unwanted elements
-        for element in soup(['script', 'style', 'nav', 'footer', 'aside', 
-                            'header', 'form', 'iframe', 'button', 'input']):
-            element.decompose()
+        # Fetch the webpage once (conditionally, if we've read it before);
+        # every extraction method reuses these bytes
+        cached = extraction_cache.get(url)
+        page = fetch_page(url, headers=extraction_cache.conditional_headers(cached))
+        return _render_page(url, page, cached)
         
-        # Try to find the main content area with less specific selectors
-        content_selectors = [
-            'article', 'main', '[role="main"]', 
-            '.content', '#content', '.main-content',
-            '.post-content', '.entry-content', '.article-body',
-            'div', 'section'  # More generic selectors as fallback
-        ]
-        
-        main_content = None
-        for selector in content_selectors:
-            elements = soup.select(selector)
-            if elements:
-                # Find the element with the most text content
-                elements.sort(key=lambda x: len(x.get_text()), reverse=True)
-                main_content = elements[0]
-                break
-        
-        # If no specific content area found, use the body but remove more clutter
-        if not main_content:
-            main_content = soup.body if soup.body else soup
-            
-            # Remove more potential clutter from body
-            clutter_selectors = [
-                '[class*="ad"]', '[id*="ad"]', 
-                '[class*="banner"]', '[id*="banner"]',
-                '[class*="popup"]', '[id*="popup"]',
-                '[class*="modal"]', '[id*="modal"]',
-                '[class*="cookie"]', '[id*="cookie"]',
-                '[class*="newsletter"]', '[id*="newsletter"]',
-                '.social-share', '.share-buttons',
-                '.comments', '#comments',
-                'nav', 'footer', 'header', 'aside'
-            ]
-            
-            for selector in clutter_selectors:
-                for element in main_content.select(selector):
-                    element.decompose()
-        
-        # Extract text and clean it up
-        text = main_content.get_text(separator='\n', strip=True)
-        
-        # Remove excessive whitespace and empty lines
-        lines = [line.strip() for line in text.split('\n') if line.strip()]
-        cleaned_text = '\n'.join(lines)
-        
-        # If we still don't have meaningful content, try a different approach
-        if len(cleaned_text) < 100:
-            # Try to get at least the title and meta description
-            title = soup.find('title')
-            title_text = title.get_text() if title else "No title found"
-            
-            meta_desc = soup.find('meta', attrs={'name': 'description'})
-            desc_text = meta_desc['content'] if meta_desc and 'content' in meta_desc.attrs else "No description found"
-            
-            cleaned_text = f"{title_text}\n\n{desc_text}"
-        
-        # # Truncate if too long (to avoid token limits)
-        # max_length = 8000
-        # if len(cleaned_text) > max_length:
-        #     cleaned_text = cleaned_text[:max_length] + "... [content truncated]"
-        # apparently not necessary, keeping code regardless
+    except FETCH_ERRORS as e:
+        return f"Error fetching the webpage: {str(e)}"
+    except Exception as e:
+        return f"Error processing the webpage: {str(e)}"
+
+async def _afetch_webpage(url: str) -> str:
+    try:
+        if not _validate_url(url):
+            return INVALID_URL_MESSAGE
         
-        return f"Content from {url}:\n\n{cleaned_text}"
+        cached = extraction_cache.get(url)
+        page = await afetch_page(url, headers=extraction_cache.conditional_headers(cached))
+        if cached is not None and page.status_code == 304:
+            return _render_page(url, page, cached)
+        return await asyncio.to_thread(_render_page, url, page, cached)
         
-    except requests.exceptions.RequestException as e:
+    except FETCH_ERRORS as e:
         return f"Error fetching the webpage: {str(e)}"
     except Exception as e:
         return f"Error processing the webpage: {str(e)}"
 
+async def _aread_webpage(url: str) -> str:
+    # Links in the user's message are usually read while the model thinks
+    prefetcher = current_prefetcher()
+    if prefetcher is not None:
+        prefetched = await prefetcher.take(url)
+        if prefetched is not None:
+            return prefetched
+    return await _afetch_webpage(url)
+
+@tool
+def read_webpage(url: str) -> str:
+    """Use when you need to directly read a webpage or are given a direct link. Retrieves the page's main contents. When given a list of URLs, use read_webpages instead.
+    """
+    return _read_webpage(url)
+
+read_webpage.coroutine = _aread_webpage
+
+# Batch reads: bounded worker pool, per-host cap and a deadline for the whole batch
+BATCH_MAX_WORKERS = 8
+BATCH_PER_HOST_LIMIT = 2
+BATCH_DEADLINE = 45  # seconds
+BATCH_MAX_URLS = 25  # also stated in the read_webpages docstring
+
+def _host_key(url: str) -> str:
+    return urlparse(url).netloc.lower()
+
+def _format_batch(urls: List[str], results: Dict[str, str], skipped: int = 0) -> str:
+    """Join per-URL results in input order, noting the `skipped` URLs past the limit"""
+    sections = []
+    for i, url in enumerate(urls, 1):
+        text = results.get(url, f"Error reading {url}: timed out after the {BATCH_DEADLINE}s batch deadline")
+        sections.append(f"[{i}] {text}")
+    if skipped > 0:
+        sections.append(f"{skipped} more URLs were not read (limit {BATCH_MAX_URLS} per call)")
+    return "\n\n".join(sections)
+
+@tool
+def read_webpages(urls: List[str]) -> str:
+    """Read several webpages at once. Use when given a list of URLs or links; pages are fetched concurrently and returned in the same order as the input.
+    At most 25 URLs are read per call; pass longer lists over several calls.
+    """
+    skipped = len(urls) - BATCH_MAX_URLS
+    urls = urls[:BATCH_MAX_URLS]
+    unique_urls = list(dict.fromkeys(urls))
+    # Up to BATCH_PER_HOST_LIMIT lanes per host, each reading its host's URLs
+    # in turn: a pool thread never sits waiting for another read of the same
+    # host while other hosts' URLs are queued
+    host_queues = defaultdict(deque)
+    for url in unique_urls:
+        host_queues[_host_key(url)].append(url)
+    results: Dict[str, str] = {}
+    
+    def lane(queue):
+        while True:
+            try:
+                url = queue.popleft()
+            except IndexError:
+                return
+            results[url] = _read_webpage(url)
+    
+    lanes = [queue for queue in host_queues.values() for _ in range(min(BATCH_PER_HOST_LIMIT, len(queue)))]
+    executor = ThreadPoolExecutor(max_workers=min(BATCH_MAX_WORKERS, max(len(lanes), 1)))
+    try:
+        futures = [executor.submit(lane, queue) for queue in lanes]
+        wait(futures, timeout=BATCH_DEADLINE)
+        finished = dict(results)
+    finally:
+        for queue in host_queues.values():
+            queue.clear()  # lanes still reading stop after their current page
+        # Don't hold the tool call open for stragglers past the deadline
+        executor.shutdown(wait=False, cancel_futures=True)
+    
+    return _format_batch(urls, finished, skipped)
+
+async def _aread_webpages(urls: List[str]) -> str:
+    skipped = len(urls) - BATCH_MAX_URLS
+    urls = urls[:BATCH_MAX_URLS]
+    unique_urls = list(dict.fromkeys(urls))
+    workers = asyncio.Semaphore(BATCH_MAX_WORKERS)
+    host_limits = defaultdict(lambda: asyncio.Semaphore(BATCH_PER_HOST_LIMIT))
+    
+    async def read_one(url):
+        # Host slot first: URLs queued behind a busy host mustn't hold global slots
+        async with host_limits[_host_key(url)], workers:
+            return url, await _aread_webpage(url)
+    
+    tasks = [asyncio.create_task(read_one(url)) for url in unique_urls]
+    if not tasks:
+        return _format_batch(urls, {}, skipped)
+    done, pending = await asyncio.wait(tasks, timeout=BATCH_DEADLINE)
+    for task in pending:
+        task.cancel()
+    
+    results = dict(task.result() for task in done)
+    return _format_batch(urls, results, skipped)
+
+read_webpages.coroutine = _aread_webpages
+
+def _format_crawl(result: CrawlResult, include_text: bool) -> str:
+    fetched = [page for page in result.pages if page.status is not None]
+    summary = f"Crawled {len(fetched)} page(s) in {result.elapsed:.1f}s"
+    if result.stop_reason:
+        summary += f" (stopped: {result.stop_reason})"
+    if result.robots_blocked:
+        summary += f"; {len(result.robots_blocked)} URL(s) skipped per robots.txt"
+    errors = [page for page in result.pages if page.error]
+    if errors:
+        summary += f"; {len(errors)} failed"
+        if not fetched or len(errors) == len(result.pages):
+            summary += f" ({errors[0].url}: {errors[0].error})"
+
+    if not result.links:
+        formatted_output = f"{summary}\nNo relevant outlinks found on this page.\n"
+    else:
+        # Format the results
+        formatted_output = f"{summary}\nFound {len(result.links)} outlinks:\n"
+        for i, link in enumerate(result.links, 1):
+            formatted_output += f"{i}. {link}\n"
+
+    if include_text:
+        formatted_output += "\nPage text:\n"
+        for page in result.pages:
+            if page.text:
+                text = page.text[:CRAWL_TEXT_CHARS]
+                if len(page.text) > CRAWL_TEXT_CHARS:
+                    text += " [...]"
+                formatted_output += f"\n[{page.url}]\n{text}\n"
+    return formatted_output
+
+def _crawl_options(max_links, same_domain, max_pages, include_text) -> dict:
+    return {
+        "max_links": max(1, min(max_links, CRAWL_MAX_LINKS)),
+        "max_pages": max(1, min(max_pages, CRAWL_MAX_PAGES)),
+        "same_domain": same_domain,
+        "include_text": include_text,
+    }
+
 @tool
 def crawl_url(
     url: str, 
     max_links: int = 50,
-    same_domain: bool = False
+    same_domain: bool = False,
+    max_pages: int = 10,
+    include_text: bool = False
 ) -> str:
-    """Extract outlinks from a webpage for further discovery and exploration.
+    """Crawl a website from a starting URL and list the links discovered, for further discovery and exploration.
     
     This tool is designed to help agents discover related content by extracting
     hyperlinks from a webpage. It's useful when you need to find additional
     resources or context related to the current page.
+
+    Only pages on the starting site are fetched (up to `max_pages`, respecting robots.txt).
+    `same_domain` limits the reported links to that site. Set `include_text` to also get
+    the (truncated) text of every crawled page.
     """
+    if not _validate_url(url):
+        return INVALID_URL_MESSAGE
     try:
-        # Use Trafilatura's focused crawler to extract links
-        to_visit, known_links = focused_crawler(
-            url, 
-            max_seen_urls=max_links,  # Only process the initial URL
-            max_known_urls=max_links * 2  # Allow some buffer for filtering
-        )
-        
-        # Filter links based on requirements
-        if same_domain:
-            from urllib.parse import urlparse
-            base_domain = urlparse(url).netloc
-            filtered_links = [
-                link for link in to_visit 
-                if urlparse(link).netloc == base_domain
-            ]
-        else:
-            filtered_links = list(to_visit)
-        
-        # Limit to the requested number of links
-        result_links = filtered_links[:max_links]
-        
-        if not result_links:
-            return "No relevant outlinks found on this page."
-        
-        # Format the results
-        formatted_output = f"Found {len(result_links)} outlinks:\n"
-        for i, link in enumerate(result_links, 1):
-            formatted_output += f"{i}. {link}\n"
-            
-        return formatted_output
-        
+        options = _crawl_options(max_links, same_domain, max_pages, include_text)
+        return _format_crawl(crawl(url, **options), include_text)
     except Exception as e:
-        return f"Error extracting outlinks: {str(e)}"
\ No newline at end of file
+        return f"Error extracting outlinks: {str(e)}"
+
+async def _acrawl_url(
+    url: str,
+    max_links: int = 50,
+    same_domain: bool = False,
+    max_pages: int = 10,
+    include_text: bool = False
+) -> str:
+    if not _validate_url(url):
+        return INVALID_URL_MESSAGE
+    try:
+        options = _crawl_options(max_links, same_domain, max_pages, include_text)
+        return _format_crawl(await Crawler(url, **options).crawl(), include_text)
+    except Exception as e:
+        return f"Error extracting outlinks: {str(e)}"
+
+crawl_url.coroutine = _acrawl_url
+
+# Every tool call is timed and sized (see telemetry.py)
+for _tool in (get_weather, web_search, clock, calculate, search_chat_history,
+              search_attachments, read_webpage, read_webpages, crawl_url):
+    instrument_tool(_tool)
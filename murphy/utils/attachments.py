@@ -0,0 +1,393 @@
+"""Text attachments: streamed, chunked and indexed per channel.
+
+Attached text files (message.txt pastes, logs, nmap/Burp dumps...) are
+downloaded in blocks and decoded incrementally into line-aligned chunks, so a
+multi-megabyte file never exists as one bytes object plus one str. Each
+channel keeps a BM25 index of its recent files. A prompt gets small files in
+full, or only the chunks that match the question for big ones; the
+`search_attachments` tool fetches more on demand.
+"""
+import asyncio
+import codecs
+import heapq
+import math
+import os
+import re
+import threading
+import time
+from array import array
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+import aiohttp
+
+from .webclient import CHUNK_SIZE, get_async_session
+
+MAX_ATTACHMENTS = 10  # per message
+MAX_ATTACHMENT_BYTES = 32 * 1024 * 1024  # per file; the rest is dropped
+CHUNK_CHARS = 2000  # cut at the last line break before this
+
+# Per channel: files kept and total text held (oldest files go first)
+MAX_FILES_PER_CHANNEL = 16
+MAX_CHANNEL_CHARS = 64 * 1024 * 1024
+MAX_CHANNELS = 64
+# All channels together: least recently used channels go first
+MAX_TOTAL_CHARS = 256 * 1024 * 1024
+
+# Prompt budget: files up to INLINE_CHARS (all new files together) go in
+# whole; otherwise the best chunks up to CONTEXT_CHARS
+INLINE_CHARS = 8000
+CONTEXT_CHARS = 8000
+
+TEXT_EXTENSIONS = {
+    '.txt', '.log', '.md', '.csv', '.tsv', '.json', '.jsonl', '.xml', '.html', '.htm',
+    '.yaml', '.yml', '.ini', '.conf', '.cfg', '.toml', '.nmap', '.gnmap', '.har',
+    '.py', '.sh', '.ps1', '.bat', '.js', '.ts', '.sql', '.php', '.rb', '.go', '.c', '.h',
+    '.cpp', '.java', '.cs', '.diff', '.patch', '.req', '.http', '.eml', '.nse',
+}
+TEXT_CONTENT_TYPES = ('text/', 'application/json', 'application/xml', 'application/x-yaml',
+                      'application/javascript', 'application/x-sh')
+
+# Words, plus whole IPs, ports ("22/tcp"), CVE IDs and paths
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+# (the lookbehind stops the engine retrying from inside every word)
+COMPOUND_PATTERN = re.compile(r"(?<![a-z0-9])[a-z0-9]+(?:[._:/-][a-z0-9]+)+")
+MENTION_PATTERN = re.compile(r"<[@#][!&]?\d+>")
+STOPWORDS = frozenset(
+    "a an and are as at be but by can do does for from has have how i in is it its me my of on "
+    "or so that the their them then there these this to was we were what when where which who "
+    "why will with you your please show tell give find any all file files attached".split())
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+
+def tokenize(text: str) -> List[str]:
+    text = text.lower()
+    return WORD_PATTERN.findall(text) + COMPOUND_PATTERN.findall(text)
+
+
+def query_terms(query: str) -> List[str]:
+    terms = tokenize(MENTION_PATTERN.sub(" ", query))
+    return list(dict.fromkeys(term for term in terms if term not in STOPWORDS))
+
+
+@dataclass
+class Chunk:
+    index: int
+    start_line: int
+    end_line: int
+    text: str
+
+
+@dataclass
+class IndexedFile:
+    name: str
+    chunks: List[Chunk] = field(default_factory=list)
+    chars: int = 0
+    bytes_read: int = 0
+    truncated: bool = False
+    added: float = field(default_factory=time.time)
+    # token -> (chunk indexes, term frequency in each): two compact arrays
+    postings: Dict[str, Tuple[array, array]] = field(default_factory=dict, repr=False)
+    lengths: List[int] = field(default_factory=list, repr=False)
+
+    def build_index(self) -> None:
+        postings: Dict[str, Tuple[array, array]] = {}
+        for chunk in self.chunks:
+            counts = Counter(tokenize(chunk.text))
+            self.lengths.append(sum(counts.values()))
+            for token, tf in counts.items():
+                entry = postings.get(token)
+                if entry is None:
+                    entry = postings[token] = (array('I'), array('I'))
+                entry[0].append(chunk.index)
+                entry[1].append(tf)
+        self.postings = postings
+
+    def score(self, terms: List[str]) -> Dict[int, float]:
+        """BM25 score of each chunk containing at least one term"""
+        if not self.chunks:
+            return {}
+        average = sum(self.lengths) / len(self.lengths) or 1
+        scores: Dict[int, float] = {}
+        for term in terms:
+            entry = self.postings.get(term)
+            if entry is None:
+                continue
+            ids, frequencies = entry
+            idf = math.log(1 + (len(self.chunks) - len(ids) + 0.5) / (len(ids) + 0.5))
+            for index, tf in zip(ids, frequencies):
+                norm = tf + K1 * (1 - B + B * self.lengths[index] / average)
+                scores[index] = scores.get(index, 0.0) + idf * tf * (K1 + 1) / norm
+        return scores
+
+    def head(self, max_chars: int) -> str:
+        """About the first `max_chars` characters, in whole chunks"""
+        parts, total = [], 0
+        for chunk in self.chunks:
+            if total >= max_chars:
+                break
+            parts.append(chunk.text)
+            total += len(chunk.text)
+        return "\n".join(parts)
+
+    def describe(self) -> str:
+        note = ", truncated" if self.truncated else ""
+        return f"{self.name} ({_size(self.bytes_read)}, {len(self.chunks)} chunks{note})"
+
+
+def _size(n: int) -> str:
+    if n < 1024:
+        return f"{n} B"
+    if n < 1024 * 1024:
+        return f"{n / 1024:.1f} KB"
+    return f"{n / (1024 * 1024):.1f} MB"
+
+
+def format_chunk(file: IndexedFile, chunk: Chunk) -> str:
+    return f"[{file.name} #{chunk.index}, lines {chunk.start_line}-{chunk.end_line}]\n{chunk.text}"
+
+
+class LineChunker:
+    """Splits streamed text into chunks of at most `max_chars`, at line breaks where possible"""
+
+    def __init__(self, max_chars: int = CHUNK_CHARS):
+        self.max_chars = max_chars
+        self._buffer = ""
+        self._line = 1
+        self._index = 0
+
+    def _emit(self, text: str) -> Chunk:
+        lines = text.count("\n")
+        end_line = self._line + lines - (1 if text.endswith("\n") else 0)
+        chunk = Chunk(self._index, self._line, max(self._line, end_line), text.rstrip("\n"))
+        self._line += lines
+        self._index += 1
+        return chunk
+
+    def feed(self, text: str) -> Iterator[Chunk]:
+        self._buffer += text
+        start = 0
+        while len(self._buffer) - start >= self.max_chars:
+            window_end = start + self.max_chars
+            cut = self._buffer.rfind("\n", start, window_end)
+            cut = window_end if cut <= start else cut + 1
+            yield self._emit(self._buffer[start:cut])
+            start = cut
+        self._buffer = self._buffer[start:]
+
+    def flush(self) -> Iterator[Chunk]:
+        if self._buffer.strip():
+            yield self._emit(self._buffer)
+        self._buffer = ""
+
+
+def is_text_attachment(attachment) -> bool:
+    content_type = (getattr(attachment, "content_type", None) or "").lower()
+    if content_type.startswith(TEXT_CONTENT_TYPES):
+        return True
+    return os.path.splitext(attachment.filename.lower())[1] in TEXT_EXTENSIONS
+
+
+def _charset(attachment) -> str:
+    match = re.search(r"charset=([\w-]+)", getattr(attachment, "content_type", None) or "", re.I)
+    encoding = match.group(1) if match else "utf-8"
+    try:
+        codecs.lookup(encoding)
+    except LookupError:
+        encoding = "utf-8"
+    return "utf-8-sig" if encoding.lower() in ("utf-8", "utf8") else encoding
+
+
+async def _iter_blocks(attachment) -> AsyncIterator[bytes]:
+    """The attachment's bytes, streamed from the CDN when it has a URL"""
+    url = getattr(attachment, "url", None)
+    if not url or not url.startswith(("http://", "https://")):
+        yield await attachment.read()
+        return
+    session = get_async_session()
+    async with session.get(url, timeout=aiohttp.ClientTimeout(total=120)) as response:
+        response.raise_for_status()
+        async for block in response.content.iter_chunked(CHUNK_SIZE):
+            yield block
+
+
+async def read_attachment(attachment, max_bytes: int = MAX_ATTACHMENT_BYTES) -> IndexedFile:
+    """Stream, decode and chunk one attachment (not yet indexed)"""
+    file = IndexedFile(name=attachment.filename)
+    decoder = codecs.getincrementaldecoder(_charset(attachment))(errors="replace")
+    chunker = LineChunker()
+    blocks = _iter_blocks(attachment)
+    try:
+        async for block in blocks:
+            if file.bytes_read == 0 and b"\x00" in block[:8192]:
+                raise ValueError("looks like a binary file")
+            if file.bytes_read + len(block) > max_bytes:
+                block = block[:max_bytes - file.bytes_read]
+                file.truncated = True
+            file.bytes_read += len(block)
+            file.chunks.extend(chunker.feed(decoder.decode(block)))
+            if file.truncated:
+                break
+    finally:
+        await blocks.aclose()  # releases the connection when we stop early
+    file.chunks.extend(chunker.feed(decoder.decode(b"", final=True)))
+    file.chunks.extend(chunker.flush())
+    file.chars = sum(len(chunk.text) for chunk in file.chunks)
+    return file
+
+
+class ChannelAttachments:
+    """A channel's recent files, oldest first"""
+
+    def __init__(self):
+        self.files: "OrderedDict[str, IndexedFile]" = OrderedDict()
+
+    @property
+    def chars(self) -> int:
+        return sum(file.chars for file in self.files.values())
+
+    def add(self, file: IndexedFile) -> None:
+        # Re-uploading a file name replaces the old version
+        self.files.pop(file.name, None)
+        self.files[file.name] = file
+        while len(self.files) > 1 and (len(self.files) > MAX_FILES_PER_CHANNEL or self.chars > MAX_CHANNEL_CHARS):
+            self.files.popitem(last=False)
+
+    def find(self, name: Optional[str]) -> List[IndexedFile]:
+        if not name:
+            return list(self.files.values())
+        if name in self.files:
+            return [self.files[name]]
+        return [file for key, file in self.files.items() if name.lower() in key.lower()]
+
+
+class AttachmentStore:
+    """Channel ID -> `ChannelAttachments`, least recently used evicted first.
+
+    Bounded by channel count and by the text held across all channels.
+    """
+
+    def __init__(self, max_channels: int = MAX_CHANNELS, max_chars: int = MAX_TOTAL_CHARS):
+        self.max_channels = max_channels
+        self.max_chars = max_chars
+        self._channels: "OrderedDict[str, ChannelAttachments]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def channel(self, channel_id) -> Optional[ChannelAttachments]:
+        with self._lock:
+            channel = self._channels.get(str(channel_id))
+            if channel is not None:
+                self._channels.move_to_end(str(channel_id))
+            return channel
+
+    def add(self, channel_id, file: IndexedFile) -> None:
+        with self._lock:
+            channel = self._channels.get(str(channel_id))
+            if channel is None:
+                channel = self._channels[str(channel_id)] = ChannelAttachments()
+            self._channels.move_to_end(str(channel_id))
+            channel.add(file)
+            total = sum(channel.chars for channel in self._channels.values())
+            # The channel just added to stays, even if it's over the cap alone
+            while len(self._channels) > 1 and (len(self._channels) > self.max_channels or total > self.max_chars):
+                _, evicted = self._channels.popitem(last=False)
+                total -= evicted.chars
+
+    def search(self, channel_id, query: str, file_name: Optional[str] = None,
+               max_chunks: int = 5, max_chars: int = CONTEXT_CHARS) -> List[Tuple[IndexedFile, Chunk]]:
+        """Best matching chunks across the channel's files, in file and line order"""
+        channel = self.channel(channel_id)
+        if channel is None:
+            return []
+        terms = query_terms(query)
+        ranked = []
+        for file in channel.find(file_name):
+            ranked.extend((score, file.added, index, file) for index, score in file.score(terms).items())
+        best = heapq.nlargest(max_chunks, ranked, key=lambda item: item[0])
+        selected = []
+        used = 0
+        for _, _, index, file in best:
+            chunk = file.chunks[index]
+            if used + len(chunk.text) > max_chars and selected:
+                break
+            selected.append((file, chunk))
+            used += len(chunk.text)
+        selected.sort(key=lambda item: (item[0].added, item[0].name, item[1].index))
+        return selected
+
+    def read(self, channel_id, file_name: str, start: int = 0,
+             max_chars: int = CONTEXT_CHARS) -> List[Tuple[IndexedFile, Chunk]]:
+        """Consecutive chunks of one file from chunk `start`, up to `max_chars`"""
+        channel = self.channel(channel_id)
+        files = channel.find(file_name) if channel is not None else []
+        if not files:
+            return []
+        file = files[-1]
+        selected = []
+        used = 0
+        for chunk in file.chunks[max(0, start):]:
+            if used + len(chunk.text) > max_chars and selected:
+                break
+            selected.append((file, chunk))
+            used += len(chunk.text)
+        return selected
+
+    def files(self, channel_id) -> List[IndexedFile]:
+        channel = self.channel(channel_id)
+        return list(channel.files.values()) if channel is not None else []
+
+
+attachment_store = AttachmentStore()
+
+
+async def ingest_attachments(channel_id, attachments, store: AttachmentStore = attachment_store
+                             ) -> Tuple[List[IndexedFile], List[str]]:
+    """Read and index a message's text attachments into its channel; returns (files, errors)"""
+    files, errors = [], []
+    for attachment in attachments[:MAX_ATTACHMENTS]:
+        if not is_text_attachment(attachment):
+            continue
+        try:
+            file = await read_attachment(attachment)
+            # Tokenizing megabytes of text is CPU-bound; keep it off the event loop
+            await asyncio.to_thread(file.build_index)
+        except Exception as e:
+            print(f"Error reading attached file {attachment.filename}: {e}")
+            errors.append(f"[Error reading attached file '{attachment.filename}': {e}]")
+            continue
+        store.add(channel_id, file)
+        files.append(file)
+    return files, errors
+
+
+def attachment_context(channel_id, query: str, files: List[IndexedFile],
+                       store: AttachmentStore = attachment_store) -> str:
+    """Prompt text for newly attached files: small ones whole, big ones as the relevant chunks"""
+    inline, indexed = [], []
+    budget = INLINE_CHARS
+    for file in files:
+        if file.chars <= budget:
+            inline.append(file)
+            budget -= file.chars
+        else:
+            indexed.append(file)
+    parts = [
+        f"Content from attached file '{file.name}':\n" + "\n".join(chunk.text for chunk in file.chunks)
+        for file in inline
+    ]
+    if indexed:
+        listing = "\n".join(f"- {file.describe()}" for file in indexed)
+        excerpts = [(file, chunk) for file, chunk in store.search(channel_id, query, max_chunks=8)
+                    if file not in inline]
+        if not excerpts:
+            # Nothing in the question to match on: show how each file starts
+            budget = CONTEXT_CHARS // len(indexed)
+            excerpts = [item for file in indexed for item in store.read(channel_id, file.name, 0, budget)]
+        body = "\n\n".join(format_chunk(file, chunk) for file, chunk in excerpts)
+        parts.append(f"Attached files (indexed; use the search_attachments tool to search them or read further):\n"
+                     f"{listing}\n\nRelevant excerpts:\n\n{body}")
+    return "\n\n".join(parts)
@@ -0,0 +1,278 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+_MISSING = object()
+
+# On-disk entries kept per backend, newest writes first; expired ones are
+# purged (and the rest trimmed to this) every PURGE_EVERY writes
+MAX_DISK_ENTRIES = 10_000
+PURGE_EVERY = 100
+
+
+def make_key(*parts) -> str:
+    """Build a cache key from parts, normalizing case and whitespace"""
+    return "\x1f".join(" ".join(str(part).split()).lower() for part in parts)
+
+
+class SQLiteCacheBackend:
+    """On-disk cache backend so entries survive restarts.
+
+    Any object with the same `get`/`set`/`delete`/`clear` methods can be passed
+    to `TTLCache` as a backend. Values must be JSON-serializable. The table is
+    kept to `max_entries` rows, dropping the oldest writes first.
+    """
+
+    def __init__(self, path: str, max_entries: int = MAX_DISK_ENTRIES):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.max_entries = max_entries
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+            )
+        # Drop whatever expired while we were offline
+        self.purge()
+
+    def purge(self) -> None:
+        """Delete expired rows, then the oldest writes past `max_entries`"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),))
+            # INSERT OR REPLACE gives a row a new rowid, so rowid order is write order
+            self._conn.execute(
+                "DELETE FROM cache WHERE rowid IN (SELECT rowid FROM cache ORDER BY rowid DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def get(self, key: str):
+        """Return (value, expires_at), or None if the key is unknown"""
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def set(self, key: str, value: Any, expires_at: Optional[float]) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires_at),
+            )
+            self._writes += 1
+            purge = self._writes % PURGE_EVERY == 0
+        if purge:
+            self.purge()
+
+    def delete(self, key: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM cache")
+
+
+class TTLCache:
+    """Thread-safe LRU cache with per-entry expiry and hit/miss counters.
+
+    Entries live in memory up to `maxsize`, least recently used first out. With
+    a `backend`, writes go through to it and memory misses fall back to it.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: Optional[float] = None, backend=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.backend = backend
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str, default=None):
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                value, expires_at = entry
+                if expires_at is None or expires_at > now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+
+        if self.backend is not None:
+            stored = self.backend.get(key)
+            if stored is not None:
+                value, expires_at = stored
+                if expires_at is None or expires_at > now:
+                    with self._lock:
+                        self._store(key, value, expires_at)
+                        self.hits += 1
+                    return value
+                self.backend.delete(key)
+
+        with self._lock:
+            self.misses += 1
+        return default
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl is not None else None
+        with self._lock:
+            self._store(key, value, expires_at)
+        if self.backend is not None:
+            self.backend.set(key, value, expires_at)
+
+    def _store(self, key, value, expires_at):
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+        if self.backend is not None:
+            self.backend.delete(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+        if self.backend is not None:
+            self.backend.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        """Return hit/miss/eviction counters and the current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._data),
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+def content_hash(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+@dataclass
+class ExtractedPage:
+    """Extracted text for a URL plus what's needed to revalidate it"""
+    url: str
+    text: str
+    content_hash: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    size: int = 0
+
+
+class ExtractionCache:
+    """Byte-bounded LRU cache of extracted page text, keyed by URL and content hash.
+
+    Entries keep the page's ETag/Last-Modified so a later read can send a
+    conditional GET and reuse the text on a 304. A changed URL whose bytes
+    hash to something already extracted (mirrors, tracking parameters) also
+    skips the parse.
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict = OrderedDict()  # url -> ExtractedPage
+        self._by_hash: Dict[str, str] = {}  # content hash -> url
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+
+    def get(self, url: str) -> Optional[ExtractedPage]:
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None:
+                self._entries.move_to_end(url)
+            return entry
+
+    def lookup_hash(self, digest: str) -> Optional[str]:
+        """Return previously extracted text for identical page bytes, if any"""
+        with self._lock:
+            url = self._by_hash.get(digest)
+            if url is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(url)
+            self.hits += 1
+            return self._entries[url].text
+
+    def revalidated(self, entry: ExtractedPage) -> str:
+        """Record a 304 for `entry` and return its text"""
+        with self._lock:
+            self.revalidations += 1
+            self.hits += 1
+        return entry.text
+
+    def put(self, entry: ExtractedPage) -> None:
+        entry.size = len(entry.text.encode("utf-8"))
+        if entry.size > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(entry.url)
+            self._entries[entry.url] = entry
+            self._by_hash[entry.content_hash] = entry.url
+            self._bytes += entry.size
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, url):
+        old = self._entries.pop(url, None)
+        if old is not None:
+            self._bytes -= old.size
+            if self._by_hash.get(old.content_hash) == url:
+                del self._by_hash[old.content_hash]
+
+    @staticmethod
+    def conditional_headers(entry: Optional[ExtractedPage]) -> Dict[str, str]:
+        """Request headers that let the server answer 304 for an unchanged page"""
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "revalidations": self.revalidations,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+
+def cache_backend(name: str) -> Optional[SQLiteCacheBackend]:
+    """Return an on-disk backend under $MURPHY_CACHE_DIR, or None when persistence is off"""
+    cache_dir = os.getenv("MURPHY_CACHE_DIR")
+    if not cache_dir:
+        return None
+    max_entries = int(os.getenv("MURPHY_CACHE_MAX_ENTRIES", str(MAX_DISK_ENTRIES)))
+    return SQLiteCacheBackend(os.path.join(cache_dir, f"{name}.sqlite"), max_entries=max_entries)
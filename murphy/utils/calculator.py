@@ -0,0 +1,352 @@
+"""Sandboxed expression engine behind the `calculate` tool.
+
+Expressions are parsed once into a restricted AST (numbers, names, arithmetic
+and whitelisted function calls only) and compiled into a tree of closures,
+cached by source text. Evaluation is bounded: integers may not grow past
+`MAX_INT_BITS`, exponentiation and factorials are checked *before* they are
+computed, and every node checks a wall-clock deadline.
+
+`evaluate_table` evaluates one expression over ranges or lists of values
+(the Cartesian product when there are several variables). With NumPy installed
+(the `numpy` extra) this is a single vectorized pass in floats; without it, or
+when that pass can't give the exact answers, each row is evaluated in turn.
+"""
+import ast
+import functools
+import itertools
+import math
+import operator
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+MAX_EXPRESSION_LENGTH = 1000
+MAX_NODES = 256
+MAX_INT_BITS = 10_000  # ~3000 decimal digits
+MAX_FACTORIAL = 1000
+MAX_COMB = 10_000
+MAX_ROUND_DIGITS = 100
+MAX_ELEMENTS = 100_000  # values per table
+FLOAT_EXACT = 2 ** 53  # larger floats may not be the integers the row-by-row path gives
+TIME_LIMIT = 1.0  # seconds
+
+CONSTANTS = {"pi": math.pi, "e": math.e, "tau": math.tau, "inf": math.inf}
+
+
+class CalculatorError(ValueError):
+    """The expression is invalid or exceeds the engine's limits"""
+
+
+def _check_int(value):
+    if isinstance(value, int) and value.bit_length() > MAX_INT_BITS:
+        raise CalculatorError(f"Result exceeds {MAX_INT_BITS:,} bits")
+    return value
+
+
+def _is_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _pow(base, exponent):
+    if _is_int(base) and _is_int(exponent) and exponent > 0 and abs(base) > 1:
+        bits = exponent * math.log2(abs(base))
+        if bits > MAX_INT_BITS:
+            # Not the operands: they can be thousands of digits long themselves
+            raise CalculatorError(f"Result would have about {bits:,.0f} bits; the limit is {MAX_INT_BITS:,}")
+    return _check_int(base ** exponent)
+
+
+def _mul(a, b):
+    if _is_int(a) and _is_int(b) and a.bit_length() + b.bit_length() > MAX_INT_BITS + 1:
+        raise CalculatorError(f"Result exceeds {MAX_INT_BITS:,} bits")
+    return a * b
+
+
+def _as_int(value, name: str, limit: int) -> int:
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if not _is_int(value) or value < 0:
+        raise CalculatorError(f"{name}() needs a non-negative integer")
+    if value > limit:
+        raise CalculatorError(f"{name}() is limited to arguments up to {limit:,}")
+    return value
+
+
+def _factorial(n):
+    return math.factorial(_as_int(n, "factorial", MAX_FACTORIAL))
+
+
+def _comb(n, k):
+    return math.comb(_as_int(n, "comb", MAX_COMB), _as_int(k, "comb", MAX_COMB))
+
+
+def _perm(n, k):
+    return math.perm(_as_int(n, "perm", MAX_COMB), _as_int(k, "perm", MAX_COMB))
+
+
+def _round_digits(ndigits) -> int:
+    # round(1, -10**9) computes 10**(10**9) internally, in one uninterruptible call
+    if isinstance(ndigits, float) and ndigits.is_integer():
+        ndigits = int(ndigits)
+    if not _is_int(ndigits) or abs(ndigits) > MAX_ROUND_DIGITS:
+        raise CalculatorError(f"round() needs an integer number of digits up to ±{MAX_ROUND_DIGITS}")
+    return ndigits
+
+
+def _round(x, ndigits=None):
+    return round(x) if ndigits is None else round(x, _round_digits(ndigits))
+
+
+def _log(x, base=None):
+    return math.log(x) if base is None else math.log(x, base)
+
+
+# Functions with no vectorized form; tables that call them are evaluated row by row
+SCALAR_ONLY = frozenset({"factorial", "comb", "perm"})
+
+# name -> scalar implementation
+FUNCTIONS: Dict[str, Callable] = {
+    "abs": abs, "round": _round, "min": min, "max": max,
+    "sqrt": math.sqrt, "exp": math.exp,
+    "log": _log, "log2": math.log2, "log10": math.log10,
+    "sin": math.sin, "cos": math.cos, "tan": math.tan,
+    "asin": math.asin, "acos": math.acos, "atan": math.atan,
+    "floor": math.floor, "ceil": math.ceil,
+    "factorial": _factorial, "comb": _comb, "perm": _perm,
+}
+
+_BINARY_OPERATORS = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: _mul,
+    ast.Div: operator.truediv, ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod, ast.Pow: _pow,
+}
+_UNARY_OPERATORS = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+
+
+@functools.lru_cache(maxsize=1)
+def _numpy():
+    """NumPy and its vectorized function table, or None when it isn't installed"""
+    try:
+        import numpy as np
+    except ImportError:
+        return None
+
+    def in_floats(ufunc):
+        # Constants are Python ints: as int64, 2**100 wraps and 2**-1 raises
+        return lambda a, b: ufunc(np.asarray(a, dtype=float), np.asarray(b, dtype=float))
+
+    functions = {
+        "abs": np.abs, "round": lambda x, n=0: np.round(x, _round_digits(n)),
+        "min": lambda *args: functools.reduce(np.minimum, args),
+        "max": lambda *args: functools.reduce(np.maximum, args),
+        "sqrt": np.sqrt, "exp": np.exp,
+        "log": lambda x, base=None: np.log(x) if base is None else np.log(x) / np.log(base),
+        "log2": np.log2, "log10": np.log10,
+        "sin": np.sin, "cos": np.cos, "tan": np.tan,
+        "asin": np.arcsin, "acos": np.arccos, "atan": np.arctan,
+        "floor": np.floor, "ceil": np.ceil,
+    }
+    operators = {
+        ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply,
+        ast.Div: np.true_divide, ast.FloorDiv: np.floor_divide,
+        ast.Mod: np.mod, ast.Pow: np.power,
+    }
+    operators = {op: in_floats(ufunc) for op, ufunc in operators.items()}
+    return np, functions, operators
+
+
+class _Context:
+    """Per-evaluation state: variable values, function table and deadline"""
+
+    __slots__ = ("variables", "functions", "operators", "deadline")
+
+    def __init__(self, variables, functions, operators, timeout):
+        self.variables = variables
+        self.functions = functions
+        self.operators = operators
+        self.deadline = time.monotonic() + timeout
+
+    def tick(self):
+        if time.monotonic() > self.deadline:
+            raise CalculatorError(f"Evaluation exceeded {TIME_LIMIT}s")
+
+
+@dataclass(frozen=True)
+class CompiledExpression:
+    source: str
+    variables: Tuple[str, ...]  # free names, in order of first use
+    _evaluate: Callable[[_Context], Any]
+    functions: frozenset = frozenset()  # names of the functions called
+
+    def __call__(self, variables: Optional[Dict[str, Any]] = None, timeout: float = TIME_LIMIT):
+        ctx = _Context(variables or {}, FUNCTIONS, _BINARY_OPERATORS, timeout)
+        return self._run(ctx)
+
+    def _run(self, ctx: _Context):
+        missing = [name for name in self.variables if name not in ctx.variables]
+        if missing:
+            raise CalculatorError(f"Unknown name '{missing[0]}'")
+        try:
+            return self._evaluate(ctx)
+        except OverflowError:
+            raise CalculatorError("Result is too large")
+
+
+class _Compiler:
+    def __init__(self):
+        self.nodes = 0
+        self.variables: List[str] = []
+        self.functions = set()
+
+    def compile(self, node):
+        self.nodes += 1
+        if self.nodes > MAX_NODES:
+            raise CalculatorError(f"Expression is too long (over {MAX_NODES} terms)")
+
+        if isinstance(node, ast.Constant):
+            value = node.value
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise CalculatorError(f"Unsupported value: {value!r}")
+            return lambda ctx: value
+
+        if isinstance(node, ast.Name):
+            name = node.id
+            if name in CONSTANTS:
+                value = CONSTANTS[name]
+                return lambda ctx: value
+            if name in FUNCTIONS:
+                raise CalculatorError(f"'{name}' is a function; call it like {name}(x)")
+            if name not in self.variables:
+                self.variables.append(name)
+            return lambda ctx: ctx.variables[name]
+
+        if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPERATORS:
+            op = type(node.op)
+            left, right = self.compile(node.left), self.compile(node.right)
+
+            def binary(ctx):
+                ctx.tick()
+                return ctx.operators[op](left(ctx), right(ctx))
+            return binary
+
+        if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPERATORS:
+            op = _UNARY_OPERATORS[type(node.op)]
+            operand = self.compile(node.operand)
+            return lambda ctx: op(operand(ctx))
+
+        if isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS:
+                name = getattr(node.func, "id", ast.unparse(node.func))
+                raise CalculatorError(f"Unknown function '{name}'")
+            if node.keywords:
+                raise CalculatorError("Keyword arguments are not supported")
+            name = node.func.id
+            self.functions.add(name)
+            args = [self.compile(arg) for arg in node.args]
+
+            def call(ctx):
+                ctx.tick()
+                return ctx.functions[name](*(arg(ctx) for arg in args))
+            return call
+
+        raise CalculatorError(f"Unsupported syntax: {ast.unparse(node)!r}")
+
+
+@functools.lru_cache(maxsize=512)
+def compile_expression(expression: str) -> CompiledExpression:
+    """Parse and compile `expression` (`^` means exponentiation)"""
+    source = expression.strip().replace("^", "**")
+    if not source:
+        raise CalculatorError("Empty expression")
+    if len(source) > MAX_EXPRESSION_LENGTH:
+        raise CalculatorError(f"Expression is longer than {MAX_EXPRESSION_LENGTH} characters")
+    try:
+        tree = ast.parse(source, mode="eval")
+    except SyntaxError as e:
+        raise CalculatorError(f"Invalid expression: {e.msg}")
+    except (RecursionError, MemoryError):
+        raise CalculatorError("Expression is nested too deeply")
+    compiler = _Compiler()
+    evaluate = compiler.compile(tree.body)
+    return CompiledExpression(source, tuple(compiler.variables), evaluate, frozenset(compiler.functions))
+
+
+def evaluate(expression: str, variables: Optional[Dict[str, Any]] = None):
+    """Evaluate `expression` to a single value"""
+    return compile_expression(expression)(variables)
+
+
+def parse_values(spec: str) -> List:
+    """Values for one table variable: `a..b` or `a..b..step` (inclusive), or `x, y, z`"""
+    spec = spec.strip()
+    if ".." in spec:
+        bounds = [evaluate(part) for part in spec.split("..")]
+        if len(bounds) not in (2, 3):
+            raise CalculatorError(f"Invalid range '{spec}'; use start..stop or start..stop..step")
+        start, stop = bounds[:2]
+        step = bounds[2] if len(bounds) == 3 else 1
+        if step == 0 or (stop - start) / step < 0:
+            raise CalculatorError(f"Range '{spec}' is empty")
+        count = math.floor((stop - start) / step + 1e-9) + 1
+        if count > MAX_ELEMENTS:
+            raise CalculatorError(f"Range '{spec}' has more than {MAX_ELEMENTS:,} values")
+        return [start + i * step for i in range(count)]
+    return [evaluate(part) for part in spec.split(",") if part.strip()]
+
+
+def evaluate_table(
+    expression: str,
+    values: Dict[str, str],
+    timeout: float = TIME_LIMIT,
+) -> Tuple[List[str], List[Sequence]]:
+    """Evaluate `expression` over every combination of `values`.
+
+    Returns (column names, rows); each row holds the variable values followed
+    by the result.
+    """
+    compiled = compile_expression(expression)
+    columns = {name: parse_values(spec) for name, spec in values.items()}
+    for name in compiled.variables:
+        if name not in columns:
+            raise CalculatorError(f"No values given for '{name}'")
+    names = list(columns)
+    total = math.prod(len(column) for column in columns.values())
+    if total > MAX_ELEMENTS:
+        raise CalculatorError(f"Table has {total:,} rows; the limit is {MAX_ELEMENTS:,}")
+    grid = list(itertools.product(*columns.values()))
+
+    deadline = time.monotonic() + timeout
+    numpy = _numpy() if not compiled.functions & SCALAR_ONLY else None
+    results = None
+    if numpy is not None:
+        np, functions, operators = numpy
+        # Floats avoid silent int64 overflow (keyspace sizes get big fast)
+        arrays = {name: np.array([row[i] for row in grid], dtype=float) for i, name in enumerate(names)}
+        ctx = _Context(arrays, functions, operators, timeout)
+        with np.errstate(all="ignore"):
+            vector = np.broadcast_to(compiled._run(ctx), (len(grid),))
+        # Past 2**53 floats lose integer digits, and inf/nan hide which rows
+        # failed: those tables are redone exactly, row by row
+        if np.all(np.isfinite(vector) & (np.abs(vector) < FLOAT_EXACT)):
+            results = vector.tolist()
+    if results is None:
+        results = []
+        for row in grid:
+            ctx = _Context(dict(zip(names, row)), FUNCTIONS, _BINARY_OPERATORS, deadline - time.monotonic())
+            try:
+                results.append(compiled._run(ctx))
+            except (ArithmeticError, ValueError) as e:
+                if isinstance(e, CalculatorError):
+                    raise
+                results.append(math.nan)
+    return names + ["result"], [row + (result,) for row, result in zip(grid, results)]
+
+
+def format_number(value) -> str:
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        value = int(value)
+    if _is_int(value):
+        return str(value) if abs(value) < 10 ** 15 else f"{value:.6e}"
+    if isinstance(value, float):
+        return f"{value:.6g}"
+    return str(value)
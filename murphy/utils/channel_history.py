@@ -0,0 +1,188 @@
+"""Incremental per-channel message history for cold-start context.
+
+Each channel keeps a ring buffer of its most recent messages, trimmed to a
+token budget, with per-message token counts computed once. The buffer is
+filled by one cold scan, then kept current from gateway events (new
+messages, and edits such as a streamed reply growing in place); Discord is
+only asked for messages newer than the last one seen, and only when events
+may have been missed (after a disconnect).
+"""
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import discord
+
+
+@dataclass
+class HistoryEntry:
+    message_id: int
+    role: str
+    author: Any
+    content: str
+    timestamp: str
+    tokens: int
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "role": self.role,
+            "content": self.content,
+            "timestamp": self.timestamp,
+            "author": self.author  # Store author object for ez referencing
+        }
+
+
+class ChannelHistory:
+    """Ring buffer of one channel's recent messages, oldest first"""
+
+    def __init__(self):
+        self.entries: deque = deque()
+        self.total_tokens = 0
+        self.last_seen_id: Optional[int] = None
+        # True while gateway events are known to keep the buffer current
+        self.live = False
+
+    def append(self, entry: HistoryEntry, max_tokens: int) -> None:
+        self.entries.append(entry)
+        self.total_tokens += entry.tokens
+        self.last_seen_id = entry.message_id
+        # Drop the oldest messages once over budget
+        self._trim(max_tokens)
+
+    def replace(self, entry: HistoryEntry, max_tokens: int) -> bool:
+        """Swap in the edited version of a buffered message; False if it isn't buffered"""
+        # Edits are almost always to recent messages (streamed replies)
+        for i in range(len(self.entries) - 1, -1, -1):
+            old = self.entries[i]
+            if old.message_id == entry.message_id:
+                self.entries[i] = entry
+                self.total_tokens += entry.tokens - old.tokens
+                self._trim(max_tokens)
+                return True
+            if old.message_id < entry.message_id:
+                return False
+        return False
+
+    def _trim(self, max_tokens: int) -> None:
+        while self.entries and self.total_tokens > max_tokens:
+            self.total_tokens -= self.entries.popleft().tokens
+
+
+class ChannelHistoryStore:
+    """Channel histories keyed by channel ID, least recently used evicted first"""
+
+    def __init__(self, max_tokens: int = 32000, max_channels: int = 256, scan_limit: int = 3000):
+        self.max_tokens = max_tokens
+        self.max_channels = max_channels
+        self.scan_limit = scan_limit
+        self._channels: "OrderedDict[int, ChannelHistory]" = OrderedDict()
+
+    @staticmethod
+    def _entry(message, bot_user) -> Optional[HistoryEntry]:
+        # Skip empty messages. Add `or message.author.bot` to skip bot msgs
+        if not message.content:
+            return None
+        # Imported here: langchain_core is loaded with the agent, not at startup
+        from langchain_core.messages.utils import count_tokens_approximately
+
+        # Add message to history (both user and AI messages)
+        role = "assistant" if message.author == bot_user else "user"
+        return HistoryEntry(
+            message_id=message.id,
+            role=role,
+            author=message.author,
+            content=message.content,
+            timestamp=message.created_at.isoformat(),
+            tokens=count_tokens_approximately([message.content]),
+        )
+
+    def record(self, message, bot_user) -> None:
+        """Append a message seen on the gateway to its channel, if that channel is being tracked"""
+        history = self._channels.get(message.channel.id)
+        if history is None or history.last_seen_id is None or message.id <= history.last_seen_id:
+            return
+        entry = self._entry(message, bot_user)
+        if entry is None:
+            history.last_seen_id = message.id
+        else:
+            history.append(entry, self.max_tokens)
+
+    def record_edit(self, message, bot_user) -> None:
+        """Update a buffered message after an edit"""
+        history = self._channels.get(message.channel.id)
+        if history is None:
+            return
+        entry = self._entry(message, bot_user)
+        if entry is not None:
+            history.replace(entry, self.max_tokens)
+
+    def mark_stale(self) -> None:
+        """Gateway events may have been missed; catch up from Discord on next load"""
+        for history in self._channels.values():
+            history.live = False
+
+    async def load(self, channel, bot_user, max_tokens: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Return the channel's recent messages (oldest first) within `max_tokens`"""
+        max_tokens = self.max_tokens if max_tokens is None else max_tokens
+        history = self._channels.get(channel.id)
+        if history is None:
+            history = await self._cold_load(channel, bot_user)
+        elif not history.live:
+            history = await self._catch_up(history, channel, bot_user)
+        self._channels[channel.id] = history
+        self._channels.move_to_end(channel.id)
+        while len(self._channels) > self.max_channels:
+            self._channels.popitem(last=False)
+
+        # Newest messages that fit the requested budget
+        selected = []
+        tokens = 0
+        for entry in reversed(history.entries):
+            if tokens + entry.tokens > max_tokens:
+                break
+            selected.append(entry.as_dict())
+            tokens += entry.tokens
+        selected.reverse()
+        return selected
+
+    async def _cold_load(self, channel, bot_user) -> ChannelHistory:
+        newest_first = []
+        tokens = 0
+        last_seen_id = None
+        async for message in channel.history(limit=self.scan_limit):
+            if last_seen_id is None:
+                last_seen_id = message.id
+            entry = self._entry(message, bot_user)
+            if entry is None:
+                continue
+            # Stop once adding this message would exceed our token limit
+            if tokens + entry.tokens > self.max_tokens:
+                break
+            newest_first.append(entry)
+            tokens += entry.tokens
+
+        history = ChannelHistory()
+        for entry in reversed(newest_first):
+            history.append(entry, self.max_tokens)
+        # Empty messages still advance the cursor
+        history.last_seen_id = last_seen_id or 0
+        history.live = True
+        return history
+
+    async def _catch_up(self, history: ChannelHistory, channel, bot_user) -> ChannelHistory:
+        missed = [message async for message in channel.history(
+            limit=self.scan_limit,
+            after=discord.Object(id=history.last_seen_id),
+            oldest_first=True,
+        )]
+        if len(missed) >= self.scan_limit:
+            # Too far behind to patch up; the newest messages matter most
+            return await self._cold_load(channel, bot_user)
+        for message in missed:
+            entry = self._entry(message, bot_user)
+            if entry is None:
+                history.last_seen_id = message.id
+            else:
+                history.append(entry, self.max_tokens)
+        history.live = True
+        return history
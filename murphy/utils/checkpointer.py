@@ -0,0 +1,352 @@
+"""Bounded, persistent checkpoint saver for the agent.
+
+`PersistentSaver` keeps recently used threads in memory exactly like
+`InMemorySaver`, but:
+
+- only the newest `max_checkpoints` checkpoints of each thread are kept
+  (the latest one is all a conversation needs to resume),
+- a thread's stored message history is capped at `max_thread_bytes`: the
+  oldest whole turns are dropped (the model only sees a summary of them
+  anyway, see context_window.py),
+- at most `max_threads` threads stay resident; idle threads are written to a
+  local SQLite file and dropped from memory, then loaded lazily the next time
+  they are used,
+- writes are queued and flushed by a background thread, and the file is
+  trimmed (including blobs no checkpoint references) and vacuumed
+  periodically,
+- the async methods run in a thread, so loading an evicted thread (or
+  waiting on a flush) doesn't block the event loop.
+"""
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from langgraph.checkpoint.memory import InMemorySaver
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    checkpoint_type TEXT NOT NULL,
+    checkpoint BLOB NOT NULL,
+    metadata_type TEXT NOT NULL,
+    metadata BLOB NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    value_type TEXT NOT NULL,
+    value BLOB NOT NULL,
+    task_path TEXT NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    version TEXT NOT NULL,
+    value_type TEXT NOT NULL,
+    value BLOB NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+);
+"""
+
+
+class PersistentSaver(InMemorySaver):
+    """`InMemorySaver` with per-thread checkpoint limits, LRU eviction to SQLite and lazy loading"""
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        max_threads: int = 64,
+        max_checkpoints: int = 3,
+        max_thread_bytes: int = 4 << 20,
+        flush_interval: float = 5.0,
+        compact_interval: float = 6 * 60 * 60,
+        serde=None,
+    ):
+        super().__init__(serde=serde)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_threads = max_threads
+        self.max_checkpoints = max_checkpoints
+        self.max_thread_bytes = max_thread_bytes
+        self.compact_interval = compact_interval
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._resident: OrderedDict = OrderedDict()  # thread_id -> None, least recently used first
+        self._pending = []  # queued (sql, params) writes, applied in order
+        self._last_compaction = time.monotonic()
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._run_flusher, args=(flush_interval,), daemon=True)
+        self._flusher.start()
+
+    # Residency
+    def _touch(self, thread_id: str) -> None:
+        """Make a thread resident (loading it from disk if needed) and mark it most recently used"""
+        if thread_id in self._resident:
+            self._resident.move_to_end(thread_id)
+            return
+        self._load_thread(thread_id)
+        self._resident[thread_id] = None
+        while len(self._resident) > self.max_threads:
+            idle_thread, _ = self._resident.popitem(last=False)
+            self._evict(idle_thread)
+
+    def _load_thread(self, thread_id: str) -> None:
+        self._flush_locked()
+        rows = self._conn.execute(
+            "SELECT checkpoint_ns, checkpoint_id, parent_checkpoint_id, checkpoint_type, checkpoint, metadata_type, metadata "
+            "FROM checkpoints WHERE thread_id = ?", (thread_id,)
+        ).fetchall()
+        for ns, checkpoint_id, parent, c_type, c_value, m_type, m_value in rows:
+            self.storage[thread_id][ns][checkpoint_id] = ((c_type, c_value), (m_type, m_value), parent)
+        rows = self._conn.execute(
+            "SELECT checkpoint_ns, checkpoint_id, task_id, idx, channel, value_type, value, task_path "
+            "FROM writes WHERE thread_id = ?", (thread_id,)
+        ).fetchall()
+        for ns, checkpoint_id, task_id, idx, channel, v_type, value, task_path in rows:
+            self.writes[(thread_id, ns, checkpoint_id)][(task_id, idx)] = (task_id, channel, (v_type, value), task_path)
+        rows = self._conn.execute(
+            "SELECT checkpoint_ns, channel, version, value_type, value FROM blobs WHERE thread_id = ?", (thread_id,)
+        ).fetchall()
+        for ns, channel, version, v_type, value in rows:
+            self.blobs[(thread_id, ns, channel, version)] = (v_type, value)
+
+    def _evict(self, thread_id: str) -> None:
+        """Drop a thread from memory once its queued writes are on disk"""
+        self._flush_locked()
+        self.storage.pop(thread_id, None)
+        for key in [k for k in self.writes if k[0] == thread_id]:
+            del self.writes[key]
+        for key in [k for k in self.blobs if k[0] == thread_id]:
+            del self.blobs[key]
+
+    # Trimming
+    def _trim(self, thread_id: str, checkpoint_ns: str) -> None:
+        """Keep only the newest `max_checkpoints` checkpoints and the blobs they reference"""
+        checkpoints = self.storage[thread_id][checkpoint_ns]
+        if len(checkpoints) <= self.max_checkpoints:
+            return
+        stale = sorted(checkpoints)[:-self.max_checkpoints]
+        for checkpoint_id in stale:
+            del checkpoints[checkpoint_id]
+            self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+            self._pending.append((
+                "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                (thread_id, checkpoint_ns, checkpoint_id),
+            ))
+            self._pending.append((
+                "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                (thread_id, checkpoint_ns, checkpoint_id),
+            ))
+
+        referenced = set()
+        for saved_checkpoint, _, _ in checkpoints.values():
+            for channel, version in self.serde.loads_typed(saved_checkpoint)["channel_versions"].items():
+                referenced.add((thread_id, checkpoint_ns, channel, version))
+        for key in [k for k in self.blobs if k[0] == thread_id and k[1] == checkpoint_ns and k not in referenced]:
+            del self.blobs[key]
+            self._pending.append((
+                "DELETE FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                (key[0], key[1], key[2], str(key[3])),
+            ))
+
+    def _cap_messages(self, typed_value):
+        """The serialized message list without its oldest turns, if it's over `max_thread_bytes`"""
+        if not self.max_thread_bytes or len(typed_value[1]) <= self.max_thread_bytes:
+            return typed_value
+        messages = self.serde.loads_typed(typed_value)
+        if not isinstance(messages, list):
+            return typed_value
+        # Cut at a turn boundary (a human message), so tool calls keep their
+        # results; to 3/4 of the cap, so a long conversation isn't rewritten on every step
+        starts = [i for i, message in enumerate(messages) if i and getattr(message, "type", None) == "human"]
+        if not starts:
+            return typed_value
+        budget = self.max_thread_bytes * 3 // 4
+        sizes = [len(self.serde.dumps_typed(message)[1]) for message in messages]
+        remaining = sum(sizes)
+        start, previous = starts[-1], 0  # at worst, keep only the current turn
+        for turn_start in starts:
+            remaining -= sum(sizes[previous:turn_start])
+            previous = turn_start
+            if remaining <= budget:
+                start = turn_start
+                break
+        return self.serde.dumps_typed(messages[start:])
+
+    # BaseCheckpointSaver interface
+    def get_tuple(self, config):
+        with self._lock:
+            self._touch(config["configurable"]["thread_id"])
+            return super().get_tuple(config)
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        with self._lock:
+            if config:
+                self._touch(config["configurable"]["thread_id"])
+            else:
+                # Listing every thread: bring the ones on disk in as well
+                self._flush_locked()
+                for (thread_id,) in self._conn.execute("SELECT DISTINCT thread_id FROM checkpoints").fetchall():
+                    self._touch(thread_id)
+            items = list(super().list(config, filter=filter, before=before, limit=limit))
+        yield from items
+
+    def get_delta_channel_history(self, *, config, channels):
+        with self._lock:
+            self._touch(config["configurable"]["thread_id"])
+            return super().get_delta_channel_history(config=config, channels=channels)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        with self._lock:
+            self._touch(thread_id)
+            next_config = super().put(config, checkpoint, metadata, new_versions)
+            checkpoint_id = checkpoint["id"]
+            saved_checkpoint, saved_metadata, parent = self.storage[thread_id][checkpoint_ns][checkpoint_id]
+            self._pending.append((
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, checkpoint_ns, checkpoint_id, parent,
+                 saved_checkpoint[0], saved_checkpoint[1], saved_metadata[0], saved_metadata[1]),
+            ))
+            for channel, version in new_versions.items():
+                key = (thread_id, checkpoint_ns, channel, version)
+                if channel == "messages":
+                    self.blobs[key] = self._cap_messages(self.blobs[key])
+                v_type, value = self.blobs[key]
+                self._pending.append((
+                    "INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?)",
+                    (thread_id, checkpoint_ns, channel, str(version), v_type, value),
+                ))
+            self._trim(thread_id, checkpoint_ns)
+            return next_config
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        with self._lock:
+            self._touch(thread_id)
+            super().put_writes(config, writes, task_id, task_path)
+            stored = self.writes.get((thread_id, checkpoint_ns, checkpoint_id), {})
+            for (write_task_id, idx), (_, channel, (v_type, value), path) in stored.items():
+                if write_task_id != task_id:
+                    continue
+                self._pending.append((
+                    "INSERT OR REPLACE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, v_type, value, path),
+                ))
+
+    def delete_thread(self, thread_id):
+        with self._lock:
+            super().delete_thread(thread_id)
+            self._resident.pop(thread_id, None)
+            for table in ("checkpoints", "writes", "blobs"):
+                self._pending.append((f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,)))
+            self._flush_locked()
+
+    # Async variants: the sync methods may read SQLite or wait on the lock
+    # while the flusher writes, so they run in a thread
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aget_delta_channel_history(self, *, config, channels):
+        return await asyncio.to_thread(lambda: self.get_delta_channel_history(config=config, channels=channels))
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id):
+        return await asyncio.to_thread(self.delete_thread, thread_id)
+
+    # Persistence
+    def _flush_locked(self) -> None:
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        with self._conn:
+            for sql, params in pending:
+                self._conn.execute(sql, params)
+
+    def flush(self) -> None:
+        """Write all queued changes to disk"""
+        with self._lock:
+            self._flush_locked()
+
+    def compact(self) -> None:
+        """Trim threads that exceed `max_checkpoints` on disk and reclaim free pages"""
+        with self._lock:
+            self._flush_locked()
+            with self._conn:
+                self._conn.execute(
+                    "DELETE FROM checkpoints WHERE rowid IN ("
+                    " SELECT rowid FROM ("
+                    "  SELECT rowid, ROW_NUMBER() OVER ("
+                    "   PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC) AS rank"
+                    "  FROM checkpoints) WHERE rank > ?)",
+                    (self.max_checkpoints,),
+                )
+                self._conn.execute(
+                    "DELETE FROM writes WHERE NOT EXISTS ("
+                    " SELECT 1 FROM checkpoints c WHERE c.thread_id = writes.thread_id"
+                    " AND c.checkpoint_ns = writes.checkpoint_ns AND c.checkpoint_id = writes.checkpoint_id)"
+                )
+                self._delete_orphaned_blobs()
+            self._conn.execute("VACUUM")
+            self._last_compaction = time.monotonic()
+
+    def _delete_orphaned_blobs(self) -> None:
+        """Delete blobs (channel values) that no remaining checkpoint references"""
+        referenced = set()
+        for thread_id, ns, c_type, c_value in self._conn.execute(
+                "SELECT thread_id, checkpoint_ns, checkpoint_type, checkpoint FROM checkpoints"):
+            for channel, version in self.serde.loads_typed((c_type, c_value))["channel_versions"].items():
+                referenced.add((thread_id, ns, channel, str(version)))
+        orphaned = [
+            (rowid,) for rowid, thread_id, ns, channel, version
+            in self._conn.execute("SELECT rowid, thread_id, checkpoint_ns, channel, version FROM blobs")
+            if (thread_id, ns, channel, version) not in referenced
+        ]
+        self._conn.executemany("DELETE FROM blobs WHERE rowid = ?", orphaned)
+
+    def _run_flusher(self, interval: float) -> None:
+        while not self._closed.wait(interval):
+            try:
+                self.flush()
+                if time.monotonic() - self._last_compaction >= self.compact_interval:
+                    self.compact()
+            except Exception as e:
+                print(f"Error persisting checkpoints: {e}")
+
+    def close(self) -> None:
+        """Flush everything to disk and stop the background writer"""
+        self._closed.set()
+        with self._lock:
+            self._flush_locked()
+            self._conn.close()
@@ -0,0 +1,227 @@
+"""Token-budgeted context window for the agent's model calls.
+
+Runs as the agent's `pre_model_hook` and returns `llm_input_messages`, so the
+checkpointed conversation is never rewritten; only what is sent to the model
+shrinks. Three tiers, oldest to newest:
+
+1. turns that no longer fit are folded into a rolling summary, cached per
+   thread and only extended when more turns fall out of the window,
+2. older turns that still fit are kept, but their large tool outputs
+   (webpage dumps, search blobs) are replaced by short references,
+3. the current turn is always sent verbatim.
+"""
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Optional
+
+from langchain_core.messages import (BaseMessage, HumanMessage, SystemMessage,
+                                     ToolMessage)
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+
+from .telemetry import telemetry
+from .utilityfuncs import message_text
+
+SUMMARY_PROMPT = """Summarize the conversation below for an assistant that will continue it.
+Keep facts, findings, hosts, commands, credentials, URLs, decisions and open questions. Drop pleasantries.
+Be concise; use terse bullet points."""
+
+
+def _turns(messages: List[BaseMessage]) -> List[List[BaseMessage]]:
+    """Split messages into turns, each starting at a human message"""
+    turns = []
+    for msg in messages:
+        if isinstance(msg, HumanMessage) or not turns:
+            turns.append([msg])
+        else:
+            turns[-1].append(msg)
+    return turns
+
+
+def _transcript(messages: List[BaseMessage], max_chars: int = 2000) -> str:
+    lines = []
+    for msg in messages:
+        text = message_text(msg.content).strip()
+        if isinstance(msg, ToolMessage):
+            lines.append(f"[{msg.name or 'tool'} output]: {text[:max_chars // 4]}")
+        elif text:
+            speaker = "User" if isinstance(msg, HumanMessage) else "Assistant"
+            lines.append(f"{speaker}: {text[:max_chars]}")
+    return "\n".join(lines)
+
+
+def extractive_summary(previous: Optional[str], messages: List[BaseMessage], max_lines: int = 80) -> str:
+    """Summarizer that needs no model: the opening line of each folded message"""
+    lines = previous.splitlines() if previous else []
+    for msg in messages:
+        if isinstance(msg, ToolMessage):
+            continue
+        text = message_text(msg.content).strip()
+        if not text:
+            continue
+        first_line = text.splitlines()[0][:200]
+        speaker = "User" if isinstance(msg, HumanMessage) else "Assistant"
+        lines.append(f"- {speaker}: {first_line}")
+    return "\n".join(lines[-max_lines:])
+
+
+class ModelSummarizer:
+    """Rolling summaries written by a (cheap) chat model, falling back to `extractive_summary`"""
+
+    def __init__(self, model, max_messages: int = 40):
+        self.model = model
+        # A large backlog (first fold after a restart) is mostly folded
+        # extractively; only the newest messages go to the model
+        self.max_messages = max_messages
+
+    def _prompt(self, previous, messages):
+        if len(messages) > self.max_messages:
+            previous = extractive_summary(previous, messages[:-self.max_messages])
+            messages = messages[-self.max_messages:]
+        content = _transcript(messages)
+        if previous:
+            content = f"Existing summary:\n{previous}\n\nNew messages to fold in:\n{content}"
+        return [SystemMessage(content=SUMMARY_PROMPT), HumanMessage(content=content)]
+
+    def __call__(self, previous, messages):
+        try:
+            return message_text(self.model.invoke(self._prompt(previous, messages)).content)
+        except Exception as e:
+            print(f"Error summarizing context: {e}")
+            return extractive_summary(previous, messages)
+
+    async def asummarize(self, previous, messages):
+        try:
+            return message_text((await self.model.ainvoke(self._prompt(previous, messages))).content)
+        except Exception as e:
+            print(f"Error summarizing context: {e}")
+            return extractive_summary(previous, messages)
+
+
+class ContextWindowManager:
+    """Builds the model input for each agent step within a token budget"""
+
+    def __init__(
+        self,
+        max_tokens: int = 32000,
+        recent_tokens: int = 16000,
+        summarizer: Callable = extractive_summary,
+        tool_output_stub_chars: int = 500,
+        max_threads: int = 256,
+    ):
+        # Fold once the window exceeds `max_tokens`, keeping `recent_tokens`
+        # of verbatim turns so the summary isn't recomputed on every step
+        self.max_tokens = max_tokens
+        self.recent_tokens = recent_tokens
+        self.summarizer = summarizer
+        self.tool_output_stub_chars = tool_output_stub_chars
+        self.max_threads = max_threads
+        # thread_id -> (ID of the last folded message, summary text)
+        self._summaries: OrderedDict = OrderedDict()
+        self._token_counts: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _tokens(self, messages: List[BaseMessage]) -> int:
+        total = 0
+        for msg in messages:
+            key = (msg.id, len(message_text(msg.content))) if msg.id else None
+            count = self._token_counts.get(key) if key else None
+            if count is None:
+                count = count_tokens_approximately([msg])
+                if key:
+                    self._token_counts[key] = count
+                    if len(self._token_counts) > 50000:
+                        self._token_counts.popitem(last=False)
+            total += count
+        return total
+
+    def _stub(self, msg: BaseMessage) -> BaseMessage:
+        """Replace a stale, large tool output with a short reference"""
+        if not isinstance(msg, ToolMessage):
+            return msg
+        text = message_text(msg.content)
+        if len(text) <= self.tool_output_stub_chars:
+            return msg
+        first_line = text.splitlines()[0][:150] if text else ""
+        stub = (f"[Earlier {msg.name or 'tool'} output omitted ({len(text):,} chars). "
+                f"First line: {first_line!r}. Call the tool again if you need the details.]")
+        return msg.model_copy(update={"content": stub})
+
+    def _plan(self, messages: List[BaseMessage]):
+        """Return (messages to fold into the summary, turns to send verbatim)"""
+        turns = _turns(messages)
+        current = turns[-1] if turns else []
+        older = [[self._stub(msg) for msg in turn] for turn in turns[:-1]]
+
+        if self._tokens([msg for turn in older for msg in turn]) + self._tokens(current) <= self.max_tokens:
+            return [], older + [current]
+
+        budget = self.recent_tokens - self._tokens(current)
+        keep_from = len(older)
+        while keep_from > 0:
+            turn_tokens = self._tokens(older[keep_from - 1])
+            if turn_tokens > budget:
+                break
+            budget -= turn_tokens
+            keep_from -= 1
+        folded = [msg for turn in turns[:keep_from] for msg in turn]
+        return folded, older[keep_from:] + [current]
+
+    def _summary_inputs(self, thread_id, folded):
+        """Return (previous summary, messages not yet in it), reusing the cached summary"""
+        with self._lock:
+            cached = self._summaries.get(thread_id) if thread_id else None
+        if cached:
+            last_id, summary = cached
+            for i, msg in enumerate(folded):
+                if msg.id == last_id:
+                    return summary, folded[i + 1:]
+        return None, folded
+
+    def _store_summary(self, thread_id, folded, summary):
+        if not thread_id or not folded:
+            return
+        with self._lock:
+            self._summaries[thread_id] = (folded[-1].id, summary)
+            self._summaries.move_to_end(thread_id)
+            while len(self._summaries) > self.max_threads:
+                self._summaries.popitem(last=False)
+
+    def _assemble(self, summary, turns, span=None):
+        messages = [msg for turn in turns for msg in turn]
+        if summary:
+            messages.insert(0, SystemMessage(content=f"Summary of the earlier conversation:\n{summary}"))
+        if span is not None:
+            span.attrs.update(messages=len(messages), tokens=self._tokens(messages), summarized=bool(summary))
+        return {"llm_input_messages": messages}
+
+    def __call__(self, state, config: RunnableConfig):
+        thread_id = config.get("configurable", {}).get("thread_id")
+        with telemetry.span("context_window") as span:
+            folded, turns = self._plan(state["messages"])
+            summary = None
+            if folded:
+                previous, new_messages = self._summary_inputs(thread_id, folded)
+                summary = self.summarizer(previous, new_messages) if new_messages else previous
+                self._store_summary(thread_id, folded, summary)
+            return self._assemble(summary, turns, span)
+
+    async def acall(self, state, config: RunnableConfig):
+        thread_id = config.get("configurable", {}).get("thread_id")
+        with telemetry.span("context_window") as span:
+            folded, turns = self._plan(state["messages"])
+            summary = None
+            if folded:
+                previous, new_messages = self._summary_inputs(thread_id, folded)
+                if not new_messages:
+                    summary = previous
+                elif hasattr(self.summarizer, "asummarize"):
+                    summary = await self.summarizer.asummarize(previous, new_messages)
+                else:
+                    summary = self.summarizer(previous, new_messages)
+                self._store_summary(thread_id, folded, summary)
+            return self._assemble(summary, turns, span)
+
+    def as_hook(self) -> RunnableLambda:
+        """The manager as a `pre_model_hook` for `create_agent`"""
+        return RunnableLambda(self.__call__, afunc=self.acall, name="context_window")
@@ -0,0 +1,328 @@
+"""Concurrent, budgeted site crawler behind `crawl_url`.
+
+A breadth-first crawl of the start URL's host by a small pool of async
+workers. Only in-scope, robots.txt-allowed URLs are ever fetched (redirects
+are followed by hand, and each hop is checked the same way), and URLs are
+normalized before deduplication. Requests to a host are spaced by a politeness
+delay, or by the host's Crawl-delay if that is longer. Crawls stop when the
+page budget, the depth limit or the wall-clock deadline is reached, whichever
+comes first. Links to other sites are reported but never followed.
+"""
+import asyncio
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+from urllib.robotparser import RobotFileParser
+
+import aiohttp
+import lxml.etree
+import lxml.html
+
+from .cache import TTLCache
+from .extraction import extract_text
+from .webclient import DEFAULT_HEADERS, DEFAULT_TIMEOUT, FETCH_ERRORS, get_async_session
+
+CRAWL_WORKERS = 4
+CRAWL_HOST_DELAY = 0.5  # seconds between requests to one host
+CRAWL_MAX_CRAWL_DELAY = 10.0  # cap on a robots.txt Crawl-delay we'll honor
+CRAWL_DEADLINE = 60.0  # seconds
+CRAWL_MAX_PAGE_BYTES = 2 * 1024 * 1024
+CRAWL_MAX_REDIRECTS = 5  # per page
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+ROBOTS_MAX_BYTES = 500 * 1024  # RFC 9309 parsing limit
+ROBOTS_CACHE_TTL = 60 * 60
+ROBOTS_ERROR_TTL = 60
+
+# The name robots.txt rules are matched against (falls back to the "*" group)
+ROBOTS_USER_AGENT = DEFAULT_HEADERS['User-Agent']
+
+# Query parameters that never change what a page shows
+TRACKING_PARAMS = {"fbclid", "gclid", "mc_cid", "mc_eid", "ref_src"}
+
+
+def normalize_url(url: str, base: Optional[str] = None) -> Optional[str]:
+    """Canonical form of an http(s) URL for deduplication, or None if it isn't one"""
+    try:
+        parts = urlsplit(urljoin(base, url.strip()) if base else url.strip())
+        port = parts.port
+    except ValueError:
+        return None
+    scheme = parts.scheme.lower()
+    host = parts.hostname
+    if scheme not in ("http", "https") or not host:
+        return None
+    if ":" in host:
+        host = f"[{host}]"  # IPv6 literal
+    if port is not None and (scheme, port) not in (("http", 80), ("https", 443)):
+        host = f"{host}:{port}"
+    query = urlencode(sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.startswith("utm_") and key not in TRACKING_PARAMS
+    ))
+    return urlunsplit((scheme, host, parts.path or "/", query, ""))
+
+
+def _origin(url: str) -> str:
+    return "{0.scheme}://{0.netloc}".format(urlsplit(url))
+
+
+def _site(netloc: str) -> str:
+    """Host used for scoping; www. and the bare domain are the same site"""
+    return netloc[4:] if netloc.startswith("www.") else netloc
+
+
+class RobotsCache:
+    """Parsed robots.txt per origin, fetched once and kept for `ttl` seconds"""
+
+    def __init__(self, maxsize: int = 256, ttl: float = ROBOTS_CACHE_TTL):
+        self._parsers = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    async def get(self, origin: str, session: aiohttp.ClientSession) -> RobotFileParser:
+        parser = self._parsers.get(origin)
+        if parser is not None:
+            return parser
+        # Concurrent workers share one fetch per origin
+        task = self._inflight.get(origin)
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.create_task(self._fetch(origin, session))
+            self._inflight[origin] = task
+        try:
+            parser = await asyncio.shield(task)
+        finally:
+            if task.done():
+                self._inflight.pop(origin, None)
+        # Retry unreachable hosts sooner
+        self._parsers.set(origin, parser, ttl=ROBOTS_ERROR_TTL if parser.error else None)
+        return parser
+
+    @staticmethod
+    async def _fetch(origin: str, session: aiohttp.ClientSession) -> RobotFileParser:
+        parser = RobotFileParser(f"{origin}/robots.txt")
+        parser.error = None
+        try:
+            async with session.get(parser.url, timeout=aiohttp.ClientTimeout(total=DEFAULT_TIMEOUT)) as response:
+                if 400 <= response.status < 500:
+                    # No robots.txt (or not ours to read): everything is allowed
+                    parser.allow_all = True
+                elif response.status >= 500:
+                    parser.disallow_all = True
+                else:
+                    body = await response.content.read(ROBOTS_MAX_BYTES)
+                    parser.parse(body.decode("utf-8", errors="replace").splitlines())
+        except FETCH_ERRORS as e:
+            # Unreachable robots.txt means "assume complete disallow" (RFC 9309)
+            parser.disallow_all = True
+            parser.error = str(e) or type(e).__name__
+        return parser
+
+
+robots_cache = RobotsCache()
+
+
+@dataclass
+class CrawledPage:
+    url: str
+    depth: int
+    status: Optional[int] = None
+    links: int = 0  # links found on the page
+    text: Optional[str] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class CrawlResult:
+    start_url: str
+    pages: List[CrawledPage] = field(default_factory=list)
+    links: List[str] = field(default_factory=list)  # discovered links, in discovery order
+    robots_blocked: List[str] = field(default_factory=list)
+    stop_reason: Optional[str] = None  # None when the site ran out of links first
+    elapsed: float = 0.0
+
+
+class Crawler:
+    def __init__(
+        self,
+        start_url: str,
+        *,
+        max_pages: int = 10,
+        max_links: int = 50,
+        max_depth: int = 5,
+        same_domain: bool = False,
+        include_text: bool = False,
+        workers: int = CRAWL_WORKERS,
+        host_delay: float = CRAWL_HOST_DELAY,
+        deadline: float = CRAWL_DEADLINE,
+        session: Optional[aiohttp.ClientSession] = None,
+        robots: Optional[RobotsCache] = None,
+    ):
+        start = normalize_url(start_url)
+        if start is None:
+            raise ValueError(f"Not an http(s) URL: {start_url}")
+        self.start = start
+        self.site = _site(urlsplit(start).netloc)
+        self.max_pages = max_pages
+        self.max_links = max_links
+        self.max_depth = max_depth
+        # Only limits which links are *reported*; fetching never leaves the site
+        self.same_domain = same_domain
+        self.include_text = include_text
+        self.workers = workers
+        self.host_delay = host_delay
+        self.deadline = deadline
+        self.session = session
+        self.robots = robots or robots_cache
+
+        self._seen: Set[str] = {start}
+        self._reported: Set[str] = set()
+        self._fetches = 0
+        self._depth_limited = False
+        self._next_fetch: Dict[str, float] = defaultdict(float)
+        self._host_locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+        self.result = CrawlResult(start_url=start)
+
+    def in_scope(self, url: str) -> bool:
+        return _site(urlsplit(url).netloc) == self.site
+
+    async def crawl(self) -> CrawlResult:
+        session = self.session or get_async_session()
+        queue: asyncio.Queue = asyncio.Queue()
+        queue.put_nowait((self.start, 0))
+        started = time.monotonic()
+        workers = [asyncio.create_task(self._worker(queue, session)) for _ in range(self.workers)]
+        try:
+            await asyncio.wait_for(queue.join(), timeout=self.deadline)
+        except asyncio.TimeoutError:
+            self.result.stop_reason = f"time budget of {self.deadline:g}s reached"
+        else:
+            if self.result.stop_reason is None and self._depth_limited:
+                self.result.stop_reason = f"depth limit of {self.max_depth} reached"
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        self.result.elapsed = time.monotonic() - started
+        return self.result
+
+    async def _worker(self, queue: asyncio.Queue, session: aiohttp.ClientSession) -> None:
+        while True:
+            url, depth = await queue.get()
+            try:
+                await self._visit(url, depth, queue, session)
+            except Exception as e:
+                self.result.pages.append(CrawledPage(url=url, depth=depth, error=str(e)))
+            finally:
+                queue.task_done()
+
+    async def _visit(self, url: str, depth: int, queue: asyncio.Queue, session: aiohttp.ClientSession) -> None:
+        if self._fetches >= self.max_pages:
+            self.result.stop_reason = f"page budget of {self.max_pages} reached"
+            return
+        origin = _origin(url)
+        robots = await self.robots.get(origin, session)
+        if robots.error:
+            self.result.pages.append(CrawledPage(url=url, depth=depth, error=f"robots.txt unreachable: {robots.error}"))
+            return
+        if not robots.can_fetch(ROBOTS_USER_AGENT, url):
+            self.result.robots_blocked.append(url)
+            return
+        if self._fetches >= self.max_pages:
+            return
+        self._fetches += 1
+
+        page = CrawledPage(url=url, depth=depth)
+        self.result.pages.append(page)
+        final_url = url
+        for _ in range(CRAWL_MAX_REDIRECTS + 1):
+            await self._wait_turn(origin, robots)
+            try:
+                async with session.get(final_url, allow_redirects=False,
+                                       timeout=aiohttp.ClientTimeout(total=DEFAULT_TIMEOUT)) as response:
+                    page.status = response.status
+                    location = response.headers.get("Location") if response.status in REDIRECT_STATUSES else None
+                    if location is None:
+                        if response.status >= 400:
+                            page.error = f"HTTP {response.status}"
+                            return
+                        if "html" not in response.headers.get("Content-Type", "text/html"):
+                            return
+                        body = await response.content.read(CRAWL_MAX_PAGE_BYTES)
+                        break
+            except FETCH_ERRORS as e:
+                page.error = str(e) or type(e).__name__
+                return
+
+            # A redirect target gets the same checks as a link before it's fetched
+            target = normalize_url(location, final_url)
+            if target is None:
+                page.error = f"Redirected to an unsupported URL: {location}"
+                return
+            self._seen.add(target)
+            if not self.in_scope(target):
+                page.error = f"Redirected off-site to {target}"
+                return
+            origin = _origin(target)
+            robots = await self.robots.get(origin, session)
+            if robots.error:
+                page.error = f"Redirected to {target}; robots.txt unreachable: {robots.error}"
+                return
+            if not robots.can_fetch(ROBOTS_USER_AGENT, target):
+                self.result.robots_blocked.append(target)
+                return
+            final_url = target
+        else:
+            page.error = f"More than {CRAWL_MAX_REDIRECTS} redirects"
+            return
+
+        links, page.text = await asyncio.to_thread(self._parse, final_url, body)
+        page.links = len(links)
+        for link in links:
+            in_scope = self.in_scope(link)
+            if (link not in self._reported and link != final_url and len(self.result.links) < self.max_links
+                    and (in_scope or not self.same_domain)):
+                self._reported.add(link)
+                self.result.links.append(link)
+            if in_scope and link not in self._seen and self._fetches < self.max_pages:
+                if depth >= self.max_depth:
+                    self._depth_limited = True
+                    continue
+                self._seen.add(link)
+                queue.put_nowait((link, depth + 1))
+
+    async def _wait_turn(self, origin: str, robots: RobotFileParser) -> None:
+        """Space requests to one host by the politeness delay"""
+        # Our own group's Crawl-delay, else the "*" group's
+        delay = max(self.host_delay, min(float(robots.crawl_delay(ROBOTS_USER_AGENT) or 0), CRAWL_MAX_CRAWL_DELAY))
+        async with self._host_locks[origin]:
+            now = time.monotonic()
+            wait = self._next_fetch[origin] - now
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._next_fetch[origin] = max(now, self._next_fetch[origin]) + delay
+
+    def _parse(self, url: str, body: bytes) -> Tuple[List[str], Optional[str]]:
+        """Normalized links (in page order) and, if requested, the page's text"""
+        try:
+            doc = lxml.html.document_fromstring(body)
+        except (lxml.etree.ParserError, ValueError):
+            return [], None
+        base = urljoin(url, doc.xpath("string(//base/@href)").strip() or url)
+        links = []
+        seen = set()
+        for href in doc.xpath("//a/@href | //area/@href"):
+            link = normalize_url(href, base)
+            if link and link not in seen:
+                seen.add(link)
+                links.append(link)
+        text = extract_text(body) if self.include_text else None
+        return links, text
+
+
+def crawl(start_url: str, **options) -> CrawlResult:
+    """Run a crawl from synchronous code, on its own event loop and session"""
+    async def run():
+        async with aiohttp.ClientSession(headers=DEFAULT_HEADERS) as session:
+            return await Crawler(start_url, session=session, **options).crawl()
+    return asyncio.run(run())
@@ -0,0 +1,175 @@
+"""Main-text extraction from downloaded HTML.
+
+The page is parsed once with lxml and that tree is shared by both methods:
+trafilatura first (on trees small enough for it), then a fallback that picks the main content block in a
+single bottom-up pass over the tree (text lengths are summed from the leaves
+up, never re-read per candidate). BeautifulSoup is only used when lxml can't
+parse the document.
+"""
+import re
+from typing import Dict, Optional
+
+import lxml.etree
+import lxml.html
+import trafilatura
+from bs4 import BeautifulSoup
+
+# Never part of the main content
+REMOVED_TAGS = ('script', 'style', 'nav', 'footer', 'aside', 'header', 'form',
+                'iframe', 'button', 'input', 'noscript', 'svg', 'template')
+
+# class/id words of page furniture, skipped when measuring blocks
+CLUTTER_PATTERN = re.compile(
+    r'(?:^|[\s_-])(?:ads?|advert\w*|banner|popup|modal|cookies?|newsletter|social-share|'
+    r'share-buttons|comments?|sidebar)(?:$|[\s_-])', re.IGNORECASE)
+
+# Same priorities as the selector list this replaced: semantic containers,
+# then well-known content classes/ids, then the largest generic block
+CONTENT_CLASSES = {'content', 'main-content', 'post-content', 'entry-content', 'article-body'}
+GENERIC_TAGS = {'div', 'section'}
+
+# trafilatura's cost grows with the element count (about 2s at this size);
+# bigger trees (forum dumps, huge docs pages) go straight to the fallback
+TRAFILATURA_MAX_ELEMENTS = 20_000
+
+_HTML_PARSER = lxml.html.HTMLParser(remove_comments=True, remove_pis=True)
+
+
+def _parse(content: bytes) -> Optional[lxml.html.HtmlElement]:
+    try:
+        return lxml.html.document_fromstring(content, parser=_HTML_PARSER)
+    except (lxml.etree.ParserError, ValueError):
+        return None
+
+
+def _priority(element) -> int:
+    """Rank of a candidate container; lower wins, 5 means not a candidate"""
+    tag = element.tag
+    if tag == 'article':
+        return 0
+    if tag == 'main':
+        return 1
+    if element.get('role') == 'main':
+        return 2
+    if element.get('id') == 'content' or CONTENT_CLASSES & set((element.get('class') or '').split()):
+        return 3
+    if tag in GENERIC_TAGS:
+        return 4
+    return 5
+
+
+def _is_clutter(element) -> bool:
+    if element.tag in REMOVED_TAGS:
+        return True
+    marker = f"{element.get('class') or ''} {element.get('id') or ''}"
+    return bool(marker.strip()) and CLUTTER_PATTERN.search(marker) is not None
+
+
+def _main_block(root):
+    """The best content container, found in one post-order pass over the tree"""
+    text_length: Dict = {}
+    best = {}  # priority -> (text length, element)
+    for _, element in lxml.etree.iterwalk(root, events=('end',)):
+        if not isinstance(element.tag, str) or _is_clutter(element):
+            for child in element:
+                text_length.pop(child, None)
+            text_length[element] = 0
+            continue
+        length = len((element.text or '').strip())
+        for child in element:
+            length += text_length.pop(child, 0) + len((child.tail or '').strip())
+        text_length[element] = length
+        priority = _priority(element)
+        if priority < 5 and length > best.get(priority, (0, None))[0]:
+            best[priority] = (length, element)
+    if not best:
+        return None
+    return best[min(best)][1]
+
+
+def _block_text(element) -> str:
+    """Text of `element` minus clutter, one line per text node (like get_text('\\n', strip=True))"""
+    lines = []
+    skip_depth = 0
+    for event, node in lxml.etree.iterwalk(element, events=('start', 'end')):
+        if not isinstance(node.tag, str):
+            # Comments and processing instructions only carry a tail
+            if event == 'end' and skip_depth == 0 and node.tail and node.tail.strip():
+                lines.append(node.tail.strip())
+            continue
+        if event == 'start':
+            if skip_depth or _is_clutter(node):
+                skip_depth += 1
+            elif node.text and node.text.strip():
+                lines.append(node.text.strip())
+        else:
+            if skip_depth:
+                skip_depth -= 1
+            if skip_depth == 0 and node is not element and node.tail and node.tail.strip():
+                lines.append(node.tail.strip())
+    return '\n'.join(lines)
+
+
+def _title_and_description(root) -> str:
+    title = root.findtext('.//title')
+    title_text = title.strip() if title and title.strip() else "No title found"
+    descriptions = root.xpath('//meta[@name="description"]/@content')
+    desc_text = descriptions[0] if descriptions else "No description found"
+    return f"{title_text}\n\n{desc_text}"
+
+
+def extract_text(content: bytes) -> str:
+    """Extract the main readable text from downloaded HTML bytes"""
+    if not content.strip():
+        return "No title found\n\nNo description found"
+    root = _parse(content)
+    if root is None:
+        return _extract_with_soup(content)
+
+    # Method 1: Use trafilatura (more robust content extraction). It works
+    # on a copy of our tree, so the fallback below sees the original
+    if sum(1 for _ in root.iter()) <= TRAFILATURA_MAX_ELEMENTS:
+        try:
+            extracted = trafilatura.extract(root, include_links=False, include_tables=False)
+            if extracted and len(extracted) > 100:  # Ensure we have meaningful content
+                return extracted
+        except Exception:
+            pass  # Fall back to other methods
+
+    # Method 2: the best-scoring content block, or the whole body
+    main_content = _main_block(root)
+    if main_content is None:
+        main_content = root.body if root.find('body') is not None else root
+    cleaned_text = _block_text(main_content)
+
+    # If we still don't have meaningful content, try a different approach
+    if len(cleaned_text) < 100:
+        cleaned_text = _title_and_description(root)
+    return cleaned_text
+
+
+def _extract_with_soup(content: bytes) -> str:
+    """Fallback for documents lxml can't parse"""
+    soup = BeautifulSoup(content, 'html.parser')
+
+    # Remove obviously unwanted elements
+    for element in soup(list(REMOVED_TAGS)):
+        element.decompose()
+
+    main_content = soup.body if soup.body else soup
+    text = main_content.get_text(separator='\n', strip=True)
+
+    # Remove excessive whitespace and empty lines
+    lines = [line.strip() for line in text.split('\n') if line.strip()]
+    cleaned_text = '\n'.join(lines)
+
+    if len(cleaned_text) < 100:
+        # Try to get at least the title and meta description
+        title = soup.find('title')
+        title_text = title.get_text() if title else "No title found"
+
+        meta_desc = soup.find('meta', attrs={'name': 'description'})
+        desc_text = meta_desc['content'] if meta_desc and 'content' in meta_desc.attrs else "No description found"
+
+        cleaned_text = f"{title_text}\n\n{desc_text}"
+    return cleaned_text
@@ -0,0 +1,445 @@
+"""Search engine behind the `search_chat_history` tool.
+
+Queries are parsed once into an AST (NOT > AND > OR, parentheses, quoted
+phrases, `*` wildcards) and cached. Each conversation thread keeps a trigram
+index over its messages that is extended as new messages are appended, so a
+search only verifies the messages that can possibly match.
+"""
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, List, Optional, Set, Tuple
+
+from .utilityfuncs import message_text
+
+ROLE_MAP = {
+    'human': 'user',
+    'ai': 'assistant',
+    'system': 'system'
+}
+
+# Number of thread indexes kept in memory
+MAX_INDEXED_THREADS = 64
+
+_TOKEN_RE = re.compile(r'"([^"]*)"?|(\()|(\))|(\S+?)(?=[()]|\s|$)')
+
+
+# Query AST
+class Node:
+    def matches(self, text: str) -> bool:
+        raise NotImplementedError
+
+    def candidates(self, index: "HistoryIndex") -> Optional[Set[int]]:
+        """Positions that may match, or None for "any message" """
+        raise NotImplementedError
+
+
+@dataclass(frozen=True)
+class Term(Node):
+    """A literal substring, or a wildcard pattern when it contains `*`"""
+    text: str
+    pattern: Optional[re.Pattern] = None
+
+    def matches(self, text):
+        if self.pattern is not None:
+            return self.pattern.search(text) is not None
+        return self.text in text
+
+    def candidates(self, index):
+        # Every literal piece of a wildcard must appear in a matching message
+        result = None
+        for piece in self.text.split('*'):
+            postings = index.trigram_candidates(piece)
+            if postings is not None:
+                result = postings if result is None else result & postings
+        return result
+
+
+@dataclass(frozen=True)
+class And(Node):
+    children: Tuple[Node, ...]
+
+    def matches(self, text):
+        return all(child.matches(text) for child in self.children)
+
+    def candidates(self, index):
+        result = None
+        for child in self.children:
+            postings = child.candidates(index)
+            if postings is not None:
+                result = postings if result is None else result & postings
+        return result
+
+
+@dataclass(frozen=True)
+class Or(Node):
+    children: Tuple[Node, ...]
+
+    def matches(self, text):
+        return any(child.matches(text) for child in self.children)
+
+    def candidates(self, index):
+        result = set()
+        for child in self.children:
+            postings = child.candidates(index)
+            if postings is None:
+                return None
+            result |= postings
+        return result
+
+
+@dataclass(frozen=True)
+class Not(Node):
+    child: Node
+
+    def matches(self, text):
+        return not self.child.matches(text)
+
+    def candidates(self, index):
+        return None
+
+
+@dataclass(frozen=True)
+class ParsedQuery:
+    expr: Optional[Node]
+    role: Optional[str] = None
+    after: Optional[datetime] = None
+    before: Optional[datetime] = None
+    on_date: Optional[datetime] = None
+    case_sensitive: bool = False
+    limit: Optional[int] = None
+
+
+def _parse_date(value: str) -> Optional[datetime]:
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        return None
+
+
+def _make_term(text: str, case_sensitive: bool) -> Term:
+    if not case_sensitive:
+        text = text.lower()
+    if '*' in text:
+        # Convert wildcard to a precompiled regex pattern
+        pattern = '.*'.join(re.escape(piece) for piece in text.split('*'))
+        return Term(text, re.compile(pattern, re.DOTALL))
+    return Term(text)
+
+
+class _Parser:
+    """Recursive-descent parser: or := and (OR and)*, and := not (AND? not)*, not := NOT not | primary"""
+
+    def __init__(self, tokens, case_sensitive):
+        self.tokens = tokens
+        self.pos = 0
+        self.case_sensitive = case_sensitive
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def parse(self) -> Optional[Node]:
+        nodes = []
+        while self.peek() is not None:
+            node = self.parse_or()
+            if node is not None:
+                nodes.append(node)
+            elif self.peek() is not None:
+                self.pos += 1  # Skip a stray ')' or operator
+        if not nodes:
+            return None
+        return nodes[0] if len(nodes) == 1 else And(tuple(nodes))
+
+    def parse_or(self):
+        children = [self.parse_and()]
+        while self.peek() == ('op', 'or'):
+            self.pos += 1
+            children.append(self.parse_and())
+        children = [child for child in children if child is not None]
+        if not children:
+            return None
+        return children[0] if len(children) == 1 else Or(tuple(children))
+
+    def parse_and(self):
+        children = []
+        while True:
+            token = self.peek()
+            if token == ('op', 'and'):
+                self.pos += 1
+                continue
+            if token is None or token == ('op', 'or') or token[0] == 'rparen':
+                break
+            node = self.parse_not()
+            if node is not None:
+                children.append(node)
+        if not children:
+            return None
+        return children[0] if len(children) == 1 else And(tuple(children))
+
+    def parse_not(self):
+        token = self.peek()
+        if token == ('op', 'not'):
+            self.pos += 1
+            child = self.parse_not()
+            return Not(child) if child is not None else None
+        return self.parse_primary()
+
+    def parse_primary(self):
+        token = self.peek()
+        if token is None:
+            return None  # "foo NOT", "(foo AND": the operator has nothing to apply to
+        self.pos += 1
+        kind, value = token
+        if kind == 'lparen':
+            node = self.parse_or()
+            if self.peek() is not None and self.peek()[0] == 'rparen':
+                self.pos += 1
+            return node
+        if kind in ('term', 'phrase'):
+            return _make_term(value, self.case_sensitive)
+        return None
+
+
+def _parse_filter(word: str, filters: dict) -> bool:
+    """Record `word` in `filters` if it is a filter (user:, after:2024-01-01, limit:3...)"""
+    if word.startswith('user:') or word.startswith('assistant:'):
+        filters['role'] = word.split(':', 1)[0].lower()
+    elif word.startswith(('after:', 'before:', 'on:')):
+        key, value = word.split(':', 1)
+        date = _parse_date(value)
+        if date is not None:
+            filters['on_date' if key == 'on' else key] = date
+    elif word.startswith('case:'):
+        filters['case_sensitive'] = word.split(':', 1)[1].lower() in ('true', 'yes')
+    elif word.startswith('limit:'):
+        try:
+            filters['limit'] = int(word.split(':', 1)[1])
+        except ValueError:
+            pass
+    else:
+        return False
+    return True
+
+
+@lru_cache(maxsize=256)
+def parse_filters(query: str) -> ParsedQuery:
+    """Only the filters in `query`; the rest is free text (similarity search)"""
+    filters = {}
+    for word in query.split():
+        _parse_filter(word, filters)
+    return ParsedQuery(expr=None, **filters)
+
+
+@lru_cache(maxsize=256)
+def parse_query(query: str) -> ParsedQuery:
+    """Parse a search query into filters and a boolean expression tree"""
+    filters = {}
+    tokens = []
+    for match in _TOKEN_RE.finditer(query):
+        phrase, lparen, rparen, word = match.groups()
+        if phrase is not None:
+            if phrase:
+                tokens.append(('phrase', phrase))
+        elif lparen:
+            tokens.append(('lparen', '('))
+        elif rparen:
+            tokens.append(('rparen', ')'))
+        elif word.lower() in ('and', 'or', 'not'):
+            tokens.append(('op', word.lower()))
+        elif not _parse_filter(word, filters):
+            tokens.append(('term', word))
+
+    expr = _Parser(tokens, filters.get('case_sensitive', False)).parse()
+    return ParsedQuery(expr=expr, **filters)
+
+
+# Indexing
+def format_message(msg) -> Optional[dict]:
+    """Convert a LangChain message object or role/content dict to the search format"""
+    if hasattr(msg, 'type') and hasattr(msg, 'content'):
+        # This is a LangChain message object
+        return {
+            'role': ROLE_MAP.get(msg.type, 'unknown'),
+            'content': message_text(msg.content),
+        }
+    if isinstance(msg, dict) and 'role' in msg and 'content' in msg:
+        # This is already in dictionary format
+        return {**msg, 'content': message_text(msg['content'])}
+    return None
+
+
+def _message_key(msg):
+    msg_id = getattr(msg, 'id', None)
+    if msg_id:
+        return msg_id
+    if isinstance(msg, dict):
+        return (msg.get('role'), msg.get('timestamp'), str(msg.get('content')))
+    return (getattr(msg, 'type', None), str(getattr(msg, 'content', msg)))
+
+
+def _trigrams(text: str):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+@dataclass
+class IndexedMessage:
+    role: str
+    content: str
+    lowered: str
+    timestamp: Optional[str] = None
+    time: Optional[datetime] = None
+
+
+@dataclass
+class HistoryIndex:
+    """Trigram index over one thread's messages, extended as messages are appended"""
+    docs: List[IndexedMessage] = field(default_factory=list)
+    keys: list = field(default_factory=list)
+    postings: Dict[str, Set[int]] = field(default_factory=dict)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def sync(self, messages) -> None:
+        """Index messages appended since the last sync; rebuild if history was rewritten"""
+        indexed = len(self.keys)
+        if indexed and (len(messages) < indexed or _message_key(messages[indexed - 1]) != self.keys[-1]):
+            self.docs, self.keys, self.postings = [], [], {}
+            indexed = 0
+        for msg in messages[indexed:]:
+            self.add(msg)
+
+    def add(self, msg) -> None:
+        self.keys.append(_message_key(msg))
+        formatted = format_message(msg)
+        if formatted is None:
+            # Keep positions aligned with the source list; never matches
+            self.docs.append(None)
+            return
+        position = len(self.docs)
+        doc = IndexedMessage(
+            role=formatted['role'],
+            content=formatted['content'],
+            lowered=formatted['content'].lower(),
+            timestamp=formatted.get('timestamp'),
+        )
+        if doc.timestamp:
+            try:
+                doc.time = datetime.fromisoformat(doc.timestamp.replace('Z', '+00:00'))
+            except ValueError:
+                pass
+        self.docs.append(doc)
+        for gram in _trigrams(doc.lowered):
+            self.postings.setdefault(gram, set()).add(position)
+
+    def trigram_candidates(self, literal: str) -> Optional[Set[int]]:
+        grams = _trigrams(literal.lower())
+        if not grams:
+            return None
+        result = None
+        for gram in grams:
+            postings = self.postings.get(gram, set())
+            result = set(postings) if result is None else result & postings
+            if not result:
+                break
+        return result
+
+    def search(self, query: ParsedQuery) -> List[int]:
+        """Return positions of matching messages, oldest first"""
+        if query.expr is not None:
+            candidates = query.expr.candidates(self)
+        else:
+            candidates = None
+        positions = sorted(candidates) if candidates is not None else range(len(self.docs))
+
+        matches = []
+        for position in positions:
+            doc = self.docs[position]
+            if doc is None:
+                continue
+            # Check role filter
+            if query.role and doc.role != query.role:
+                continue
+            # Check date filters
+            if doc.time is not None:
+                try:
+                    if query.after and doc.time < query.after:
+                        continue
+                    if query.before and doc.time > query.before:
+                        continue
+                    if query.on_date and doc.time.date() != query.on_date.date():
+                        continue
+                except TypeError:
+                    pass  # Naive vs aware datetimes; ignore the filter like before
+            # Check content against the expression
+            if query.expr is not None:
+                text = doc.content if query.case_sensitive else doc.lowered
+                if not query.expr.matches(text):
+                    continue
+            matches.append(position)
+            if query.limit and len(matches) >= query.limit:
+                break
+        return matches
+
+    def neighbours(self, position: int):
+        """Return the nearest indexed messages before and after `position`"""
+        prev_doc = next_doc = None
+        i = position - 1
+        while i >= 0 and prev_doc is None:
+            prev_doc = self.docs[i]
+            i -= 1
+        i = position + 1
+        while i < len(self.docs) and next_doc is None:
+            next_doc = self.docs[i]
+            i += 1
+        return prev_doc, next_doc
+
+
+_indexes: "OrderedDict[str, HistoryIndex]" = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def get_index(thread_id: Optional[str]) -> HistoryIndex:
+    """Return the index for a conversation thread (a fresh one if the thread is unknown)"""
+    if thread_id is None:
+        return HistoryIndex()
+    with _indexes_lock:
+        index = _indexes.get(thread_id)
+        if index is None:
+            index = _indexes[thread_id] = HistoryIndex()
+        _indexes.move_to_end(thread_id)
+        while len(_indexes) > MAX_INDEXED_THREADS:
+            _indexes.popitem(last=False)
+        return index
+
+
+def search_history(query: str, messages, thread_id: Optional[str] = None) -> str:
+    """Run a search over `messages` and format the matches with surrounding context"""
+    parsed = parse_query(query)
+    index = get_index(thread_id)
+    with index.lock:
+        index.sync(messages)
+        positions = index.search(parsed)
+
+        if not positions:
+            return f"No messages found matching your query: '{query}'"
+
+        # Format the results with context
+        parts = [f"Found {len(positions)} messages matching your query:\n\n"]
+        for i, position in enumerate(positions, 1):
+            doc = index.docs[position]
+            # Add timestamp if available
+            timestamp = f" [{doc.timestamp}]" if doc.timestamp else ""
+            parts.append(f"{i}. [{doc.role.upper()}]{timestamp}: {doc.content}\n\n")
+
+            # Add context (previous and next messages)
+            prev_doc, next_doc = index.neighbours(position)
+            if prev_doc is not None:
+                parts.append(f"   Context (previous): [{prev_doc.role.upper()}]: {prev_doc.content[:100]}...\n")
+            if next_doc is not None:
+                parts.append(f"   Context (next): [{next_doc.role.upper()}]: {next_doc.content[:100]}...\n")
+            if prev_doc is not None or next_doc is not None:
+                parts.append("\n")
+
+        return "".join(parts)
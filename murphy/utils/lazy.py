@@ -0,0 +1,76 @@
+"""Deferred construction of the slow parts of the bot.
+
+Importing the LLM stack (LangChain, LangGraph, the DeepSeek/OpenAI clients,
+the scraping libraries) and building the agent takes seconds. A
+`LazyResource` wraps such a build so the bot can connect to Discord first and
+build it on first use or from a background warm-up task, off the event loop.
+"""
+import asyncio
+import os
+import threading
+import time
+from typing import Callable, Generic, Optional, TypeVar
+
+from .telemetry import telemetry
+
+T = TypeVar("T")
+
+# When the agent is built: "background" (right after connecting), "lazy"
+# (on the first message) or "eager" (before connecting, the old behaviour)
+WARMUP_MODES = ("background", "lazy", "eager")
+
+
+def warmup_mode() -> str:
+    mode = os.getenv("MURPHY_WARMUP", "background").lower()
+    return mode if mode in WARMUP_MODES else "background"
+
+
+class LazyResource(Generic[T]):
+    """A value built once, on first `get()`/`aget()` or by `warm_up()`"""
+
+    def __init__(self, name: str, factory: Callable[[], T]):
+        self.name = name
+        self._factory = factory
+        self._value: Optional[T] = None
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.load_seconds: Optional[float] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def get(self) -> T:
+        """The value, building it in this thread if needed (blocks)"""
+        if self._loaded:
+            return self._value
+        with self._lock:
+            if not self._loaded:
+                started = time.perf_counter()
+                with telemetry.span("warmup", resource=self.name):
+                    self._value = self._factory()
+                self.load_seconds = time.perf_counter() - started
+                self._loaded = True
+        return self._value
+
+    async def aget(self) -> T:
+        """The value, built in a worker thread so the event loop keeps running"""
+        if self._loaded:
+            return self._value
+        return await asyncio.to_thread(self.get)
+
+    def warm_up(self) -> asyncio.Task:
+        """Start building in the background (once); failures are retried on next use"""
+        if self._task is None or (self._task.done() and not self._loaded):
+            self._task = asyncio.get_running_loop().create_task(self.aget())
+            self._task.add_done_callback(self._report)
+        return self._task
+
+    def _report(self, task: asyncio.Task) -> None:
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            print(f"Error warming up {self.name}: {task.exception()}")
+        else:
+            print(f"{self.name} ready in {self.load_seconds:.2f}s")
@@ -0,0 +1,62 @@
+"""Cache of message metadata for thread-starter and reply lookups.
+
+Every gateway message is remembered by ID (its content and whether it
+mentions the bot). A thread started from a message shares that message's ID,
+so "was the bot mentioned in the starter" is usually answered without a REST
+call, as is the content of a replied-to message. Misses fall back to
+`fetch_message` and are cached too; entries are bounded and expire.
+"""
+from dataclasses import dataclass
+from typing import Optional
+
+import discord
+
+from .cache import TTLCache
+
+
+@dataclass
+class MessageInfo:
+    content: Optional[str]  # None when the message couldn't be fetched
+    mentions_bot: bool
+
+
+class MessageMetadataCache:
+    """Message ID -> `MessageInfo`, bounded and expiring"""
+
+    def __init__(self, max_entries: int = 4096, ttl: float = 60 * 60):
+        self._messages = TTLCache(maxsize=max_entries, ttl=ttl)
+
+    def remember(self, message, bot_user) -> MessageInfo:
+        """Record a message seen on the gateway (or fetched)"""
+        info = MessageInfo(content=message.content, mentions_bot=bot_user.mentioned_in(message))
+        self._messages.set(message.id, info)
+        return info
+
+    async def _lookup(self, channel, message_id: int, bot_user) -> MessageInfo:
+        info = self._messages.get(message_id)
+        if info is not None:
+            return info
+        try:
+            return self.remember(await channel.fetch_message(message_id), bot_user)
+        except (discord.NotFound, discord.Forbidden):
+            # Deleted or inaccessible: remember that too
+            info = MessageInfo(content=None, mentions_bot=False)
+            self._messages.set(message_id, info)
+            return info
+
+    async def thread_starter(self, thread, bot_user) -> MessageInfo:
+        """Metadata for the message a thread was started from (same ID as the thread)"""
+        starter = getattr(thread, "starter_message", None)  # discord.py's own message cache
+        if starter is not None:
+            return self.remember(starter, bot_user)
+        return await self._lookup(thread, thread.id, bot_user)
+
+    async def referenced(self, message, bot_user) -> MessageInfo:
+        """Metadata for the message `message` replies to"""
+        resolved = message.reference.resolved  # Filled from the gateway payload when available
+        if isinstance(resolved, discord.Message):
+            return self.remember(resolved, bot_user)
+        return await self._lookup(message.channel, message.reference.message_id, bot_user)
+
+    def stats(self) -> dict:
+        return self._messages.stats()
@@ -0,0 +1,96 @@
+"""What the agent is told about a Discord message, split in two halves.
+
+The gateway gathers everything that needs Discord (channel history, the
+replied-to message, the thread starter, attachment links) into a
+`MessageContext`; whoever runs the agent, in the same process or in a worker
+process, renders it into the prompt. That is also where attachments are
+downloaded and indexed, so the `search_attachments` tool finds them. A
+`MessageContext` holds only plain data and can be pickled to a worker.
+"""
+from dataclasses import dataclass, field
+from typing import Any, List, Optional, Tuple
+
+from .prefetch import SCAN_CHARS, current_prefetcher
+
+
+@dataclass
+class AttachmentRef:
+    """The parts of a `discord.Attachment` needed to read it from the CDN"""
+    filename: str
+    url: str
+    size: int = 0
+    content_type: Optional[str] = None
+
+    @classmethod
+    def from_attachment(cls, attachment) -> "AttachmentRef":
+        return cls(attachment.filename, attachment.url, attachment.size, attachment.content_type)
+
+
+@dataclass
+class MessageContext:
+    channel_id: int
+    content: str
+    # (speaker, text) of recent channel messages, oldest first; only gathered
+    # for a thread the agent has no conversation state for
+    history: List[Tuple[str, str]] = field(default_factory=list)
+    reply_to: Optional[str] = None
+    thread_context: Optional[str] = None
+    attachments: List[Any] = field(default_factory=list)  # discord.Attachment or AttachmentRef
+
+    def portable(self) -> "MessageContext":
+        """A copy that can be sent to another process"""
+        return MessageContext(
+            channel_id=self.channel_id,
+            content=self.content,
+            history=list(self.history),
+            reply_to=self.reply_to,
+            thread_context=self.thread_context,
+            attachments=[a if isinstance(a, AttachmentRef) else AttachmentRef.from_attachment(a)
+                         for a in self.attachments],
+        )
+
+
+async def render_context(context: MessageContext, include_history: bool = True) -> str:
+    """The prompt text for one message: history, attachments, reply and thread context"""
+    # Start with the user's message. Links in it (and in the replied-to
+    # message and attached files) start loading now, for read_webpage
+    content = context.content
+    prefetcher = current_prefetcher()
+    if prefetcher is not None:
+        prefetcher.scan(context.content)
+        prefetcher.scan(context.reply_to)
+
+    if include_history and context.history:
+        # Include both user and AI messages in the context
+        lines = ["Previous conversation:\n"]
+        for speaker, text in context.history:
+            lines.append(f"\n{speaker}: {text}\n")
+        history_content = "".join(lines)
+
+        # Add history before the current message
+        content = f"{history_content}\n\nCurrent message: {content}"
+
+    # Text attachments (add after the current message). They are indexed per
+    # channel; big files contribute only the chunks relevant to the message,
+    # and the agent can search them for more. Imported here: the download
+    # stack is loaded with the agent, not at startup
+    if context.attachments:
+        from .attachments import attachment_context, ingest_attachments
+        files, errors = await ingest_attachments(context.channel_id, context.attachments)
+        if prefetcher is not None:
+            for file in files:
+                prefetcher.scan(file.head(SCAN_CHARS))
+        if files:
+            content = f"{content}\n\n{attachment_context(context.channel_id, context.content, files)}"
+        if errors:
+            content = f"{content}\n\n" + "\n".join(errors)
+
+    if context.reply_to is not None:
+        # Add the referenced message content to the context
+        content = f"Replying to: {context.reply_to[:175]}\n\nUser Message: {content}"
+
+    if context.thread_context is not None:
+        # Add thread starter context
+        content = f"Thread context: {context.thread_context}\n\n{content}"
+
+    return content
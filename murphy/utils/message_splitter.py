@@ -0,0 +1,139 @@
+"""Discord-sized message splitting that keeps markdown intact.
+
+Chunks are cut at the last paragraph break in the window, else the last line
+break, sentence end or space. Only when a window has none of those is a hard
+cut made. A fenced code block that spans chunks is closed at the end of one
+chunk and reopened, with its language, at the start of the next, so Discord
+keeps rendering it as code. Info strings longer than `MAX_FENCE_INFO` are
+left off the reopening fence.
+
+`MessageSplitter` is incremental: text can be fed as it streams in, and each
+chunk is handed out as soon as it's final. Every window is scanned once, and
+consumed text is referenced by offset rather than re-sliced.
+"""
+import re
+from typing import Iterator, List, Optional, Tuple
+
+DISCORD_MAX_LENGTH = 2000
+FENCE_CLOSE = "\n```"
+MAX_FENCE_INFO = 32  # longest info string repeated on a reopened fence
+
+# A fence line: ``` with an optional info string (the language)
+FENCE_PATTERN = re.compile(r"^[ \t]{0,3}```([^`\n]*)$", re.MULTILINE)
+
+# Separators in order of preference: (separator, chars kept before the cut, allowed in code)
+BOUNDARIES = (
+    ("\n\n", 0, True),
+    ("\n", 0, True),
+    (". ", 1, False),
+    ("! ", 1, False),
+    ("? ", 1, False),
+    (" ", 0, False),
+)
+
+
+class MessageSplitter:
+    """Splits text into chunks of at most `max_length` characters"""
+
+    def __init__(self, max_length: int = DISCORD_MAX_LENGTH):
+        self.max_length = max_length
+        self._buffer = ""
+        self._pos = 0  # start of the text not yet handed out
+        # Info string of the code block open at `_pos`, None outside code
+        self._fence: Optional[str] = None
+
+    def _prefix(self) -> str:
+        if self._fence is None:
+            return ""
+        # A long info string copied into every chunk would leave no room for text
+        return f"```{self._fence}\n" if len(self._fence) <= MAX_FENCE_INFO else "```\n"
+
+    def _budget(self) -> int:
+        """Characters of text the next chunk can hold, leaving room for fences"""
+        # At least one, so every cut makes progress even with a tiny max_length
+        return max(1, self.max_length - len(self._prefix()) - len(FENCE_CLOSE))
+
+    def feed(self, text: str) -> List[str]:
+        """Add text; returns the chunks that are now final"""
+        if self._pos:
+            # Drop consumed text once per feed rather than once per cut
+            self._buffer = self._buffer[self._pos:]
+            self._pos = 0
+        self._buffer += text
+        chunks = []
+        while len(self._buffer) - self._pos > self._budget():
+            chunk = self._cut()
+            if chunk.strip():
+                chunks.append(chunk)
+        return chunks
+
+    def pending(self, close_fence: bool = True) -> str:
+        """The unfinished last chunk, e.g. to show while streaming"""
+        text = self._prefix() + self._buffer[self._pos:]
+        if close_fence and self._fence_after(self._fences(self._pos, len(self._buffer)), len(self._buffer)) is not None:
+            text = text.rstrip("\n") + FENCE_CLOSE
+        return text
+
+    def flush(self) -> List[str]:
+        """Hand out whatever is left and reset"""
+        chunk = self.pending(close_fence=False)
+        rest = self._buffer[self._pos:]
+        self._buffer, self._pos, self._fence = "", 0, None
+        return [chunk] if rest.strip() else []
+
+    def _fences(self, start: int, end: int) -> List[Tuple[int, int, str]]:
+        return [(m.start(), m.end(), m.group(1).strip())
+                for m in FENCE_PATTERN.finditer(self._buffer, start, end)]
+
+    def _fence_after(self, fences, position: int) -> Optional[str]:
+        """Code block open just after `position`, given the fence lines in the window"""
+        fence = self._fence
+        for line_start, _, info in fences:
+            if line_start >= position:
+                break
+            fence = info if fence is None else None
+        return fence
+
+    def _find_cut(self, fences, start: int, end: int) -> Tuple[int, int]:
+        """(end of this chunk, start of the next) for the window [start, end)"""
+        buffer = self._buffer
+        for lowest in (start + (end - start) // 2, start + 1):
+            for separator, keep, in_code in BOUNDARIES:
+                index = buffer.rfind(separator, lowest, end)
+                if index == -1:
+                    continue
+                cut = index + keep
+                if not in_code and self._fence_after(fences, cut) is not None:
+                    continue
+                return cut, index + len(separator)
+        return end, end
+
+    def _cut(self) -> str:
+        start = self._pos
+        end = start + self._budget()
+        fences = self._fences(start, end)
+        cut, next_start = self._find_cut(fences, start, end)
+        fence = self._fence_after(fences, cut)
+
+        # Don't end a chunk with a freshly opened, still empty code block
+        opened = [f for f in fences if f[0] < cut]
+        if fence is not None and opened and opened[-1][0] > start and not self._buffer[opened[-1][1]:cut].strip():
+            cut = next_start = opened[-1][0]
+            fence = self._fence_after(fences, cut)
+
+        if next_start <= start:
+            cut = next_start = end  # always consume something
+
+        chunk = self._prefix() + self._buffer[start:cut]
+        if fence is not None:
+            chunk = chunk.rstrip("\n") + FENCE_CLOSE
+        self._fence = fence
+        self._pos = next_start
+        return chunk
+
+
+def iter_message_chunks(text: str, max_length: int = DISCORD_MAX_LENGTH) -> Iterator[str]:
+    """Chunks of `text` for Discord, in order"""
+    splitter = MessageSplitter(max_length)
+    yield from splitter.feed(text)
+    yield from splitter.flush()
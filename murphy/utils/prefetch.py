@@ -0,0 +1,123 @@
+"""Speculative page reads for the links in a message, started before the model runs.
+
+The reasoner usually spends its first step (10-30 s) deciding to call
+`read_webpage` on a link the user just posted. A `Prefetcher` is opened
+around each agent run (`prefetch_scope`). While the prompt is assembled it
+starts reading the first few URLs found in the message, the message it
+replies to and attached text files, in background tasks on the run's event
+loop. `read_webpage`/`read_webpages` take those results instead of fetching
+again. Reads still in flight when the run ends are cancelled.
+
+The prefetcher is found through a context variable, like the current
+telemetry span, so the agent's tool calls see the one for their run.
+"""
+import asyncio
+import contextvars
+import importlib
+import os
+import re
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Set
+from urllib.parse import urlparse
+
+from .telemetry import telemetry
+
+MAX_PREFETCH_URLS = 4  # per run
+SCAN_CHARS = 8000  # of each attached file
+
+URL_PATTERN = re.compile(r"https?://[^\s<>\"'`|()\[\]{}]+", re.IGNORECASE)
+TRAILING_PUNCTUATION = ".,;:!?*_~"
+# Message links and attachment CDN URLs aren't pages the tools can read
+SKIP_HOSTS = ("discord.com", "discordapp.com", "discordapp.net")
+
+_current: contextvars.ContextVar[Optional["Prefetcher"]] = contextvars.ContextVar("prefetcher", default=None)
+
+
+def find_urls(text: Optional[str]) -> List[str]:
+    """Web page URLs in `text`, in order of appearance"""
+    urls = []
+    for match in URL_PATTERN.finditer(text or ""):
+        url = match.group(0).rstrip(TRAILING_PUNCTUATION)
+        host = (urlparse(url).hostname or "").lower()
+        if not host or any(host == skip or host.endswith("." + skip) for skip in SKIP_HOSTS):
+            continue
+        urls.append(url)
+    return urls
+
+
+def _key(url: str) -> str:
+    return url.split("#", 1)[0].rstrip("/")
+
+
+class Prefetcher:
+    """Background `read_webpage` results for one agent run, keyed by URL"""
+
+    def __init__(self, max_urls: int = MAX_PREFETCH_URLS):
+        self.max_urls = max_urls
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._taken: Set[str] = set()
+
+    def scan(self, text: Optional[str]) -> None:
+        """Start reading the URLs in `text`, up to the per-run limit"""
+        for url in find_urls(text):
+            key = _key(url)
+            if key in self._tasks:
+                continue
+            if len(self._tasks) >= self.max_urls:
+                return
+            self._tasks[key] = asyncio.get_running_loop().create_task(self._read(url))
+
+    async def _read(self, url: str) -> str:
+        with telemetry.span("prefetch", url=url):
+            try:
+                # agent_tools loads LangChain; don't import it on the event loop
+                agent_tools = await asyncio.to_thread(importlib.import_module, "murphy.utils.agent_tools")
+                return await agent_tools._afetch_webpage(url)
+            except Exception as e:
+                return f"Error prefetching the webpage: {str(e)}"
+
+    async def take(self, url: str) -> Optional[str]:
+        """The prefetched tool output for `url`, waiting if it's still in flight.
+        None when it wasn't prefetched or the download failed (the caller fetches it itself)"""
+        key = _key(url)
+        task = self._tasks.get(key)
+        if task is None or task.cancelled():
+            return None
+        self._taken.add(key)
+        # Shielded: a tool call cancelled by its deadline leaves the read running
+        result = await asyncio.shield(task)
+        if result.startswith(("Error fetching", "Error prefetching")):
+            return None  # maybe transient: worth another try
+        telemetry.cache_result("prefetch", "hit")
+        return result
+
+    def close(self) -> None:
+        """The run is over: cancel reads still in flight"""
+        for key, task in self._tasks.items():
+            if key not in self._taken:
+                telemetry.cache_result("prefetch", "unused")
+            task.cancel()
+
+
+def current_prefetcher() -> Optional[Prefetcher]:
+    return _current.get()
+
+
+def prefetch_enabled() -> bool:
+    """`MURPHY_PREFETCH`, read per run so a .env loaded after this module counts"""
+    return os.getenv('MURPHY_PREFETCH', 'true').lower() in ('1', 'true', 'yes')
+
+
+@contextmanager
+def prefetch_scope() -> Iterator[Optional[Prefetcher]]:
+    """A prefetcher for the enclosed agent run (None when disabled)"""
+    if not prefetch_enabled():
+        yield None
+        return
+    prefetcher = Prefetcher()
+    token = _current.set(prefetcher)
+    try:
+        yield prefetcher
+    finally:
+        _current.reset(token)
+        prefetcher.close()
@@ -0,0 +1,146 @@
+"""Pick how much model a request needs before running the agent.
+
+Three routes, chosen by cheap heuristics on the user's own words:
+
+- `direct`: a bare clock or plain arithmetic question ("what time is it",
+  "calculate 2^32"). Answered from the tool itself, without a model call.
+- `fast`: short, simple requests. The agent runs on the non-reasoning chat
+  model, with the same tools and conversation state.
+- `reasoner`: everything else, including anything long, with attachments
+  or code, or that asks for analysis. The original agent.
+
+Routing errs towards the reasoner: only a request that looks simple on
+every count is downgraded. Each run is counted per route, and runs that
+skip the reasoner are credited with the reasoner's recent average latency
+minus their own (`murphy_route_saved_seconds_total`).
+"""
+import os
+import re
+import threading
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from .calculator import evaluate
+from .message_context import MessageContext
+from .telemetry import telemetry
+
+ROUTES = ("direct", "fast", "reasoner")
+
+# Limits for the fast route (the user's own text, mentions removed)
+FAST_MAX_CHARS = 240
+FAST_MAX_WORDS = 40
+FAST_MAX_URLS = 1
+
+MENTION_PATTERN = re.compile(r"<@[!&]?\d+>")
+URL_PATTERN = re.compile(r"https?://\S+", re.IGNORECASE)
+CLOCK_PATTERN = re.compile(
+    r"^(?:(?:hey|hi|yo)\s+)?(?:what(?:'s| is)\s+)?(?:the\s+)?(?:current\s+)?(?:time|date|day)"
+    r"(?:\s+is\s+it)?(?:\s+(?:now|today|right now))?\s*\??$"
+    r"|^what\s+(?:time|day|date)\s+is\s+it(?:\s+(?:now|today))?\s*\??$",
+    re.IGNORECASE,
+)
+CALC_PATTERN = re.compile(
+    r"^(?:calculate|calc|compute|evaluate|eval|what(?:'s| is))\s+(?P<expression>[-+*/^%().,\s\w]+?)\s*[?=]?$",
+    re.IGNORECASE,
+)
+# What the direct route evaluates itself (on the event loop): numbers and
+# operators only. Function calls like round(1, -10**9) can run for long in
+# one step, so those go to a model, which calls the tool in a thread
+PLAIN_ARITHMETIC = re.compile(r"^[\d\s.,+\-*/^%()]+$")
+# At least one operator between operands: "what is 404" is a question, not a sum
+BINARY_OPERATOR = re.compile(r"[\d).]\s*[-+*/^%]")
+# Signs that the request needs reasoning, whatever its length
+HARD_PATTERN = re.compile(
+    r"\b(?:why|how\s+(?:do|does|can|could|would|should)|explain|analy[sz]e|compare|review|debug|plan|design|"
+    r"step[\s-]by[\s-]step|think|reason|prove|exploit|payload|privesc|escalat\w*|bypass|enumerat\w*|pivot|"
+    r"reverse|decompile|deobfuscat\w*|vuln\w*|cve-\d+|write|script|code|fix|refactor)\b",
+    re.IGNORECASE,
+)
+
+
+def user_text(context: MessageContext) -> str:
+    return MENTION_PATTERN.sub(" ", context.content or "").strip()
+
+
+def _direct_answer(text: str) -> Optional[str]:
+    """The answer to a bare clock or arithmetic question, if that's all this is"""
+    if CLOCK_PATTERN.match(text):
+        # Same format as the clock tool
+        return f"It's {datetime.now().strftime('%Y-%m-%d %I:%M %p')}."
+    match = CALC_PATTERN.match(text)
+    if match:
+        expression = match.group("expression").strip()
+        if not re.search(r"\d", expression):
+            return None  # "what is kerberos"
+        if not PLAIN_ARITHMETIC.match(expression) or not BINARY_OPERATOR.search(expression):
+            return None
+        try:
+            result = evaluate(expression)
+        except Exception:
+            return None  # not plain arithmetic after all: let a model read it
+        return f"{expression} = {result}"
+    return None
+
+
+def routing_mode() -> str:
+    """`MURPHY_ROUTING`: "auto" routes as below; "reasoner" sends everything to the reasoner.
+
+    Read per call rather than at import, so a .env loaded after this module counts.
+    """
+    return os.getenv('MURPHY_ROUTING', 'auto').lower()
+
+
+def choose_route(contexts: List[MessageContext]) -> Tuple[str, Optional[str]]:
+    """(route, direct answer or None) for one run's gathered messages"""
+    if routing_mode() != "auto":
+        return "reasoner", None
+    texts = [user_text(context) for context in contexts]
+    text = "\n".join(texts)
+    if any(context.attachments or context.thread_context for context in contexts):
+        return "reasoner", None
+    if len(contexts) == 1 and not contexts[0].reply_to and len(text) <= FAST_MAX_CHARS:
+        answer = _direct_answer(text)
+        if answer is not None:
+            return "direct", answer
+    if (len(text) > FAST_MAX_CHARS or len(text.split()) > FAST_MAX_WORDS
+            or len(URL_PATTERN.findall(text)) > FAST_MAX_URLS
+            or "```" in text or HARD_PATTERN.search(text)):
+        return "reasoner", None
+    return "fast", None
+
+
+class RouteStats:
+    """Routing counts and estimated savings, against the reasoner's recent latency"""
+
+    def __init__(self, smoothing: float = 0.2):
+        self.smoothing = smoothing
+        self.reasoner_seconds: Optional[float] = None  # moving average
+        self.counts = {route: 0 for route in ROUTES}
+        self.saved_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, route: str, seconds: float) -> None:
+        with self._lock:
+            self.counts[route] += 1
+            saved = 0.0
+            if route == "reasoner":
+                if self.reasoner_seconds is None:
+                    self.reasoner_seconds = seconds
+                else:
+                    self.reasoner_seconds += self.smoothing * (seconds - self.reasoner_seconds)
+            elif self.reasoner_seconds is not None:
+                # Nothing to compare with until the reasoner has run once
+                saved = max(0.0, self.reasoner_seconds - seconds)
+                self.saved_seconds += saved
+        telemetry.record_route(route, seconds, saved)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self.counts,
+                "reasoner_seconds": self.reasoner_seconds,
+                "saved_seconds": round(self.saved_seconds, 3),
+            }
+
+
+route_stats = RouteStats()
@@ -0,0 +1,124 @@
+"""Per-channel work scheduler for agent runs.
+
+- One run at a time per channel, so runs never race on a thread's checkpoint.
+- Messages that arrive while a channel's run is in flight are coalesced and
+  handled together by its next run.
+- Channels with work wait in per-group (guild or DMs) queues that are served
+  by smooth weighted round-robin, so one busy guild can't starve the rest.
+- A global concurrency limit caps simultaneous runs, and `submit` refuses new
+  work once too many messages are waiting (backpressure).
+"""
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+
+def parse_group_weights(spec: str) -> Dict[Any, int]:
+    """Scheduler weights from "guild_id:weight,..." ("dm" for direct messages); unlisted groups get 1"""
+    weights = {}
+    for item in spec.split(','):
+        if not item.strip():
+            continue
+        group, _, weight = item.partition(':')
+        group = group.strip()
+        try:
+            weights["dm" if group.lower() == "dm" else int(group)] = max(1, int(weight))
+        except ValueError:
+            print(f"Ignoring invalid MURPHY_GUILD_WEIGHTS entry: {item.strip()!r}")
+    return weights
+
+
+class AgentScheduler:
+    def __init__(
+        self,
+        runner: Callable[[List[Any]], Awaitable[None]],
+        max_concurrency: int = 4,
+        max_pending: int = 32,
+        weights: Optional[Dict[Hashable, int]] = None,
+    ):
+        # `runner` receives every message coalesced for one channel run
+        self.runner = runner
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        self.weights = weights or {}
+        self._pending: Dict[Hashable, List[Any]] = {}  # channel -> waiting messages
+        self._groups: Dict[Hashable, Hashable] = {}  # channel -> group
+        self._ready: Dict[Hashable, deque] = {}  # group -> channels with work, not running
+        self._current_weight: Dict[Hashable, int] = {}
+        self._running: Dict[Hashable, asyncio.Task] = {}
+        self.completed = 0
+        self.coalesced = 0
+        self.rejected = 0
+
+    @property
+    def pending_count(self) -> int:
+        return sum(len(items) for items in self._pending.values())
+
+    def submit(self, channel: Hashable, group: Hashable, item: Any) -> bool:
+        """Queue `item` for `channel`. Returns False when the scheduler is saturated"""
+        if self.pending_count >= self.max_pending:
+            self.rejected += 1
+            return False
+        items = self._pending.setdefault(channel, [])
+        if items:
+            self.coalesced += 1
+        items.append(item)
+        self._groups[channel] = group
+        if channel not in self._running and len(items) == 1:
+            self._ready.setdefault(group, deque()).append(channel)
+        self._dispatch()
+        return True
+
+    def _pick_group(self) -> Optional[Hashable]:
+        """Smooth weighted round-robin over groups that have ready channels"""
+        best = None
+        total = 0
+        for group, channels in self._ready.items():
+            if not channels:
+                continue
+            weight = self.weights.get(group, 1)
+            self._current_weight[group] = self._current_weight.get(group, 0) + weight
+            total += weight
+            if best is None or self._current_weight[group] > self._current_weight[best]:
+                best = group
+        if best is not None:
+            self._current_weight[best] -= total
+        return best
+
+    def _dispatch(self) -> None:
+        while len(self._running) < self.max_concurrency:
+            group = self._pick_group()
+            if group is None:
+                return
+            channel = self._ready[group].popleft()
+            if not self._ready[group]:
+                # Idle groups don't bank credit
+                del self._ready[group]
+                self._current_weight.pop(group, None)
+            items = self._pending.pop(channel)
+            task = asyncio.create_task(self._run(channel, items))
+            self._running[channel] = task
+
+    async def _run(self, channel: Hashable, items: List[Any]) -> None:
+        try:
+            await self.runner(items)
+        except Exception as e:
+            print(f"Error in scheduled agent run: {e}")
+        finally:
+            del self._running[channel]
+            self.completed += 1
+            if self._pending.get(channel):
+                # Messages arrived meanwhile: queue the channel's next run
+                self._ready.setdefault(self._groups[channel], deque()).append(channel)
+            else:
+                self._groups.pop(channel, None)
+            self._dispatch()
+
+    def stats(self) -> dict:
+        return {
+            "running": len(self._running),
+            "pending": self.pending_count,
+            "completed": self.completed,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+        }
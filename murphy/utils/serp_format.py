@@ -0,0 +1,138 @@
+"""Compact rendering of SerpAPI results for tool outputs.
+
+SerpAPI's AI-overview responses are nested JSON: `text_blocks` (paragraphs,
+headings, lists, tables, code, expandable sections) with `reference_indexes`
+into a `references` list. Tool outputs are re-sent to the model on every later
+step, so they are rendered as terse markdown-ish text:
+
+- repeated snippets are dropped,
+- citations become short markers like `[1,2]`, renumbered so only cited
+  sources are listed, once, at the end,
+- output stops at a per-tool token budget.
+"""
+import re
+from typing import Dict, List, Optional
+
+# Rough characters per token for budgeting (matches count_tokens_approximately)
+CHARS_PER_TOKEN = 4
+MAX_REFERENCES = 8
+TRUNCATION_NOTE = "[... truncated]"
+
+
+class _Renderer:
+    def __init__(self, references: Optional[List[dict]], max_chars: int):
+        self.references = {ref.get("index", i): ref for i, ref in enumerate(references or [])}
+        self.cited: Dict[int, int] = {}  # SerpAPI reference index -> our number
+        self.max_chars = max_chars
+        self.lines: List[str] = []
+        self.size = 0
+        self.truncated = False
+        self._seen = set()
+
+    def cite(self, block: dict) -> str:
+        if not self.references:
+            return ""
+        numbers = []
+        for index in block.get("reference_indexes") or []:
+            if index not in self.references:
+                continue
+            if index not in self.cited:
+                if len(self.cited) >= MAX_REFERENCES:
+                    continue
+                self.cited[index] = len(self.cited) + 1
+            numbers.append(self.cited[index])
+        return f" [{','.join(map(str, sorted(set(numbers))))}]" if numbers else ""
+
+    def add(self, line: str, dedupe_key: Optional[str] = None) -> bool:
+        """Append a line; False once the budget is spent"""
+        if self.truncated:
+            return False
+        if dedupe_key is not None:
+            key = re.sub(r"\W+", " ", dedupe_key).strip().lower()
+            if key in self._seen:
+                return True
+            self._seen.add(key)
+        if self.size + len(line) + 1 > self.max_chars:
+            self.truncated = True
+            return False
+        self.lines.append(line)
+        self.size += len(line) + 1
+        return True
+
+    def blocks(self, blocks: List[dict], depth: int = 0) -> None:
+        for block in blocks or []:
+            if self.truncated:
+                return
+            self.block(block, depth)
+
+    def block(self, block: dict, depth: int) -> None:
+        kind = block.get("type")
+        snippet = (block.get("snippet") or "").strip()
+        indent = "  " * depth
+
+        if kind == "heading":
+            if snippet:
+                self.add(f"## {snippet}", snippet)
+        elif kind == "list":
+            for item in block.get("list") or []:
+                self.list_item(item, depth)
+        elif kind == "table":
+            self.table(block)
+        elif kind == "code_block":
+            code = (block.get("code") or "").rstrip()
+            if code:
+                self.add(f"```{block.get('language') or ''}\n{code}\n```", code)
+        elif snippet:
+            # Paragraphs and any block type we don't know yet
+            self.add(f"{indent}{snippet}{self.cite(block)}", snippet)
+        # Expandable sections and other containers nest their own blocks
+        self.blocks(block.get("text_blocks"), depth)
+
+    def list_item(self, item: dict, depth: int) -> None:
+        title = (item.get("title") or "").strip()
+        snippet = (item.get("snippet") or "").strip()
+        text = f"{title}: {snippet}" if title and snippet and not snippet.startswith(title) else (snippet or title)
+        if text:
+            self.add(f"{'  ' * depth}- {text}{self.cite(item)}", text)
+        for nested in item.get("list") or []:
+            self.list_item(nested, depth + 1)
+        self.blocks(item.get("text_blocks"), depth + 1)
+
+    def table(self, block: dict) -> None:
+        table = block.get("table") or []
+        if isinstance(table, dict):
+            rows = [table.get("headers") or []] + (table.get("rows") or [])
+        else:
+            rows = table
+        for row in rows:
+            if isinstance(row, dict):
+                row = list(row.values())
+            cells = [" ".join(str(cell).split()) for cell in row]
+            if any(cells) and not self.add(" | ".join(cells)):
+                return
+
+    def sources(self) -> List[str]:
+        lines = []
+        for index, number in sorted(self.cited.items(), key=lambda item: item[1]):
+            ref = self.references[index]
+            title = (ref.get("title") or ref.get("source") or "").strip()
+            link = ref.get("link") or ""
+            lines.append(f"[{number}] {title} - {link}" if title else f"[{number}] {link}")
+        return lines
+
+
+def render_text_blocks(
+    text_blocks: List[dict],
+    references: Optional[List[dict]] = None,
+    max_tokens: int = 1500,
+) -> str:
+    """Render SerpAPI text blocks within `max_tokens`; pass `references` to cite sources"""
+    renderer = _Renderer(references, max_tokens * CHARS_PER_TOKEN)
+    renderer.blocks(text_blocks)
+    lines = renderer.lines
+    if renderer.truncated:
+        lines.append(TRUNCATION_NOTE)
+    sources = renderer.sources()
+    if sources:
+        lines += ["", "Sources:"] + sources
+    return "\n".join(lines).strip()
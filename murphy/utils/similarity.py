@@ -0,0 +1,303 @@
+"""Similarity search over conversation history (`search_chat_history` with `similar`).
+
+Messages are embedded as hashed TF-IDF vectors: stemmed words, plus
+character trigrams so that "shares"/"share"/"smbclient"/"SMB" still overlap,
+are hashed (CRC32, stable across restarts) into a fixed number of buckets,
+log-scaled and L2-normalized. Each thread keeps an inverted index over those
+buckets, extended as messages are appended; a query only scores messages
+sharing a bucket with it, weighting each bucket by its IDF. Pure Python and
+CPU-only.
+
+Indexes are bounded (most recent MAX_DOCS messages per thread, MAX_THREADS
+threads in memory) and, when MURPHY_CACHE_DIR is set, stored in SQLite so a
+restart doesn't re-embed the history.
+"""
+import heapq
+import math
+import os
+import re
+import sqlite3
+import threading
+import zlib
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .history_search import ParsedQuery, _message_key, format_message, parse_filters
+
+DIMENSIONS = 1 << 20
+TRIGRAM_WEIGHT = 0.3  # relative to a whole word
+MAX_DOCS = 5000  # per thread, most recent
+MAX_THREADS = 64
+DEFAULT_RESULTS = 5
+MAX_CONTENT_CHARS = 1000  # per result
+# Drop matches scoring under this fraction of the best one (stray shared trigrams)
+MIN_RELATIVE_SCORE = 0.2
+
+# Only the conversation itself; tool output is searched by keyword
+INDEXED_ROLES = ('user', 'assistant')
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+# Filters shared with keyword search (user:, after:2024-01-01, limit:3...)
+FILTER_PATTERN = re.compile(r"(?<!\S)(?:user|assistant|after|before|on|case|limit):\S*")
+STOPWORDS = frozenset(
+    "a an and are as at be been but by can could did do does for from had has have how i if in "
+    "into is it its me my no not of on or our so that the their them then there these they this "
+    "to us was we were what when where which who why will with would you your about any some "
+    "just also than too very".split())
+
+
+def _stem(word: str) -> str:
+    """Crude suffix stripping; trigrams cover what it misses"""
+    for suffix in ("ing", "ed", "es", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3 and not word.endswith("ss"):
+            return word[:-len(suffix)]
+    return word
+
+
+def _bucket(feature: str) -> int:
+    return zlib.crc32(feature.encode("utf-8")) & (DIMENSIONS - 1)
+
+
+def embed(text: str) -> Dict[int, float]:
+    """Sparse, L2-normalized hashed TF vector of `text`"""
+    counts: Dict[int, float] = {}
+    for word in WORD_PATTERN.findall(text.lower()):
+        if word in STOPWORDS:
+            continue
+        stem = _stem(word)
+        bucket = _bucket("w:" + stem)
+        counts[bucket] = counts.get(bucket, 0.0) + 1.0
+        padded = f"^{stem}$"
+        for i in range(len(padded) - 2):
+            bucket = _bucket("t:" + padded[i:i + 3])
+            counts[bucket] = counts.get(bucket, 0.0) + TRIGRAM_WEIGHT
+    weights = {bucket: 1 + math.log(count) if count > 1 else count for bucket, count in counts.items()}
+    norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+    return {bucket: w / norm for bucket, w in weights.items()}
+
+
+@dataclass
+class SimilarDoc:
+    key: str
+    role: Optional[str] = None  # None: not indexed (tool output, system...)
+    content: str = ""
+    timestamp: Optional[str] = None
+    buckets: array = None
+    weights: array = None
+
+
+def _doc(msg) -> SimilarDoc:
+    key = str(_message_key(msg))
+    formatted = format_message(msg)
+    if formatted is None or formatted['role'] not in INDEXED_ROLES or not formatted['content'].strip():
+        return SimilarDoc(key=key)
+    vector = embed(formatted['content'])
+    return SimilarDoc(
+        key=key,
+        role=formatted['role'],
+        content=formatted['content'],
+        timestamp=formatted.get('timestamp'),
+        buckets=array('I', vector.keys()),
+        weights=array('f', vector.values()),
+    )
+
+
+class SimilarityStore:
+    """SQLite copy of every thread's indexed documents (vectors included)"""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS docs (thread_id TEXT NOT NULL, position INTEGER NOT NULL, "
+                "key TEXT NOT NULL, role TEXT, content TEXT, timestamp TEXT, buckets BLOB, weights BLOB, "
+                "PRIMARY KEY (thread_id, position))"
+            )
+
+    def load(self, thread_id: str) -> Tuple[int, List[SimilarDoc]]:
+        """(position of the first document, documents in order)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT position, key, role, content, timestamp, buckets, weights FROM docs "
+                "WHERE thread_id = ? ORDER BY position", (thread_id,)).fetchall()
+        docs = []
+        for _, key, role, content, timestamp, buckets, weights in rows:
+            doc = SimilarDoc(key=key, role=role, content=content or "", timestamp=timestamp)
+            if role is not None:
+                doc.buckets = array('I')
+                doc.buckets.frombytes(buckets)
+                doc.weights = array('f')
+                doc.weights.frombytes(weights)
+            docs.append(doc)
+        return (rows[0][0] if rows else 0), docs
+
+    def append(self, thread_id: str, start: int, docs: Sequence[SimilarDoc]) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO docs VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(thread_id, start + i, doc.key, doc.role, doc.content or None, doc.timestamp,
+                  doc.buckets.tobytes() if doc.role else None, doc.weights.tobytes() if doc.role else None)
+                 for i, doc in enumerate(docs)],
+            )
+
+    def trim(self, thread_id: str, first_position: int) -> None:
+        """Forget documents before `first_position` (all of them with 0 after a reset)"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM docs WHERE thread_id = ? AND position < ?", (thread_id, first_position))
+
+    def reset(self, thread_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM docs WHERE thread_id = ?", (thread_id,))
+
+
+class SimilarityIndex:
+    """Inverted index of one thread's message vectors, extended as messages are appended"""
+
+    def __init__(self, thread_id: Optional[str] = None, store: Optional[SimilarityStore] = None):
+        self.thread_id = thread_id
+        self.store = store if thread_id is not None else None
+        self.lock = threading.Lock()
+        self.offset = 0  # position in the message list of docs[0]
+        self.docs: List[SimilarDoc] = []
+        # bucket -> (doc slots, weights)
+        self.postings: Dict[int, Tuple[array, array]] = {}
+        if self.store is not None:
+            self.offset, docs = self.store.load(thread_id)
+            self._index(docs)
+
+    def _index(self, docs: Sequence[SimilarDoc]) -> None:
+        for doc in docs:
+            slot = len(self.docs)
+            self.docs.append(doc)
+            if doc.role is None:
+                continue
+            for bucket, weight in zip(doc.buckets, doc.weights):
+                entry = self.postings.get(bucket)
+                if entry is None:
+                    entry = self.postings[bucket] = (array('I'), array('f'))
+                entry[0].append(slot)
+                entry[1].append(weight)
+
+    def _reset(self, offset: int) -> None:
+        self.offset, self.docs, self.postings = offset, [], {}
+        if self.store is not None:
+            self.store.reset(self.thread_id)
+
+    def sync(self, messages) -> None:
+        """Embed messages appended since the last sync; start over if history was rewritten"""
+        end = self.offset + len(self.docs)
+        if self.docs and (len(messages) < end or str(_message_key(messages[end - 1])) != self.docs[-1].key):
+            self._reset(max(0, len(messages) - MAX_DOCS))
+        elif not self.docs:
+            self.offset = max(0, len(messages) - MAX_DOCS)
+        start = self.offset + len(self.docs)
+        new_docs = [_doc(msg) for msg in messages[start:]]
+        if not new_docs:
+            return
+        self._index(new_docs)
+        if self.store is not None:
+            self.store.append(self.thread_id, start, new_docs)
+        if len(self.docs) > MAX_DOCS:
+            self._compact()
+
+    def _compact(self) -> None:
+        """Keep the newest half of MAX_DOCS; vectors are reused, not recomputed"""
+        keep = self.docs[-(MAX_DOCS // 2):]
+        self.offset += len(self.docs) - len(keep)
+        self.docs, self.postings = [], {}
+        self._index(keep)
+        if self.store is not None:
+            self.store.trim(self.thread_id, self.offset)
+
+    def search(self, text: str, query: Optional[ParsedQuery] = None,
+               limit: int = DEFAULT_RESULTS) -> List[Tuple[float, SimilarDoc]]:
+        """Most similar messages to `text`, best first, honouring role/date filters"""
+        vector = embed(text)
+        total = sum(1 for doc in self.docs if doc.role is not None)
+        scores: Dict[int, float] = {}
+        for bucket, query_weight in vector.items():
+            entry = self.postings.get(bucket)
+            if entry is None:
+                continue
+            slots, weights = entry
+            idf = math.log(1 + total / len(slots))
+            for slot, weight in zip(slots, weights):
+                scores[slot] = scores.get(slot, 0.0) + query_weight * weight * idf
+        if query is not None and (query.role or query.after or query.before or query.on_date):
+            # Filter before ranking, so a narrow filter still finds its best matches
+            scores = {slot: score for slot, score in scores.items() if _passes_filters(self.docs[slot], query)}
+        results = []
+        for slot, score in heapq.nlargest(limit, scores.items(), key=lambda item: item[1]):
+            if results and score < results[0][0] * MIN_RELATIVE_SCORE:
+                break
+            results.append((score, self.docs[slot]))
+        return results
+
+
+def _passes_filters(doc: SimilarDoc, query: ParsedQuery) -> bool:
+    if query.role and doc.role != query.role:
+        return False
+    if doc.timestamp and (query.after or query.before or query.on_date):
+        try:
+            when = datetime.fromisoformat(doc.timestamp.replace('Z', '+00:00'))
+            if query.after and when < query.after:
+                return False
+            if query.before and when > query.before:
+                return False
+            if query.on_date and when.date() != query.on_date.date():
+                return False
+        except (ValueError, TypeError):
+            pass  # Unparseable or naive vs aware: ignore the filter, like keyword search
+    return True
+
+
+def _default_store() -> Optional[SimilarityStore]:
+    cache_dir = os.getenv("MURPHY_CACHE_DIR")
+    return SimilarityStore(os.path.join(cache_dir, "similarity.sqlite")) if cache_dir else None
+
+
+_store: Optional[SimilarityStore] = _default_store()
+_indexes: "OrderedDict[str, SimilarityIndex]" = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def get_similarity_index(thread_id: Optional[str]) -> SimilarityIndex:
+    """The thread's index, loaded from disk or created on first use"""
+    if thread_id is None:
+        return SimilarityIndex()
+    with _indexes_lock:
+        index = _indexes.get(thread_id)
+        if index is None:
+            index = _indexes[thread_id] = SimilarityIndex(thread_id, _store)
+        _indexes.move_to_end(thread_id)
+        while len(_indexes) > MAX_THREADS:
+            _indexes.popitem(last=False)
+        return index
+
+
+def search_similar(query: str, messages, thread_id: Optional[str] = None) -> str:
+    """Messages most similar to `query`, formatted for the model"""
+    parsed = parse_filters(query)
+    text = FILTER_PATTERN.sub(" ", query).strip()
+    if not text:
+        return "Please describe what to look for (filters alone can't be ranked by similarity)."
+    index = get_similarity_index(thread_id)
+    with index.lock:
+        index.sync(messages)
+        results = index.search(text, parsed, limit=parsed.limit or DEFAULT_RESULTS)
+
+    if not results:
+        return f"No messages found similar to: '{text}'"
+    parts = [f"Found {len(results)} messages similar to '{text}' (most similar first):\n\n"]
+    for i, (_, doc) in enumerate(results, 1):
+        timestamp = f" [{doc.timestamp}]" if doc.timestamp else ""
+        content = doc.content if len(doc.content) <= MAX_CONTENT_CHARS else doc.content[:MAX_CONTENT_CHARS] + "..."
+        parts.append(f"{i}. [{doc.role.upper()}]{timestamp}: {content}\n\n")
+    return "".join(parts)
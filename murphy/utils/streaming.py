@@ -0,0 +1,119 @@
+"""Progressive Discord replies for streamed agent output.
+
+The first chunk is posted as a reply as soon as text arrives; after that the
+last message is edited in place at most once per `edit_interval` seconds
+(Discord allows roughly five edits per five seconds). When the text outgrows
+Discord's 2000-character limit the current message is finalized and the
+rest continues in a new one, split by `MessageSplitter` (at paragraph, line
+or sentence boundaries, with code blocks closed and reopened).
+"""
+import asyncio
+import time
+from typing import List, Optional
+
+from .message_splitter import DISCORD_MAX_LENGTH, MessageSplitter
+from .telemetry import telemetry
+
+
+class StreamingReply:
+    """Streams text into one or more Discord messages replying to `message`"""
+
+    def __init__(self, message, edit_interval: float = 1.0, max_length: int = DISCORD_MAX_LENGTH):
+        self.message = message
+        self.edit_interval = edit_interval
+        self.max_length = max_length
+        self.text = ""
+        self.sent: List = []
+        self._splitter = MessageSplitter(max_length)
+        # Chunks the splitter has finalized but that aren't fully shown yet
+        self._finished: List[str] = []
+        self._shown = ""
+        self._last_edit = 0.0
+        self._step = None
+        self._lock = asyncio.Lock()
+        # Deferred edit, kept until it's done so its errors are seen
+        self._pending: Optional[asyncio.Task] = None
+        self._pending_sleeping = False
+
+    async def feed(self, text: str, step=None) -> None:
+        """Append streamed text; `step` separates output from different model calls"""
+        if not text:
+            return
+        if step is not None and self._step is not None and step != self._step and self.text:
+            text = "\n\n" + text
+        if step is not None:
+            self._step = step
+        self.text += text
+        self._finished += self._splitter.feed(text)
+
+        if not self.sent:
+            # Time to first visible output matters most: post right away
+            await self._push()
+        elif time.monotonic() - self._last_edit >= self.edit_interval:
+            await self._push()
+        elif self._pending is None or self._pending.done():
+            if self._pending is not None:
+                self._report(self._pending)
+            self._pending_sleeping = True
+            self._pending = asyncio.create_task(self._push_later())
+
+    async def _push_later(self) -> None:
+        try:
+            await asyncio.sleep(max(0.0, self.edit_interval - (time.monotonic() - self._last_edit)))
+        finally:
+            self._pending_sleeping = False
+        await self._push()
+
+    @staticmethod
+    def _report(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Error updating streamed reply: {task.exception()}")
+
+    async def _push(self) -> None:
+        async with self._lock:
+            # Finalize full messages and continue in new ones
+            while self._finished:
+                await self._show(self._finished.pop(0))
+                self._start_new_message()
+            tail = self._splitter.pending()
+            if tail.strip():
+                await self._show(tail)
+            self._last_edit = time.monotonic()
+
+    def _start_new_message(self) -> None:
+        self.sent.append(None)
+        self._shown = ""
+
+    async def _show(self, content: str) -> None:
+        """Post or edit the current (last) message"""
+        if content == self._shown:
+            return
+        with telemetry.span("discord_send", chars=len(content)) as span:
+            if not self.sent:
+                span.attrs["action"] = "reply"
+                self.sent.append(await self.message.reply(content))
+            elif self.sent[-1] is None:
+                span.attrs["action"] = "send"
+                self.sent[-1] = await self.message.channel.send(content)
+            else:
+                span.attrs["action"] = "edit"
+                await self.sent[-1].edit(content=content)
+        self._shown = content
+
+    async def finish(self) -> None:
+        """Flush whatever is still buffered"""
+        task, self._pending = self._pending, None
+        if task is not None:
+            # Cancel a deferred edit that hasn't started; one in flight runs
+            # to the end, so a message it's sending isn't posted twice
+            if self._pending_sleeping:
+                task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            self._report(task)
+        self._finished += self._splitter.flush()
+        async with self._lock:
+            while self._finished:
+                chunk = self._finished.pop(0)
+                await self._show(chunk)
+                if self._finished:
+                    self._start_new_message()
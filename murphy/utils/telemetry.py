@@ -0,0 +1,295 @@
+"""Spans, latency histograms and counters for Murphy requests.
+
+- `telemetry.span(stage, **attrs)` times a stage (history load, context
+  assembly, a tool call, a Discord send...). Spans nest through a context
+  variable, so everything done for one message shares a trace ID.
+- `instrument_tool` wraps a LangChain tool (sync and async paths) in a span
+  that also records output size; tools report cache outcomes with
+  `telemetry.cache_result(...)`.
+- `TelemetryCallbackHandler` (telemetry_callbacks.py, which needs LangChain)
+  turns each model call into a span with its token usage.
+
+Metrics are kept in memory and exposed in Prometheus text format
+(`start_metrics_server`); finished spans can also be appended to a JSONL trace
+file. Both exports are off unless configured.
+"""
+import contextvars
+import functools
+import json
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar("murphy_span", default=None)
+
+
+def _new_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start: float  # wall clock, for the trace file
+    attrs: Dict[str, Any] = field(default_factory=dict)
+    duration: float = 0.0
+    _started: float = field(default_factory=time.perf_counter, repr=False)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": round(self.duration * 1000, 3),
+            "attrs": self.attrs,
+        }
+
+
+class _Metric:
+    def __init__(self, name: str, kind: str, help_text: str):
+        self.name = name
+        self.kind = kind
+        self.help = help_text
+
+
+class Counter(_Metric):
+    def __init__(self, name: str, help_text: str):
+        super().__init__(name, "counter", help_text)
+        self.values: Dict[Tuple, float] = {}
+
+    def inc(self, labels: Tuple, amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_labels(labels)} {value:g}" for labels, value in sorted(self.values.items())]
+
+
+class Histogram(_Metric):
+    def __init__(self, name: str, help_text: str, buckets=LATENCY_BUCKETS):
+        super().__init__(name, "histogram", help_text)
+        self.buckets = tuple(buckets)
+        # labels -> (per-bucket counts with a final +Inf slot, sum, count)
+        self.series: Dict[Tuple, list] = {}
+
+    def observe(self, labels: Tuple, value: float) -> None:
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = []
+        for labels, (counts, total, count) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f"{self.name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(labels)} {total:g}")
+            lines.append(f"{self.name}_count{_labels(labels)} {count}")
+        return lines
+
+
+def _labels(labels: Tuple) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        f'{key}="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for key, value in labels
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+class Telemetry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._trace_file = None
+        self.stage_seconds = Histogram("murphy_stage_seconds", "Duration of request stages")
+        self.tool_seconds = Histogram("murphy_tool_seconds", "Duration of tool calls")
+        self.tool_output_bytes = Histogram("murphy_tool_output_bytes", "Size of tool outputs", SIZE_BUCKETS)
+        self.tool_calls = Counter("murphy_tool_calls_total", "Tool calls by outcome and cache result")
+        self.llm_seconds = Histogram("murphy_llm_seconds", "Duration of model calls")
+        self.llm_tokens = Counter("murphy_llm_tokens_total", "Model tokens by direction")
+        self.cache_requests = Counter("murphy_cache_requests_total", "Cache lookups by cache and result")
+        self.routes = Counter("murphy_routes_total", "Agent runs by model route")
+        self.route_saved_seconds = Counter("murphy_route_saved_seconds_total",
+                                           "Estimated reasoner latency avoided by cheaper routes")
+        self.metrics: List[_Metric] = [
+            self.stage_seconds, self.tool_seconds, self.tool_output_bytes, self.tool_calls,
+            self.llm_seconds, self.llm_tokens, self.cache_requests, self.routes, self.route_saved_seconds,
+        ]
+
+    def configure(self, trace_file: Optional[str] = None) -> None:
+        """Append finished spans to `trace_file` (JSON lines)"""
+        with self._lock:
+            if self._trace_file is not None:
+                self._trace_file.close()
+            self._trace_file = open(trace_file, "a", encoding="utf-8", buffering=1) if trace_file else None
+
+    def start_span(self, name: str, **attrs) -> Span:
+        parent = _current_span.get()
+        return Span(
+            name=name,
+            trace_id=parent.trace_id if parent else _new_id(),
+            span_id=_new_id(),
+            parent_id=parent.span_id if parent else None,
+            start=time.time(),
+            attrs=attrs,
+        )
+
+    @contextmanager
+    def span(self, name: str, **attrs) -> Iterator[Span]:
+        """Time the enclosed block as stage `name`"""
+        span = self.start_span(name, **attrs)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.attrs["error"] = type(e).__name__
+            raise
+        finally:
+            _current_span.reset(token)
+            self.end_span(span)
+
+    def observe_stage(self, stage: str, seconds: float) -> None:
+        """Record a stage timed outside a span (e.g. module import)"""
+        with self._lock:
+            self.stage_seconds.observe((("stage", stage),), seconds)
+
+    def end_span(self, span: Span) -> None:
+        span.duration = time.perf_counter() - span._started
+        self.observe_stage(span.name, span.duration)
+        with self._lock:
+            if self._trace_file is not None:
+                self._trace_file.write(json.dumps(span.as_dict(), default=str) + "\n")
+
+    def annotate(self, **attrs) -> None:
+        """Attach attributes (e.g. `cache="hit"`) to the current span, if any"""
+        span = _current_span.get()
+        if span is not None:
+            span.attrs.update(attrs)
+
+    def cache_result(self, cache: str, result: str) -> None:
+        """Count a cache lookup and note it on the current span"""
+        with self._lock:
+            self.cache_requests.inc((("cache", cache), ("result", result)))
+        self.annotate(cache=result)
+
+    def record_tool(self, span: Span, output: Any) -> None:
+        size = len(str(output).encode("utf-8", errors="replace"))
+        span.attrs["output_bytes"] = size
+        span.attrs["output_tokens_approx"] = size // 4
+        tool = span.attrs.get("tool", "")
+        status = "error" if "error" in span.attrs else "ok"
+        with self._lock:
+            self.tool_output_bytes.observe((("tool", tool),), size)
+            self.tool_calls.inc((("tool", tool), ("status", status), ("cache", span.attrs.get("cache", "none"))))
+
+    def record_route(self, route: str, seconds: float, saved_seconds: float) -> None:
+        labels = (("route", route),)
+        with self._lock:
+            self.routes.inc(labels)
+            self.stage_seconds.observe((("stage", f"route_{route}"),), seconds)
+            if saved_seconds:
+                self.route_saved_seconds.inc(labels, saved_seconds)
+
+    def record_llm(self, model: str, duration: float, input_tokens: int, output_tokens: int) -> None:
+        with self._lock:
+            self.llm_seconds.observe((("model", model),), duration)
+            self.llm_tokens.inc((("model", model), ("direction", "input")), input_tokens)
+            self.llm_tokens.inc((("model", model), ("direction", "output")), output_tokens)
+
+    def render_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            for metric in self.metrics:
+                lines.append(f"# HELP {metric.name} {metric.help}")
+                lines.append(f"# TYPE {metric.name} {metric.kind}")
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+telemetry = Telemetry()
+
+
+def instrument_tool(tool):
+    """Wrap a LangChain tool's sync and async implementations in a "tool" span"""
+    name = tool.name
+
+    def finish(span, output):
+        telemetry.record_tool(span, output)
+        with telemetry._lock:
+            telemetry.tool_seconds.observe((("tool", name),), time.perf_counter() - span._started)
+
+    if tool.func is not None:
+        func = tool.func
+
+        @functools.wraps(func)
+        def run(*args, **kwargs):
+            with telemetry.span("tool", tool=name) as span:
+                output = ""
+                try:
+                    output = func(*args, **kwargs)
+                    return output
+                except Exception as e:
+                    span.attrs["error"] = type(e).__name__
+                    raise
+                finally:
+                    finish(span, output)
+        tool.func = run
+
+    if tool.coroutine is not None:
+        coroutine = tool.coroutine
+
+        @functools.wraps(coroutine)
+        async def arun(*args, **kwargs):
+            with telemetry.span("tool", tool=name) as span:
+                output = ""
+                try:
+                    output = await coroutine(*args, **kwargs)
+                    return output
+                except Exception as e:
+                    span.attrs["error"] = type(e).__name__
+                    raise
+                finally:
+                    finish(span, output)
+        tool.coroutine = arun
+    return tool
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = telemetry.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes would flood the console
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve `/metrics` in Prometheus text format from a daemon thread"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="murphy-metrics", daemon=True).start()
+    return server
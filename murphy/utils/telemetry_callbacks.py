@@ -0,0 +1,44 @@
+"""LangChain callback handler feeding model calls into `telemetry`.
+
+Kept apart from telemetry.py so the gateway path can record spans without
+importing LangChain.
+"""
+from typing import Any, Dict
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from .telemetry import Span, telemetry
+
+
+class TelemetryCallbackHandler(BaseCallbackHandler):
+    """Records every chat model call as an "llm" span with token usage"""
+
+    run_inline = True  # Keep callbacks in the model call's context
+
+    def __init__(self):
+        self._spans: Dict[Any, Span] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        model = (metadata or {}).get("ls_model_name") or (serialized or {}).get("name", "unknown")
+        step = (metadata or {}).get("langgraph_step")
+        self._spans[run_id] = telemetry.start_span("llm", model=model, step=step)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        span = self._spans.pop(run_id, None)
+        if span is None:
+            return
+        input_tokens = output_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                input_tokens += usage.get("input_tokens", 0)
+                output_tokens += usage.get("output_tokens", 0)
+        span.attrs.update(input_tokens=input_tokens, output_tokens=output_tokens)
+        telemetry.end_span(span)
+        telemetry.record_llm(span.attrs["model"], span.duration, input_tokens, output_tokens)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        span = self._spans.pop(run_id, None)
+        if span is not None:
+            span.attrs["error"] = type(error).__name__
+            telemetry.end_span(span)
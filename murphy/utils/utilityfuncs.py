@@ -1,39 +1,44 @@
+from .message_splitter import iter_message_chunks
+from .serp_format import render_text_blocks
+
 # for `web_search` agent tool
-def format_weather_data(text_blocks):
+def format_weather_data(text_blocks, max_tokens=300):
     """Format the weather data from text_blocks into a readable string"""
-    formatted_text = ""
-    
-    for block in text_blocks:
-        if block["type"] == "paragraph":
-            formatted_text += f"{block['snippet']}\n\n"
-        elif block["type"] == "heading":
-            formatted_text += f"--- {block['snippet']} ---\n"
-        elif block["type"] == "list" and "list" in block:
-            for item in block["list"]:
-                formatted_text += f"• {item['snippet']}\n"
-            formatted_text += "\n"
-    
-    return formatted_text.strip()
+    return render_text_blocks(text_blocks, max_tokens=max_tokens)
+
+def message_text(content) -> str:
+    """Flatten LangChain message content (a string or a list of content blocks) to text"""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        parts = []
+        for block in content:
+            if isinstance(block, str):
+                parts.append(block)
+            elif isinstance(block, dict) and isinstance(block.get('text'), str):
+                parts.append(block['text'])
+        return '\n'.join(parts)
+    return str(content)
 
 def split_message(message, max_length=2000):
-    """Split a message into chunks that fit within Discord's character limit"""
+    """Split a message into chunks that fit within Discord's character limit,
+    at paragraph/line/sentence boundaries and without breaking code blocks"""
     if len(message) <= max_length:
         return [message]
-    
-    # Simple approach: split into chunks of max_length
-    chunks = []
-    for i in range(0, len(message), max_length):
-        chunk = message[i:i+max_length]
-        chunks.append(chunk)
-    
-    return chunks
+    return list(iter_message_chunks(message, max_length))
+
+BINARY_CONTENT_TYPES = ('application/pdf', 'image/', 'video/', 'audio/')
+
+def is_binary_content_type(content_type: str) -> bool:
+    """True for Content-Type values we never extract text from"""
+    content_type = content_type.lower()
+    return any(bt in content_type for bt in BINARY_CONTENT_TYPES)
 
 def is_binary_content(response, url) -> bool:
     """Quick check for binary content - return True if binary detected"""
     
     # 1. Content-Type check (fastest)
-    content_type = response.headers.get('content-type', '').lower()
-    if any(bt in content_type for bt in ['application/pdf', 'image/', 'video/', 'audio/']):
+    if is_binary_content_type(response.headers.get('content-type', '')):
         return True
     
     # 2. File extension check
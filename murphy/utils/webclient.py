@@ -0,0 +1,164 @@
+import asyncio
+import threading
+from dataclasses import dataclass
+from typing import Iterable, Mapping, Optional, Tuple
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+
+from .utilityfuncs import is_binary_content_type
+
+# Headers to mimic a browser
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+DEFAULT_TIMEOUT = 15
+
+# Page bodies are streamed and cut off past this size (after decompression)
+MAX_PAGE_BYTES = 4 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+
+# Connection pool sizing: number of hosts to keep pools for, and keep-alive
+# connections per host
+POOL_CONNECTIONS = 32
+POOL_MAXSIZE = 8
+
+# Errors raised by either fetch path
+FETCH_ERRORS = (requests.exceptions.RequestException, aiohttp.ClientError, asyncio.TimeoutError)
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+_async_session: Optional[aiohttp.ClientSession] = None
+_async_session_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+@dataclass
+class FetchedPage:
+    """A downloaded page. Shared by binary detection and every extraction method"""
+    url: str
+    status_code: int
+    headers: Mapping[str, str]
+    content: bytes
+    truncated: bool = False  # body was cut off at `max_bytes`
+
+
+def get_session() -> requests.Session:
+    """Return the process-wide pooled session, creating it on first use"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                session.headers.update(DEFAULT_HEADERS)
+                _session = session
+    return _session
+
+
+def _read_capped(chunks: Iterable[bytes], max_bytes: int) -> Tuple[bytes, bool]:
+    """Join streamed chunks, stopping once `max_bytes` have been read"""
+    body = bytearray()
+    for chunk in chunks:
+        body += chunk
+        if len(body) >= max_bytes:
+            return bytes(body[:max_bytes]), True
+    return bytes(body), False
+
+
+def fetch_page(
+    url: str,
+    headers: Optional[Mapping[str, str]] = None,
+    timeout: float = DEFAULT_TIMEOUT,
+    max_bytes: int = MAX_PAGE_BYTES,
+) -> FetchedPage:
+    """Download a page once over a keep-alive connection. Raises requests exceptions on failure.
+
+    The body is streamed and cut off after `max_bytes`; binary content types
+    aren't downloaded at all.
+    """
+    with get_session().get(url, headers=headers, timeout=timeout, stream=True) as response:
+        response.raise_for_status()  # Raise an exception for bad status codes
+        content, truncated = b"", False
+        if not is_binary_content_type(response.headers.get('content-type', '')):
+            content, truncated = _read_capped(response.iter_content(CHUNK_SIZE), max_bytes)
+        return FetchedPage(
+            url=response.url,
+            status_code=response.status_code,
+            headers=response.headers,
+            content=content,
+            truncated=truncated,
+        )
+
+
+def get_async_session() -> aiohttp.ClientSession:
+    """Return the shared aiohttp session for the running event loop, creating it on first use"""
+    global _async_session, _async_session_loop
+    loop = asyncio.get_running_loop()
+    if _async_session is None or _async_session.closed or _async_session_loop is not loop:
+        connector = aiohttp.TCPConnector(
+            limit=POOL_CONNECTIONS * POOL_MAXSIZE,
+            limit_per_host=POOL_MAXSIZE,
+        )
+        _async_session = aiohttp.ClientSession(connector=connector, headers=DEFAULT_HEADERS)
+        _async_session_loop = loop
+    return _async_session
+
+
+async def close_async_session() -> None:
+    """Close the shared aiohttp session, if one is open"""
+    global _async_session
+    if _async_session is not None and not _async_session.closed:
+        await _async_session.close()
+    _async_session = None
+
+
+async def afetch_page(
+    url: str,
+    headers: Optional[Mapping[str, str]] = None,
+    timeout: float = DEFAULT_TIMEOUT,
+    max_bytes: int = MAX_PAGE_BYTES,
+) -> FetchedPage:
+    """Async version of `fetch_page` on the shared aiohttp session"""
+    session = get_async_session()
+    async with session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+        response.raise_for_status()
+        body = bytearray()
+        truncated = False
+        if not is_binary_content_type(response.headers.get('content-type', '')):
+            async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                body += chunk
+                if len(body) >= max_bytes:
+                    del body[max_bytes:]
+                    truncated = True
+                    break
+        return FetchedPage(
+            url=str(response.url),
+            status_code=response.status,
+            headers=response.headers,
+            content=bytes(body),
+            truncated=truncated,
+        )
+
+
+async def aget_json(url: str, params: Mapping[str, str], timeout: float = 60) -> dict:
+    """GET a JSON object on the shared aiohttp session.
+
+    Error statuses aren't raised: APIs like SerpAPI explain them in the body
+    (`{"error": ...}`), and the exception would quote the request URL, API key
+    included. A failed request without such a body returns `{"error": "HTTP <status>"}`.
+    """
+    session = get_async_session()
+    async with session.get(url, params=params, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+        try:
+            body = await response.json(content_type=None)
+        except ValueError:
+            body = None
+        if not isinstance(body, dict):
+            return {"error": f"HTTP {response.status}" if response.status >= 400 else "Response is not a JSON object"}
+        if response.status >= 400 and "error" not in body:
+            body["error"] = f"HTTP {response.status}"
+        return body
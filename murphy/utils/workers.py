@@ -0,0 +1,332 @@
+"""A pool of agent worker processes fed from the gateway over local queues.
+
+Each job is routed by a key (the Discord channel) to a fixed worker, so a
+conversation's checkpoint, attachment index and history indexes only ever
+live in one process. Workers run their own event loop and send results back
+as a stream of events, which `WorkerCall` turns into an async iterator.
+
+The transport is `multiprocessing` queues in, and a pipe back from each
+worker: the local stand-in for a real broker, so the whole deployment (and its
+tests) runs on one machine. Nothing written to is shared between workers, so
+one dying mid-write can't hold a lock the others need. A worker module needs:
+
+    async def handle_job(job, emit) -> result   # emit(payload) streams events (from the loop)
+    async def startup() -> None                 # optional, before the first job
+    async def shutdown() -> None                # optional, on clean exit
+
+Jobs and events must be picklable. A worker that dies fails its in-flight
+calls with `WorkerError` and is restarted, after a delay that doubles each
+time it dies again soon after starting. Jobs for it fail until it's back.
+"""
+import asyncio
+import importlib
+import itertools
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from multiprocessing.connection import wait
+from typing import Any, AsyncIterator, Dict, Hashable, Iterator, List, Optional
+
+# Restart delay after a worker dies, doubled for each crash in a row up to
+# the max. A worker that stayed up for STABLE_SECONDS starts over at the base
+RESTART_BACKOFF = 0.5
+RESTART_BACKOFF_MAX = 60.0
+STABLE_SECONDS = 30.0
+
+
+class WorkerError(Exception):
+    """A job failed in (or with) its worker process"""
+
+
+def route(key: Hashable, workers: int) -> int:
+    """Worker index for `key`; stable across processes and restarts"""
+    return zlib.crc32(str(key).encode("utf-8")) % workers
+
+
+@contextmanager
+def _main_module_hidden() -> Iterator[None]:
+    """Start processes without them re-importing the parent's `__main__`.
+
+    Spawned children import the launching module (as `__mp_main__`) before
+    running their target. Started with `python -m murphy.chatbot`, that would
+    build a bot, a pool and a scheduler in every worker. The target lives in
+    this module, so the children don't need it.
+
+    This swaps attributes on the real `__main__`, so processes are only
+    started from the main thread: in `start`, and on the event loop after that.
+    """
+    main = sys.modules["__main__"]
+    saved = {name: main.__dict__[name] for name in ("__spec__", "__file__") if name in main.__dict__}
+    main.__spec__ = None
+    main.__dict__.pop("__file__", None)
+    try:
+        yield
+    finally:
+        main.__dict__.update(saved)
+
+
+def _worker_main(index: int, module_name: str, inbound, outbound) -> None:
+    """Worker process entry point"""
+    # Ctrl+C reaches the whole process group; the gateway stops workers
+    # itself, after they finish their jobs and flush their checkpoints
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    os.environ["MURPHY_WORKER_INDEX"] = str(index)
+    module = importlib.import_module(module_name)
+    asyncio.run(_serve(module, inbound, outbound))
+
+
+async def _serve(module, inbound, outbound) -> None:
+    startup = getattr(module, "startup", None)
+    if startup is not None:
+        await startup()
+    tasks = set()
+    while True:
+        message = await asyncio.to_thread(inbound.get)
+        if message is None:
+            break
+        job_id, job = message
+        task = asyncio.create_task(_run_job(module.handle_job, job_id, job, outbound))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
+    shutdown = getattr(module, "shutdown", None)
+    if shutdown is not None:
+        await shutdown()
+
+
+async def _run_job(handler, job_id: int, job: Any, outbound) -> None:
+    def emit(payload: Any) -> None:
+        outbound.send(("event", job_id, payload))
+
+    try:
+        result = await handler(job, emit)
+    except Exception as e:
+        print(f"Error in worker job {job_id}: {e}")
+        outbound.send(("error", job_id, f"{type(e).__name__}: {e}"))
+    else:
+        outbound.send(("done", job_id, result))
+
+
+class WorkerCall:
+    """One job in flight: iterate for its events; `result` is set once it finishes"""
+
+    def __init__(self, job_id: int, worker: int):
+        self.job_id = job_id
+        self.worker = worker
+        self.result: Any = None
+        self._events: asyncio.Queue = asyncio.Queue()
+
+    def _deliver(self, kind: str, payload: Any) -> None:
+        self._events.put_nowait((kind, payload))
+
+    def __aiter__(self) -> AsyncIterator[Any]:
+        return self._iterate()
+
+    async def _iterate(self) -> AsyncIterator[Any]:
+        while True:
+            kind, payload = await self._events.get()
+            if kind == "event":
+                yield payload
+            elif kind == "done":
+                self.result = payload
+                return
+            else:
+                raise WorkerError(payload)
+
+    async def wait(self) -> Any:
+        """Drop the events and return the result"""
+        async for _ in self:
+            pass
+        return self.result
+
+
+class _Worker:
+    def __init__(self, index: int, process, inbound, outbound):
+        self.index = index
+        self.process = process
+        self.inbound = inbound
+        self.outbound = outbound  # read end of its pipe; None once it's closed
+        self.calls: Dict[int, WorkerCall] = {}
+        self.started_at = time.monotonic()
+        self.restarts = 0
+        self.crashes = 0  # in a row, each soon after starting
+        self.restart_at: Optional[float] = None  # set once it's found dead
+        self.restarting = False  # the restart is scheduled on the loop
+
+
+class WorkerPool:
+    """`size` worker processes running `module`, with jobs routed by key"""
+
+    def __init__(self, size: int, module: str, start_method: str = "spawn", health_interval: float = 1.0):
+        self.size = size
+        self.module = module
+        self.health_interval = health_interval
+        # "spawn": workers start from a clean interpreter, not a copy of the
+        # gateway with its sockets and threads
+        self._context = multiprocessing.get_context(start_method)
+        self._workers: List[_Worker] = []
+        # Wakes the reader to watch a restarted worker's pipe, or to stop
+        self._wakeup, self._wake = self._context.Pipe(duplex=False)
+        # Guards workers and their calls, shared by the event loop and the reader thread
+        self._lock = threading.Lock()
+        self._job_ids = itertools.count()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._reader: Optional[threading.Thread] = None
+        self._closed = False
+        self.completed = 0
+        self.failed = 0
+
+    def _spawn(self, index: int) -> _Worker:
+        inbound = self._context.Queue()
+        outbound, sender = self._context.Pipe(duplex=False)
+        process = self._context.Process(
+            target=_worker_main, args=(index, self.module, inbound, sender),
+            name=f"murphy-worker-{index}", daemon=True,
+        )
+        with _main_module_hidden():
+            process.start()
+        sender.close()  # the child's copy is the only one: its exit ends the pipe
+        return _Worker(index, process, inbound, outbound)
+
+    def start(self) -> None:
+        self._workers = [self._spawn(index) for index in range(self.size)]
+        self._reader = threading.Thread(target=self._read, name="murphy-worker-reader", daemon=True)
+        self._reader.start()
+
+    def submit(self, key: Hashable, job: Any) -> WorkerCall:
+        """Send `job` to the worker that owns `key`"""
+        if self._closed:
+            raise WorkerError("worker pool is closed")
+        self._loop = asyncio.get_running_loop()
+        with self._lock:
+            worker = self._workers[route(key, self.size)]
+            if worker.restart_at is not None:
+                raise WorkerError(f"worker {worker.index} is restarting")
+            call = WorkerCall(next(self._job_ids), worker.index)
+            worker.calls[call.job_id] = call
+            worker.inbound.put((call.job_id, job))
+        return call
+
+    def _read(self) -> None:
+        """Reader thread: hand events to their calls on the event loop, and watch for dead workers.
+
+        Runs until the pool is closed and every worker's pipe has been read to the end.
+        """
+        last_check = time.monotonic()
+        # Pipes of replaced workers are read to the end too (their calls were already failed)
+        pipes: Dict[Any, _Worker] = {}
+        while True:
+            with self._lock:
+                for worker in self._workers:
+                    if worker.outbound is not None:
+                        pipes[worker.outbound] = worker
+                closed = self._closed
+            if closed and not pipes:
+                return
+            for pipe in wait([*pipes, self._wakeup], timeout=self.health_interval):
+                if pipe is self._wakeup:
+                    self._wakeup.recv()
+                    continue
+                worker = pipes[pipe]
+                try:
+                    self._dispatch(worker, *pipe.recv())
+                except (EOFError, OSError):
+                    # The worker exited; the health check fails its calls
+                    pipe.close()
+                    with self._lock:
+                        worker.outbound = None
+                    del pipes[pipe]
+                    last_check = 0.0
+            if time.monotonic() - last_check >= self.health_interval:
+                last_check = time.monotonic()
+                self._check_workers()
+
+    def _dispatch(self, worker: _Worker, kind: str, job_id: int, payload: Any) -> None:
+        with self._lock:
+            call = worker.calls.get(job_id)
+            if call is None:
+                return  # its worker died and the call was already failed
+            if kind != "event":
+                del worker.calls[job_id]
+                if kind == "done":
+                    self.completed += 1
+                else:
+                    self.failed += 1
+        self._loop.call_soon_threadsafe(call._deliver, kind, payload)
+
+    def _check_workers(self) -> None:
+        """Reader thread: fail the calls of dead workers, and schedule their restarts on the loop"""
+        with self._lock:
+            if self._closed or self._loop is None:
+                return  # no loop before the first job: nothing to fail or restart on
+            now = time.monotonic()
+            for worker in self._workers:
+                if worker.restart_at is None and not worker.process.is_alive():
+                    self._worker_died(worker, now)
+                if worker.restart_at is not None and not worker.restarting and now >= worker.restart_at:
+                    worker.restarting = True
+                    self._loop.call_soon_threadsafe(self._restart, worker.index)
+
+    def _worker_died(self, worker: _Worker, now: float) -> None:
+        calls, worker.calls = worker.calls, {}
+        for call in calls.values():
+            self.failed += 1
+            self._loop.call_soon_threadsafe(call._deliver, "error", f"worker {worker.index} exited")
+        worker.crashes = worker.crashes + 1 if now - worker.started_at < STABLE_SECONDS else 1
+        delay = min(RESTART_BACKOFF_MAX, RESTART_BACKOFF * 2 ** (worker.crashes - 1))
+        worker.restart_at = now + delay
+        print(f"Agent worker {worker.index} exited with code {worker.process.exitcode}; "
+              f"restarting it in {delay:.1f}s")
+
+    def _restart(self, index: int) -> None:
+        """Event loop: replace a dead worker (processes start on the main thread, see `_main_module_hidden`)"""
+        with self._lock:
+            if self._closed:
+                return
+            worker = self._workers[index]
+        # A new inbound queue: jobs the old process never took were failed with it
+        replacement = self._spawn(index)
+        replacement.restarts = worker.restarts + 1
+        replacement.crashes = worker.crashes
+        with self._lock:
+            if not self._closed:
+                self._workers[index] = replacement
+                self._wake.send(None)
+                return
+        replacement.process.terminate()  # closed while it started
+        replacement.process.join()
+        replacement.outbound.close()
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Let workers finish their jobs and shut down (terminating stragglers)"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        for worker in self._workers:
+            worker.inbound.put(None)
+        deadline = time.monotonic() + timeout
+        for worker in self._workers:
+            worker.process.join(max(0.0, deadline - time.monotonic()))
+            if worker.process.is_alive():
+                worker.process.terminate()
+                worker.process.join()
+        self._wake.send(None)
+        if self._reader is not None:
+            self._reader.join()
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.size,
+            "alive": sum(worker.process.is_alive() for worker in self._workers),
+            "in_flight": [len(worker.calls) for worker in self._workers],
+            "restarts": sum(worker.restarts for worker in self._workers),
+            "completed": self.completed,
+            "failed": self.failed,
+        }
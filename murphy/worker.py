@@ -0,0 +1,59 @@
+"""Agent worker process (`MURPHY_WORKERS` > 0), started by the gateway's `WorkerPool`.
+
+Runs the agent for the channels routed to it: renders the gathered message
+context (downloading and indexing attachments), runs the model and tools, and
+streams the answer back to the gateway, which posts it to Discord. Each worker
+keeps its own checkpoint file and telemetry outputs, suffixed with its index.
+"""
+import os
+import sys
+
+from dotenv import load_dotenv
+
+from murphy.agent import agent, answer_contexts, checkpointer, fast_agent
+from murphy.utils.lazy import warmup_mode
+from murphy.utils.prefetch import prefetch_scope
+from murphy.utils.telemetry import start_metrics_server, telemetry
+
+load_dotenv()
+
+WORKER_INDEX = int(os.getenv('MURPHY_WORKER_INDEX', '0'))
+
+
+def _per_worker(path: str) -> str:
+    root, ext = os.path.splitext(path)
+    return f"{root}.worker{WORKER_INDEX}{ext}"
+
+
+# Channels are routed to a fixed worker, so its conversations live in its own
+# file (the path is read when the checkpointer is built, after this)
+os.environ['MURPHY_CHECKPOINT_DB'] = _per_worker(os.getenv('MURPHY_CHECKPOINT_DB', 'murphy_checkpoints.sqlite'))
+telemetry.configure(trace_file=_per_worker(os.environ['MURPHY_TRACE_FILE']) if os.getenv('MURPHY_TRACE_FILE') else None)
+if os.getenv('MURPHY_METRICS_PORT'):
+    # The gateway serves the base port; worker N serves base + 1 + N
+    start_metrics_server(int(os.getenv('MURPHY_METRICS_PORT')) + 1 + WORKER_INDEX)
+
+
+async def startup() -> None:
+    if warmup_mode() != "lazy":
+        agent.warm_up()
+        fast_agent.warm_up()
+
+
+async def handle_job(job, emit) -> dict:
+    """Answer one channel run: `job` holds the thread ID, the gathered
+    `MessageContext`s (coalesced messages, oldest first) and the stream flag"""
+    thread_id = job["thread_id"]
+    with telemetry.span("worker_run", worker=WORKER_INDEX, messages=len(job["contexts"])), prefetch_scope():
+        # The gateway sends channel history until it knows this worker has the
+        # conversation; the checkpoint decides whether it is still needed
+        async for text, step in answer_contexts(thread_id, job["contexts"], job["stream"]):
+            emit((text, step))
+    return {"worker": WORKER_INDEX}
+
+
+async def shutdown() -> None:
+    if 'murphy.utils.webclient' in sys.modules:  # only loaded once a tool ran
+        await sys.modules['murphy.utils.webclient'].close_async_session()
+    if checkpointer.loaded:
+        checkpointer.get().close()
@@ -0,0 +1,12 @@
+from murphy.utils.attachments import AttachmentStore, IndexedFile
+
+
+def test_store_keeps_total_text_under_the_cap():
+    store = AttachmentStore(max_channels=64, max_chars=1000)
+    for channel in range(5):
+        store.add(channel, IndexedFile(f"scan{channel}.txt", chars=300))
+        store.channel(0)  # channel 0 stays recently used
+    assert [channel for channel in range(5) if store.channel(channel)] == [0, 3, 4]
+
+    store.add(5, IndexedFile("huge.log", chars=5000))
+    assert [channel for channel in range(6) if store.channel(channel)] == [5]
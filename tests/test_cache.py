@@ -0,0 +1,32 @@
+import time
+
+from murphy.utils import cache
+from murphy.utils.cache import SQLiteCacheBackend, TTLCache
+
+
+def rows(backend):
+    return backend._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+
+def test_expired_rows_are_purged_while_running(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "PURGE_EVERY", 10)
+    backend = SQLiteCacheBackend(str(tmp_path / "c.sqlite"))
+    for i in range(9):
+        backend.set(f"old{i}", i, time.time() - 1)
+    assert rows(backend) == 9
+    backend.set("fresh", 1, time.time() + 60)
+    assert rows(backend) == 1
+
+
+def test_disk_is_capped_to_the_newest_writes(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "PURGE_EVERY", 5)
+    results = TTLCache(maxsize=2, backend=SQLiteCacheBackend(str(tmp_path / "c.sqlite"), max_entries=3))
+    for i in range(10):
+        results.set(f"k{i}", i)
+    assert rows(results.backend) == 3
+    assert results.get("k7") == 7 and results.get("k6") is None
+
+    results.set("k7", 7)  # rewritten: now the newest
+    results.set("k10", 10)
+    results.backend.purge()
+    assert [results.backend.get(key) is not None for key in ("k7", "k8", "k9", "k10")] == [True, False, True, True]
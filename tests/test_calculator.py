@@ -0,0 +1,60 @@
+import math
+import time
+
+import pytest
+
+from murphy.utils import calculator
+from murphy.utils.calculator import CalculatorError, evaluate, evaluate_table
+
+
+def test_round():
+    assert evaluate("round(3.14159, 2)") == 3.14
+    assert evaluate("round(1234, -2)") == 1200
+    assert evaluate("round(2.5)") == 2
+
+
+@pytest.mark.parametrize("expression", ["round(1, -10**7)", "round(1, -10**9)", "round(1, 10**9)", "round(1, 0.5)"])
+def test_round_digits_are_bounded(expression):
+    started = time.monotonic()
+    with pytest.raises(CalculatorError):
+        evaluate(expression)
+    assert time.monotonic() - started < 0.5
+
+
+def test_round_digits_are_bounded_in_tables():
+    with pytest.raises(CalculatorError):
+        evaluate_table("round(x, -10**9)", {"x": "1..3"})
+
+
+@pytest.fixture(params=["numpy", "python"])
+def table_path(request, monkeypatch):
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(calculator, "_numpy", lambda: None)
+    return request.param
+
+
+def results(expression, values):
+    return [row[-1] for row in evaluate_table(expression, values)[1]]
+
+
+def test_tables_give_the_same_answers_on_both_paths(table_path):
+    assert results("x**3", {"x": "1..3"}) == [1, 8, 27]
+    assert results("2**-1 + x", {"x": "1..2"}) == [1.5, 2.5]
+    assert results("2**100 + x", {"x": "1..2"}) == [2 ** 100 + 1, 2 ** 100 + 2]
+    assert results("factorial(x)", {"x": "21..22"}) == [math.factorial(21), math.factorial(22)]
+    assert math.isnan(results("1/x", {"x": "0..1"})[0])
+
+
+def test_scalar_only_functions_keep_to_the_deadline(table_path):
+    started = time.monotonic()
+    with pytest.raises(CalculatorError):
+        evaluate_table("factorial(x) * comb(x, 500)", {"x": "1..1000", "y": "1..100"}, timeout=0.2)
+    assert time.monotonic() - started < 1
+
+
+def test_power_errors_report_the_size_not_the_operands():
+    with pytest.raises(CalculatorError) as error:
+        evaluate("(9**3000)**9")
+    assert len(str(error.value)) < 80
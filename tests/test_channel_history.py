@@ -0,0 +1,38 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from harness import FakeUser, transcript_channel  # noqa: E402
+
+from murphy.utils.channel_history import ChannelHistoryStore  # noqa: E402
+
+BOT = FakeUser(1, "Spider Murphy", bot=True)
+USER = FakeUser(2, "alice")
+
+
+def test_edits_replace_streamed_replies():
+    store = ChannelHistoryStore(max_tokens=32000)
+    channel = transcript_channel(7, 5, BOT)
+    asyncio.run(store.load(channel, BOT))
+
+    reply = channel.add("Partial", BOT)
+    store.record(reply, BOT)
+    reply.content = "Partial answer, now complete."
+    store.record_edit(reply, BOT)
+    store.record(channel.add("thanks", USER), BOT)
+
+    history = asyncio.run(store.load(channel, BOT))
+    assert [entry["content"] for entry in history[-2:]] == ["Partial answer, now complete.", "thanks"]
+    total = store._channels[channel.id].total_tokens
+    assert total == sum(entry.tokens for entry in store._channels[channel.id].entries)
+
+
+def test_edits_in_untracked_channels_are_ignored():
+    store = ChannelHistoryStore()
+    channel = transcript_channel(8, 3, BOT)
+    message = channel.add("hello", USER)
+    message.content = "hello, edited"
+    store.record_edit(message, BOT)
+    assert channel.id not in store._channels
@@ -0,0 +1,56 @@
+import asyncio
+import sqlite3
+
+from langchain.agents import create_agent
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+
+from murphy.utils.checkpointer import PersistentSaver
+
+
+def make_agent(saver, replies):
+    model = GenericFakeChatModel(messages=iter([AIMessage(content=reply) for reply in replies]))
+    return create_agent(model, tools=[], checkpointer=saver)
+
+
+def run_turns(agent, thread_id, turns, size=1000):
+    config = {"configurable": {"thread_id": thread_id}}
+
+    async def run():
+        for i in range(turns):
+            await agent.ainvoke({"messages": [HumanMessage(content=f"turn {i} " + "x" * size)]}, config)
+        return (await agent.aget_state(config)).values["messages"]
+    return asyncio.run(run())
+
+
+def test_thread_size_is_capped_at_turn_boundaries(tmp_path):
+    saver = PersistentSaver(str(tmp_path / "c.sqlite"), max_thread_bytes=20_000)
+    messages = run_turns(make_agent(saver, ["reply"] * 100), "t", 60)
+    assert messages[0].type == "human" and messages[-1].content == "reply"
+    assert 0 < len(messages) < 40
+    assert messages[-2].content.startswith("turn 59")
+    saver.close()
+
+
+def test_compaction_deletes_orphaned_blobs(tmp_path):
+    path = str(tmp_path / "c.sqlite")
+    saver = PersistentSaver(path, max_checkpoints=3, max_threads=1)
+    run_turns(make_agent(saver, ["reply"] * 20), "a", 10)
+    run_turns(make_agent(saver, ["reply"] * 20), "b", 10)  # evicts "a"
+    saver.close()
+    # Compaction trims the extra checkpoints on disk, and the values only they used
+    saver = PersistentSaver(path, max_checkpoints=1)
+    saver.compact()
+    saver.close()
+    conn = sqlite3.connect(path)
+    checkpoints = conn.execute("SELECT COUNT(*) FROM checkpoints").fetchone()[0]
+    blobs = conn.execute("SELECT COUNT(*) FROM blobs").fetchone()[0]
+    assert checkpoints == 2
+    assert blobs <= 2 * 4  # the channels of the one checkpoint left per thread
+
+    # Both threads still resume from disk
+    saver = PersistentSaver(path)
+    config = {"configurable": {"thread_id": "a"}}
+    state = asyncio.run(make_agent(saver, []).aget_state(config))
+    assert state.values["messages"][-1].content == "reply"
+    saver.close()
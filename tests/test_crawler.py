@@ -0,0 +1,78 @@
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.robotparser import RobotFileParser
+
+import pytest
+
+from murphy.utils.crawler import ROBOTS_USER_AGENT, Crawler, RobotsCache, crawl
+
+ROBOTS = b"User-agent: *\nDisallow: /private\n"
+PAGES = {
+    "/": '<a href="/to-private">a</a> <a href="/to-offsite">b</a> <a href="/to-page">c</a>',
+    "/page": "<p>in scope</p>",
+    "/private/secret": "<p>secret</p>",
+}
+
+
+class Handler(BaseHTTPRequestHandler):
+    requested = []
+
+    def do_GET(self):
+        self.requested.append(self.path)
+        port = self.server.server_address[1]
+        redirects = {
+            "/to-private": "/private/secret",
+            "/to-offsite": f"http://localhost:{port}/page",  # another host
+            "/to-page": "/page",
+        }
+        if self.path in redirects:
+            self.send_response(302)
+            self.send_header("Location", redirects[self.path])
+            self.end_headers()
+            return
+        if self.path == "/robots.txt":
+            body, content_type = ROBOTS, "text/plain"
+        elif self.path in PAGES:
+            body, content_type = f"<html><body>{PAGES[self.path]}</body></html>".encode(), "text/html"
+        else:
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def site():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    Handler.requested = []
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+def test_redirects_are_checked_before_they_are_followed(site):
+    result = crawl(site + "/", max_pages=10, host_delay=0, robots=RobotsCache())
+    assert "/private/secret" not in Handler.requested
+    assert any(url.endswith("/private/secret") for url in result.robots_blocked)
+    assert Handler.requested.count("/page") == 1  # only via the in-scope redirect
+    offsite = [page for page in result.pages if page.url.endswith("/to-offsite")]
+    assert offsite and "off-site" in offsite[0].error
+
+
+def test_crawl_delay_uses_our_user_agent_group():
+    parser = RobotFileParser()
+    agent = ROBOTS_USER_AGENT.split("/")[0]
+    parser.parse(f"User-agent: {agent}\nCrawl-delay: 7\n\nUser-agent: *\nCrawl-delay: 1\n".splitlines())
+    crawler = Crawler("http://example.com/", host_delay=0)
+    started = time.monotonic()
+    asyncio.run(crawler._wait_turn("http://example.com", parser))
+    assert crawler._next_fetch["http://example.com"] - started == pytest.approx(7, abs=0.5)
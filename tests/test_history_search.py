@@ -0,0 +1,26 @@
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+from murphy.utils.history_search import And, Not, parse_query, search_history
+
+MESSAGES = [
+    HumanMessage(content="scan the kerberos service", id="1"),
+    AIMessage(content="kerberos is open on port 88", id="2"),
+    HumanMessage(content="now try ldap", id="3"),
+]
+
+
+@pytest.mark.parametrize("query", ["foo NOT", "NOT", "kerberos AND", "kerberos OR", "(kerberos AND", "NOT NOT", "()", ")"])
+def test_trailing_and_dangling_operators(query):
+    assert isinstance(search_history(query, MESSAGES), str)
+
+
+def test_trailing_not_is_ignored():
+    assert parse_query("kerberos NOT").expr == parse_query("kerberos").expr
+
+
+def test_not_excludes():
+    expr = parse_query("kerberos NOT port").expr
+    assert isinstance(expr, And) and isinstance(expr.children[1], Not)
+    result = search_history("kerberos NOT port", MESSAGES)
+    assert "Found 1 messages" in result and "scan the kerberos service" in result
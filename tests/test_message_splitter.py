@@ -0,0 +1,32 @@
+from murphy.utils.message_splitter import DISCORD_MAX_LENGTH, MessageSplitter, iter_message_chunks
+
+
+def test_long_code_block_is_reopened_with_its_language():
+    text = "```python\n" + "x = 1\n" * 800 + "```"
+    chunks = list(iter_message_chunks(text))
+    assert len(chunks) > 1
+    assert all(len(chunk) <= DISCORD_MAX_LENGTH for chunk in chunks)
+    assert all(chunk.startswith("```python\n") for chunk in chunks)
+
+
+def test_long_info_string_is_not_repeated():
+    info = "x" * 1990
+    text = f"```{info}\n" + "line of code\n" * 400 + "```"
+    chunks = list(iter_message_chunks(text))
+    assert len(chunks) < 10
+    assert all(len(chunk) <= DISCORD_MAX_LENGTH for chunk in chunks)
+    assert all(chunk.startswith("```\n") for chunk in chunks[1:])
+
+
+def test_info_string_longer_than_a_chunk():
+    text = "```" + "x" * 1997 + "\n" + "code\n" * 500 + "```"
+    chunks = list(iter_message_chunks(text))
+    assert len(chunks) < 10
+    assert all(len(chunk) <= DISCORD_MAX_LENGTH for chunk in chunks)
+    assert "".join(chunks).count("code") == 500
+
+
+def test_every_cut_makes_progress_with_a_tiny_max_length():
+    splitter = MessageSplitter(max_length=5)
+    chunks = splitter.feed("```python\nprint('hello world')\n```\n") + splitter.flush()
+    assert chunks
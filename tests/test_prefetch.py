@@ -0,0 +1,11 @@
+from murphy.utils.prefetch import current_prefetcher, prefetch_scope
+
+
+def test_prefetch_setting_is_read_per_run(monkeypatch):
+    monkeypatch.setenv("MURPHY_PREFETCH", "false")
+    with prefetch_scope() as prefetcher:
+        assert prefetcher is None and current_prefetcher() is None
+    monkeypatch.setenv("MURPHY_PREFETCH", "true")
+    with prefetch_scope() as prefetcher:
+        assert prefetcher is not None and current_prefetcher() is prefetcher
+    assert current_prefetcher() is None
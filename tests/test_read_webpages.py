@@ -0,0 +1,17 @@
+import asyncio
+
+from murphy.utils import agent_tools
+from murphy.utils.agent_tools import BATCH_MAX_URLS, read_webpages
+
+
+def test_urls_past_the_limit_are_reported(monkeypatch):
+    async def aread(url):
+        return f"read {url}"
+    monkeypatch.setattr(agent_tools, "_read_webpage", lambda url: f"read {url}")
+    monkeypatch.setattr(agent_tools, "_aread_webpage", aread)
+    urls = [f"http://example.com/{i}" for i in range(BATCH_MAX_URLS + 3)]
+
+    for output in (read_webpages.func(urls), asyncio.run(read_webpages.coroutine(urls))):
+        assert f"read {urls[BATCH_MAX_URLS - 1]}" in output
+        assert f"read {urls[BATCH_MAX_URLS]}" not in output
+        assert output.endswith(f"3 more URLs were not read (limit {BATCH_MAX_URLS} per call)")
@@ -0,0 +1,36 @@
+import time
+
+import pytest
+
+from murphy.utils.message_context import MessageContext
+from murphy.utils.routing import choose_route
+
+
+def route(text, **kwargs):
+    return choose_route([MessageContext(1, text, **kwargs)])
+
+
+def test_plain_arithmetic_is_answered_directly():
+    assert route("<@1> calculate 2^32") == ("direct", "2^32 = 4294967296")
+
+
+@pytest.mark.parametrize("text", ["what is 445", "what is 404?", "what is 1337", "calc -5", "what is 1,000"])
+def test_bare_numbers_are_not_answered_directly(text):
+    assert route(text) == ("fast", None)
+
+
+def test_routing_mode_is_read_per_call(monkeypatch):
+    monkeypatch.setenv("MURPHY_ROUTING", "reasoner")
+    assert route("calculate 2^32") == ("reasoner", None)
+
+
+@pytest.mark.parametrize("text", ["calculate round(1, -10**9)", "calc 10**10**10", "calculate sqrt(2)"])
+def test_function_calls_and_oversized_results_go_to_a_model(text):
+    started = time.monotonic()
+    assert route(text) == ("fast", None)
+    assert time.monotonic() - started < 0.1
+
+
+def test_hard_requests_go_to_the_reasoner():
+    assert route("explain how to escalate privileges with sudo -l")[0] == "reasoner"
+    assert route("what time is it", thread_context="starter")[0] == "reasoner"
@@ -0,0 +1,28 @@
+import asyncio
+
+from murphy.utils.scheduler import AgentScheduler, parse_group_weights
+
+
+def test_parse_group_weights():
+    assert parse_group_weights("123:3, dm:2,456:0,bad,:x") == {123: 3, "dm": 2, 456: 1}
+    assert parse_group_weights("") == {}
+
+
+def test_weights_share_runs_between_busy_guilds():
+    order = []
+
+    async def runner(items):
+        order.append(items[0])
+        await asyncio.sleep(0)
+
+    async def main():
+        scheduler = AgentScheduler(runner, max_concurrency=1, max_pending=100, weights={"a": 3})
+        for i in range(8):
+            scheduler.submit(("a", i), "a", "a")
+            scheduler.submit(("b", i), "b", "b")
+        while scheduler.stats()["completed"] < 16:
+            await asyncio.sleep(0.001)
+
+    asyncio.run(main())
+    # After the first run, guild a gets three runs for each of b's while both wait
+    assert order[1:9].count("a") == 6
@@ -0,0 +1,32 @@
+from langchain_core.messages import AIMessage, HumanMessage
+
+from murphy.utils.similarity import SimilarityIndex, search_similar
+
+
+def transcript(size):
+    return [
+        (AIMessage if i % 2 else HumanMessage)(content=f"kerberos ticket {i} on port 88", id=f"m{i}")
+        for i in range(size)
+    ]
+
+
+def test_ordinary_sentences_are_not_parsed_as_boolean_queries():
+    messages = [HumanMessage(content="did the exploit work", id="1"), AIMessage(content="the exploit worked", id="2")]
+    for query in ["did the exploit work or not", "exploit AND", "NOT", "(exploit"]:
+        assert isinstance(search_similar(query, messages), str)
+    assert "Found" in search_similar("did the exploit work or not", messages)
+
+
+def test_filters_apply_before_ranking():
+    # One user message among many better-scoring assistant messages
+    messages = [AIMessage(content="kerberos ticket on port 88", id=f"a{i}") for i in range(100)]
+    messages.append(HumanMessage(content="kerberos ticket expired", id="u"))
+    result = search_similar("user: kerberos ticket port 88 limit:1", messages)
+    assert "Found 1 messages" in result and "kerberos ticket expired" in result
+
+
+def test_limit_filter():
+    index = SimilarityIndex()
+    index.sync(transcript(50))
+    assert len(index.search("kerberos ticket", limit=3)) == 3
+    assert "Found 2 messages" in search_similar("kerberos limit:2", transcript(50))
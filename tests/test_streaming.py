@@ -0,0 +1,54 @@
+import asyncio
+
+from murphy.utils.streaming import StreamingReply
+
+
+class FakeSent:
+    def __init__(self, log, fail_edits):
+        self.log = log
+        self.fail_edits = fail_edits
+
+    async def edit(self, content=None):
+        await asyncio.sleep(0.01)
+        if self.fail_edits:
+            self.fail_edits -= 1
+            raise RuntimeError("edit rejected")
+        self.log.append(content)
+
+
+class FakeMessage:
+    def __init__(self, fail_edits=0):
+        self.log = []
+        self.fail_edits = fail_edits
+
+    async def reply(self, content):
+        self.log.append(content)
+        return FakeSent(self.log, self.fail_edits)
+
+
+def test_failed_deferred_edit_is_reported(capsys):
+    async def main():
+        message = FakeMessage(fail_edits=1)
+        reply = StreamingReply(message, edit_interval=0.05)
+        await reply.feed("first")
+        await reply.feed(" second")  # deferred edit, which fails
+        await asyncio.sleep(0.1)
+        await reply.feed(" third")
+        await reply.finish()
+        return message.log
+    assert asyncio.run(main())[-1] == "first second third"
+    assert "Error updating streamed reply: edit rejected" in capsys.readouterr().out
+
+
+def test_finish_waits_for_an_edit_in_flight():
+    async def main():
+        message = FakeMessage()
+        reply = StreamingReply(message, edit_interval=0.02)
+        await reply.feed("first")
+        await reply.feed(" second")
+        await asyncio.sleep(0.025)  # the deferred edit is sending
+        await reply.finish()
+        return reply, message.log
+    reply, log = asyncio.run(main())
+    assert log == ["first", "first second"]
+    assert reply._pending is None
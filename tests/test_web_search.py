@@ -0,0 +1,62 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from murphy.utils import agent_tools
+from murphy.utils.webclient import close_async_session
+
+SECRET = "sk-test-0123456789"
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if "badkey" in self.path:
+            status, body = 401, json.dumps({"error": "Invalid API key."}).encode()
+        else:
+            status, body = 502, b"<html>Bad Gateway</html>"
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def serpapi(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(agent_tools, "SERPAPI_URL", f"http://127.0.0.1:{server.server_address[1]}/search")
+    monkeypatch.setenv("SERPAPI_KEY", SECRET)
+    yield
+    server.shutdown()
+
+
+def search(query):
+    async def run():
+        try:
+            return await agent_tools._aweb_search(query)
+        finally:
+            await close_async_session()
+    return asyncio.run(run())
+
+
+def test_unauthorized_search_reports_serpapi_error_without_the_key(serpapi):
+    result = search("badkey lookup")
+    assert result == "Error fetching search results: Invalid API key."
+    assert SECRET not in result
+
+
+def test_error_status_without_json_body(serpapi):
+    result = search("gateway down")
+    assert result == "Error fetching search results: HTTP 502"
+
+
+def test_request_errors_are_redacted(monkeypatch):
+    monkeypatch.setenv("SERPAPI_KEY", SECRET)
+    error = ValueError(f"Invalid URL https://serpapi.com/search?q=x&api_key={SECRET}&source=python")
+    assert SECRET not in agent_tools._serpapi_error(error)
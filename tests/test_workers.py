@@ -0,0 +1,94 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from murphy.utils import workers
+from murphy.utils.workers import WorkerError, WorkerPool, route
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(workers, "RESTART_BACKOFF", 0.2)
+    pool = WorkerPool(2, "toy_worker", health_interval=0.05)
+    spawn_threads = []
+    spawn = pool._spawn
+
+    def recording_spawn(index):
+        spawn_threads.append(threading.current_thread())
+        return spawn(index)
+    monkeypatch.setattr(pool, "_spawn", recording_spawn)
+    pool.spawn_threads = spawn_threads
+    pool.start()
+    yield pool
+    pool.close(timeout=5)
+
+
+async def run(pool, key, job):
+    call = pool.submit(key, job)
+    events = [event async for event in call]
+    return events[0], call.result  # (worker pid, result)
+
+
+async def until(condition, timeout=10.0):
+    for _ in range(int(timeout / 0.05)):
+        if condition():
+            return
+        await asyncio.sleep(0.05)
+    raise AssertionError("timed out")
+
+
+def test_jobs_for_a_key_always_reach_the_same_worker(pool):
+    keys = [key for key in range(20) if route(key, 2) == 0][:3]
+
+    async def main():
+        return [await run(pool, key, key) for key in keys + keys]
+    answers = asyncio.run(main())
+    assert {pid for pid, _ in answers} == {answers[0][0]}
+    assert [result for _, result in answers] == keys + keys
+
+
+def test_failing_job_raises_worker_error(pool):
+    async def main():
+        with pytest.raises(WorkerError, match="ValueError: bad job"):
+            await run(pool, 1, "fail")
+        return await run(pool, 1, "ok")
+    assert asyncio.run(main())[1] == "ok"
+    assert pool.stats()["failed"] == 1
+
+
+def test_dead_worker_fails_in_flight_calls_and_restarts_on_the_loop(pool):
+    key = 1
+
+    async def main():
+        in_flight = pool.submit(key, "sleep")
+        old_pid = await in_flight.__aiter__().__anext__()
+        with pytest.raises(WorkerError, match="exited"):
+            await run(pool, key, "exit")
+        with pytest.raises(WorkerError, match="exited"):
+            await in_flight.wait()
+        with pytest.raises(WorkerError, match="restarting"):
+            pool.submit(key, "ok")
+        await until(lambda: pool.stats()["restarts"] == 1)
+        pid, result = await run(pool, key, "ok")
+        assert pid != old_pid and result == "ok"
+    asyncio.run(main())
+    assert all(thread is threading.main_thread() for thread in pool.spawn_threads)
+    assert len(pool.spawn_threads) == 3
+
+
+def test_restarts_back_off_while_a_worker_keeps_crashing(pool):
+    key = 1
+
+    async def crash():
+        await until(lambda: pool._workers[route(key, 2)].restart_at is None)
+        with pytest.raises(WorkerError):
+            await run(pool, key, "exit")
+        await until(lambda: pool._workers[route(key, 2)].restart_at is not None)
+        return pool._workers[route(key, 2)].restart_at - time.monotonic()
+
+    async def main():
+        return [await crash() for _ in range(3)]
+    delays = asyncio.run(main())
+    assert delays[0] < 0.25 and 0.3 < delays[1] < 0.45 and 0.7 < delays[2] < 0.85
@@ -0,0 +1,14 @@
+"""Worker module for tests/test_workers.py (imported by the spawned workers)"""
+import asyncio
+import os
+
+
+async def handle_job(job, emit):
+    emit(os.getpid())
+    if job == "fail":
+        raise ValueError("bad job")
+    if job == "exit":
+        os._exit(3)
+    if job == "sleep":
+        await asyncio.sleep(30)
+    return job